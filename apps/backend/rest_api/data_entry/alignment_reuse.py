@@ -0,0 +1,263 @@
+import pathlib
+
+from django.db import connection
+from django.db import transaction
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from rest_api.models import Alignment
+from rest_api.models import AminoAcidMutation
+from rest_api.models import NucleotideMutation
+from rest_api.models import Replicon
+from rest_api.models import Sequence
+
+
+def _tables() -> dict[str, str]:
+    return {
+        "sequence": Sequence._meta.db_table,
+        "alignment": Alignment._meta.db_table,
+        "replicon": Replicon._meta.db_table,
+        "nt_mutation": NucleotideMutation._meta.db_table,
+        "aa_mutation": AminoAcidMutation._meta.db_table,
+        "nt_alignments": NucleotideMutation.alignments.through._meta.db_table,
+        "aa_alignments": AminoAcidMutation.alignments.through._meta.db_table,
+        "aa_parents": AminoAcidMutation.parent.through._meta.db_table,
+    }
+
+
+def find_reusable_alignments(
+    sample_raws: list, var_tables: dict[str, pa.Table]
+) -> dict[str, int]:
+    """
+    Existing alignments with the same seqhash and replicon as the samples of
+    a batch. Their mutation links are copied (`link_reused_alignments`)
+    instead of building the mutations of the samples again.
+
+    Only complete alignments (see `mark_alignments_complete`) are sources,
+    and never the alignments of the batch's own sequences, which a failed
+    earlier attempt of the batch may have left incomplete. Samples that keep
+    their N/X variants (`include_nx`) and have any are left out, the
+    existing alignment may have been imported without them.
+
+    Returns:
+        dict[str, int]: source alignment ID per sample name
+    """
+    candidates = [
+        sample_raw
+        for sample_raw in sample_raws
+        if not sample_raw.include_nx
+        or not pc.any(
+            var_tables[pathlib.Path(sample_raw.var_parquet_file).name]["is_nx"]
+        ).as_py()
+    ]
+    if not candidates:
+        return {}
+    t = _tables()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT DISTINCT ON (s.seqhash, r.accession) s.seqhash, r.accession, a.id
+            FROM {t["sequence"]} s
+            JOIN {t["alignment"]} a ON a.sequence_id = s.id
+            JOIN {t["replicon"]} r ON r.id = a.replicon_id
+            WHERE s.seqhash = ANY(%(seqhashes)s)
+            AND s.name <> ALL(%(names)s)
+            AND a.complete
+            ORDER BY s.seqhash, r.accession, a.id
+            """,
+            {
+                "seqhashes": list({sample_raw.seqhash for sample_raw in candidates}),
+                "names": [sample_raw.name for sample_raw in sample_raws],
+            },
+        )
+        sources = {
+            (seqhash, accession): alignment_id
+            for seqhash, accession, alignment_id in cursor
+        }
+    return {
+        sample_raw.name: sources[(sample_raw.seqhash, sample_raw.source_acc)]
+        for sample_raw in candidates
+        if (sample_raw.seqhash, sample_raw.source_acc) in sources
+    }
+
+
+def link_reused_alignments(sonar_import_objs: list) -> int:
+    """
+    Link the alignments of the given samples to the mutations of their
+    source alignments, in two INSERT ... SELECT statements. The alignments
+    must exist already. N/X mutations are only copied for samples with
+    `include_nx`.
+
+    Run it in the transaction of the batch: the source alignments are locked
+    until it ends, so they cannot be deleted before the links are committed.
+
+    Returns:
+        int: number of new mutation links
+    """
+    t = _tables()
+    params = {
+        "names": [obj.sample_raw.name for obj in sonar_import_objs],
+        "accessions": [obj.sample_raw.source_acc for obj in sonar_import_objs],
+        "sources": [obj.source_alignment_id for obj in sonar_import_objs],
+        "include_nx": [obj.sample_raw.include_nx for obj in sonar_import_objs],
+    }
+    links = 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT id FROM {t["alignment"]}
+            WHERE id = ANY(%(sources)s) AND complete
+            FOR SHARE
+            """,
+            params,
+        )
+        missing = set(params["sources"]) - {row[0] for row in cursor.fetchall()}
+        if missing:
+            raise Alignment.DoesNotExist(
+                f"Reused alignments {sorted(missing)} were deleted meanwhile"
+            )
+        for links_table, mutation_table, column, nx in [
+            (t["nt_alignments"], t["nt_mutation"], "nucleotidemutation_id", "N"),
+            (t["aa_alignments"], t["aa_mutation"], "aminoacidmutation_id", "X"),
+        ]:
+            cursor.execute(
+                f"""
+                INSERT INTO {links_table} ({column}, alignment_id)
+                SELECT l.{column}, a.id
+                FROM unnest(
+                    %(names)s::text[], %(accessions)s::text[],
+                    %(sources)s::bigint[], %(include_nx)s::boolean[]
+                ) AS x(name, accession, source_id, include_nx)
+                JOIN {t["sequence"]} s ON s.name = x.name
+                JOIN {t["replicon"]} r ON r.accession = x.accession
+                JOIN {t["alignment"]} a
+                    ON a.sequence_id = s.id AND a.replicon_id = r.id
+                JOIN {links_table} l ON l.alignment_id = x.source_id
+                JOIN {mutation_table} m ON m.id = l.{column}
+                WHERE x.include_nx OR strpos(m.alt, '{nx}') = 0
+                ORDER BY l.{column}, a.id
+                ON CONFLICT DO NOTHING
+                """,
+                params,
+            )
+            links += cursor.rowcount
+    return links
+
+
+def mark_alignments_complete(sonar_import_objs: list) -> int:
+    """
+    Mark the alignments of the given samples as complete, after all their
+    mutation links were written in the same transaction. Alignments that are
+    complete already are not rewritten.
+
+    Returns:
+        int: number of newly completed alignments
+    """
+    t = _tables()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {t["alignment"]} a SET complete = true
+            FROM unnest(%(names)s::text[], %(accessions)s::text[])
+                AS x(name, accession)
+            JOIN {t["sequence"]} s ON s.name = x.name
+            JOIN {t["replicon"]} r ON r.accession = x.accession
+            WHERE a.sequence_id = s.id AND a.replicon_id = r.id
+            AND NOT a.complete
+            """,
+            {
+                "names": [obj.sample_raw.name for obj in sonar_import_objs],
+                "accessions": [obj.sample_raw.source_acc for obj in sonar_import_objs],
+            },
+        )
+        return cursor.rowcount
+
+
+# the mutation links of an (older) alignment `a` look completely written:
+# - it has nucleotide mutations
+# - every amino acid mutation has one of its nucleotide mutations
+# - every nucleotide mutation with amino acid mutations has one of them,
+#   the amino acid links were written after the nucleotide links
+_VERIFIED_LINKS = """
+    EXISTS (
+        SELECT 1 FROM {nt_alignments} ln WHERE ln.alignment_id = a.id
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM {aa_alignments} la
+        WHERE la.alignment_id = a.id
+        AND NOT EXISTS (
+            SELECT 1 FROM {aa_parents} p
+            JOIN {nt_alignments} ln
+                ON ln.nucleotidemutation_id = p.nucleotidemutation_id
+                AND ln.alignment_id = a.id
+            WHERE p.aminoacidmutation_id = la.aminoacidmutation_id
+        )
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM {nt_alignments} ln
+        JOIN {aa_parents} p ON p.nucleotidemutation_id = ln.nucleotidemutation_id
+        WHERE ln.alignment_id = a.id
+        GROUP BY ln.nucleotidemutation_id
+        HAVING NOT bool_or(EXISTS (
+            SELECT 1 FROM {aa_alignments} la
+            WHERE la.alignment_id = a.id
+            AND la.aminoacidmutation_id = p.aminoacidmutation_id
+        ))
+    )
+"""
+
+
+def complete_verified_alignments(
+    batch_size: int = 10000, dry_run: bool = False
+) -> dict[str, int]:
+    """
+    Mark the incomplete alignments of older imports complete, if their
+    mutation links look completely written (see _VERIFIED_LINKS). These
+    imports wrote the links of a batch without one transaction, an
+    interrupted batch may have left partial links behind.
+
+    Alignments without any nucleotide mutation, or with missing links, stay
+    incomplete. They become complete when their samples are imported again.
+    Alignments are checked in batches of `batch_size`, one transaction each.
+
+    Returns:
+        dict[str, int]: number of incomplete alignments checked and completed
+    """
+    t = _tables()
+    verified = _VERIFIED_LINKS.format(**t)
+    counts = {"checked": 0, "completed": 0}
+    last_id = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT id FROM {t["alignment"]}
+                WHERE NOT complete AND id > %(last_id)s
+                ORDER BY id LIMIT %(limit)s
+                """,
+                {"last_id": last_id, "limit": batch_size},
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                return counts
+            if dry_run:
+                cursor.execute(
+                    f"""
+                    SELECT count(*) FROM {t["alignment"]} a
+                    WHERE a.id = ANY(%(ids)s) AND {verified}
+                    """,
+                    {"ids": ids},
+                )
+                completed = cursor.fetchone()[0]
+            else:
+                cursor.execute(
+                    f"""
+                    UPDATE {t["alignment"]} a SET complete = true
+                    WHERE a.id = ANY(%(ids)s) AND NOT a.complete AND {verified}
+                    """,
+                    {"ids": ids},
+                )
+                completed = cursor.rowcount
+        counts["checked"] += len(ids)
+        counts["completed"] += completed
+        last_id = ids[-1]
@@ -1,13 +1,17 @@
 from dataclasses import dataclass
 import gzip
-import re
-
-from django.db.models import Q
+from typing import Iterator
 
+from rest_api.data_entry.archive import open_text_member
 from rest_api.models import AnnotationType
 from rest_api.models import NucleotideMutation
+from rest_api.models import Replicon
+from sonar_backend.settings import ANNOTATION_BATCH_SIZE
 from sonar_backend.settings import LOGGER
 
+# allele, annotation (ontology) and annotation impact
+ANN_STORED_FIELDS = 3
+
 
 @dataclass
 class VCFRaw:
@@ -22,48 +26,60 @@ class VCFRaw:
     format: str
 
 
-@dataclass
+@dataclass(frozen=True)
 class VCFInfoANNRaw:
-    # Functional annotations
+    # Functional annotation, only the leading ANN fields that are stored
     allele: str
     annotation: str
     annotation_impact: str
-    gene_name: str
-    gene_id: str
-    feature_type: str
-    feature_id: str
-    transcript_bio_type: str
-    rank: str
-    hgvs_c: str
-    hgvs_p: str
-    c_dna_pos_length: str
-    cds_pos_length: str
-    aa_pos_length: str
-    distance: str
-    errors_warnings_info: str
 
 
 @dataclass
 class MutationLookupToAnnotations:
-    start: str
-    end: str
+    start: int
+    end: int
     ref: str
     alt: str
     replicon__accession: str
-    annotations: list[VCFInfoANNRaw]
+    annotations: set[VCFInfoANNRaw]
+
+    @property
+    def key(self) -> tuple[int, int, str, str, str]:
+        return (self.start, self.end, self.ref, self.alt, self.replicon__accession)
 
 
 class AnnotationImport:
-    def __init__(self, path: str):
+    """
+    Streaming reader for snpEff annotated VCF files.
+
+    The file is read line by line and handed out in batches of at most
+    `batch_size` alleles (see `batches()`), so memory use does not depend on
+    the size of the file. Use `get_annotation_objs()` and
+    `get_annotation2mutation_objs()` on each batch.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        archive_path: str | None = None,
+        batch_size: int = ANNOTATION_BATCH_SIZE,
+    ):
+        # with archive_path, path is the name of a member of that archive
         self.vcf_file_path = path
-        self.raw_lines = [line for line in self._import_vcf()]
-        self.mutation_lookups_to_annotations = self.convert_lines()
-        self.annotation_q_obj = Q()
+        self.archive_path = archive_path
+        self.batch_size = batch_size
+        self.annotation_keys: set[tuple[str, str]] = set()
+        self.relation_info = {}
 
     def _import_vcf(self):
         # Open compressed or uncompressed VCF based on file extension
-        open_func = gzip.open if self.vcf_file_path.endswith(".gz") else open
-        with open_func(self.vcf_file_path, "rt") as handle:  # 'rt' for text mode
+        if self.archive_path:
+            vcf_file = open_text_member(self.archive_path, self.vcf_file_path)
+        elif self.vcf_file_path.endswith(".gz"):
+            vcf_file = gzip.open(self.vcf_file_path, "rt")  # 'rt' for text mode
+        else:
+            vcf_file = open(self.vcf_file_path, "rt")
+        with vcf_file as handle:
             for line in handle:
                 if line.startswith(("#", "##")):
                     continue
@@ -81,15 +97,15 @@ class AnnotationImport:
                 )
                 yield vcf_raw
 
-    def convert_lines(self) -> list[MutationLookupToAnnotations]:
-        mutation_lookups_to_annotations = []
-        for line in self.raw_lines:
-            annotations = self._parse_line_info(line.info)
+    def convert_lines(self) -> Iterator[MutationLookupToAnnotations]:
+        for line in self._import_vcf():
+            if line.alt is None:
+                continue
             allele_to_annotations = {}
-            for annotation in annotations:
-                if annotation.allele not in allele_to_annotations:
-                    allele_to_annotations[annotation.allele] = []
-                allele_to_annotations[annotation.allele].append(annotation)
+            for annotation in self._parse_line_info(line.info):
+                allele_to_annotations.setdefault(annotation.allele, set()).add(
+                    annotation
+                )
             for alt in line.alt.split(","):
                 if alt not in allele_to_annotations:
                     continue
@@ -118,113 +134,118 @@ class AnnotationImport:
                     mutation_lookup_to_annotations.ref = ""
                     mutation_lookup_to_annotations.alt = ""
 
-                mutation_lookups_to_annotations.append(mutation_lookup_to_annotations)
-        return mutation_lookups_to_annotations
+                yield mutation_lookup_to_annotations
+
+    def batches(self) -> Iterator[dict[tuple, MutationLookupToAnnotations]]:
+        """
+        VCF entries grouped into batches of at most `batch_size` distinct
+        mutations, keyed by (start, end, ref, alt, replicon accession).
+        """
+        batch: dict[tuple, MutationLookupToAnnotations] = {}
+        for mutation_lookup_to_annotations in self.convert_lines():
+            key = mutation_lookup_to_annotations.key
+            if key in batch:
+                batch[key].annotations |= mutation_lookup_to_annotations.annotations
+                continue
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = {}
+            batch[key] = mutation_lookup_to_annotations
+        if batch:
+            yield batch
 
-    def _parse_line_info(self, info: str) -> list[VCFInfoANNRaw]:
+    def _parse_line_info(self, info: str) -> set[VCFInfoANNRaw]:
         """
         Extracts the SNP effect annotation (ANN) substring from the 8th column of a tab-separated SnpEff annotation line.
 
+        We have a lot of redundant entries in the ANN field. For example, if we have the mutation
+        MN908947.3 26565 . A ANNNNNNN (insertion with ambiguous lots of Ns), snpEff tries to predict
+        the effect for every possible combination: insCAAAAAA, insCAAAAAC, ..., insGAAAAAA. This can
+        generate 4 (A,T,C,G) to the power of N (position) annotations for a single line.
+        Only allele, ontology (e.g., frameshift_variant) and annotation_impact (e.g., HIGH) are
+        stored, so the annotations are reduced to their distinct combinations while reading.
+
         Parameters:
             info (str): The 8th column of a tab-separated SnpEff annotation line. Example:
                 "ANN=C|upstream_gene_variant|MODIFIER|ORF1a|Gene_265_13467|transcript|ORF1a|protein_coding||c.-217_-213delTCTTG|||||217|WARNING_TRANSCRIPT_NO_STOP_CODON,
                 C|intergenic_region|MODIFIER|CHR_START-ORF1a|CHR_START-Gene_265_13467|intergenic_region|CHR_START-Gene_265_13467|||n.49_53delTCTTG||||||"
 
         Returns:
-            list[VCFInfoANNRaw]: list of extracted annotations, different annotations are separated by ','
+            set[VCFInfoANNRaw]: distinct annotations, different annotations are separated by ','
         """
         for field in info.split(";"):
             if field.startswith("ANN="):
                 ann_field = field.removeprefix("ANN=")
-                annotations = []
+                annotations = set()
                 for annotation in ann_field.split(","):
-                    annotation = annotation.split("|")
-                    try:
-                        annotations.append(VCFInfoANNRaw(*annotation))
-                    except Exception:
+                    annotation = annotation.split("|", ANN_STORED_FIELDS)
+                    if len(annotation) <= ANN_STORED_FIELDS:
                         LOGGER.warning(
                             f"Failed to parse annotation: {annotation}, from file {self.vcf_file_path}"
                         )
+                        continue
+                    annotations.add(VCFInfoANNRaw(*annotation[:ANN_STORED_FIELDS]))
                 # Return after finding the first ANN= field. If there are
                 # multiple, all others will be ignored.
                 return annotations
-        return []
+        return set()
 
-    def get_annotation_objs(
-        self,
-    ) -> tuple[list[AnnotationType], list[AnnotationType.mutations.through]]:
-        annotation_objs = []
-        q_obj = Q()
-        # self.mutation_lookups_to_annotations read from vcf file.
-        for mutation_lookup_to_annotations in self.mutation_lookups_to_annotations:
-            q_obj |= Q(
-                start=mutation_lookup_to_annotations.start,
-                end=mutation_lookup_to_annotations.end,
-                ref=mutation_lookup_to_annotations.ref,
-                alt=mutation_lookup_to_annotations.alt,
-                replicon__accession=mutation_lookup_to_annotations.replicon__accession,
-            )
-        mutations = NucleotideMutation.objects.filter(q_obj).prefetch_related(
-            "replicon"
+    def _find_mutations(
+        self, lookups: dict[tuple, MutationLookupToAnnotations]
+    ) -> list[NucleotideMutation]:
+        """
+        Fetch the nucleotide mutations of all VCF alleles in one query. The
+        lookup keys are passed as arrays and joined against the table, instead
+        of one OR clause per allele.
+        """
+        if not lookups:
+            return []
+        starts, ends, refs, alts, accessions = (
+            list(column) for column in zip(*lookups.keys())
+        )
+        sql = f"""
+            SELECT m.*, r.accession AS replicon_accession
+            FROM {NucleotideMutation._meta.db_table} m
+            JOIN {Replicon._meta.db_table} r ON r.id = m.replicon_id
+            JOIN unnest(%s::bigint[], %s::bigint[], %s::text[], %s::text[], %s::text[])
+                AS k(start, "end", ref, alt, accession)
+                ON m.start = k.start AND m."end" = k."end"
+                AND m.ref = k.ref AND m.alt = k.alt
+                AND r.accession = k.accession
+        """
+        return list(
+            NucleotideMutation.objects.raw(sql, [starts, ends, refs, alts, accessions])
         )
-        annotation_q_obj = Q()
-        relation_info = {}
-        for mutation in mutations:
-            # Problem 1: some samples got error 'StopIteration'
-            # I think because there are no items in the filtered iterable
-            # that match the conditions specified by the lambda function
-            # But How did this can happen?,
-            # Solution: because there are cds and nt at the same position we should filter only NT
 
-            try:
-                mut_lookup_to_annotation = self.mutation_lookups_to_annotations.pop(
-                    self.mutation_lookups_to_annotations.index(
-                        next(
-                            filter(
-                                lambda x: int(x.start) == int(mutation.start)
-                                and int(x.end) == int(mutation.end)
-                                and x.ref == mutation.ref
-                                and x.alt == mutation.alt
-                                and x.replicon__accession
-                                == mutation.replicon.accession,
-                                self.mutation_lookups_to_annotations,
-                            )
-                        )
-                    )
-                )
-            except (ValueError, StopIteration) as e:
-                LOGGER.error(f"Error: {e}")
-                LOGGER.error(
-                    f"Mutation details: start={mutation.start}, end={mutation.end}, ref={mutation.ref}, alt={mutation.alt}, replicon__accession={mutation.replicon.accession}"
+    def get_annotation_objs(
+        self, lookups: dict[tuple, MutationLookupToAnnotations]
+    ) -> list[AnnotationType]:
+        """
+        Annotation types of one batch (see `batches()`). The matching
+        annotation-mutation relations are kept for
+        `get_annotation2mutation_objs()`.
+        """
+        # (seq_ontology, impact) -> AnnotationType
+        annotation_objs: dict[tuple[str, str], AnnotationType] = {}
+        relation_info = {}
+        for mutation in self._find_mutations(lookups):
+            mut_lookup_to_annotation = lookups[
+                (
+                    mutation.start,
+                    mutation.end,
+                    mutation.ref,
+                    mutation.alt,
+                    mutation.replicon_accession,
                 )
-                raise
-
-            # print(mut_lookup_to_annotation)
-            # Problem 2: We have too many entries in mut_lookup_to_annotation.annotations.
-            # For example, if we have the mutation MN908947.3 26565 . A ANNNNNNN (insertion with ambiguous lots of Ns),
-            # snpEff tries to predict the effect for every possible combination:
-            # insCAAAAAA, insCAAAAAC, insCAAAAAG, insCAAAAAT, ..., insTAAAAAA, ..., insGAAAAAA.
-            # This can generate a lookup annotation size of 4 (A,T,C,G) to the power of N (position).
-            # In this case, 4 to the power of 7 equals 16384.
-            # Currently, we only use ontology (e.g., frameshift_variant) and annotation_impact (e.g., HIGH),
-            # which means a potentially highly redundant query, hence taking too long to finish the import process (> 10 mins).
-
-            # Temporary solution: reduce the redundancy in alleles, annotations, and impacts.
-            # we skip processing based on alleles, annotations, and impacts
-            seen = set()
-            # start to pass each VCFInfoANNRaw
+            ]
             for a in mut_lookup_to_annotation.annotations:
-                key = (a.allele, a.annotation, a.annotation_impact)
-                if key in seen:
-                    continue
-                seen.add(key)
                 for ontology in a.annotation.split("&"):
-                    annotation_obj = AnnotationType(
-                        seq_ontology=ontology, impact=a.annotation_impact
-                    )
-                    annotation_q_obj |= Q(
-                        seq_ontology=ontology, impact=a.annotation_impact
-                    )
+                    if (ontology, a.annotation_impact) not in annotation_objs:
+                        annotation_objs[(ontology, a.annotation_impact)] = (
+                            AnnotationType(
+                                seq_ontology=ontology, impact=a.annotation_impact
+                            )
+                        )
                     if ontology not in relation_info:
                         relation_info[ontology] = {}
                     if a.annotation_impact not in relation_info[ontology]:
@@ -234,15 +255,19 @@ class AnnotationImport:
                             "mutation": mutation,
                         }
                     )
-                    annotation_objs.append(annotation_obj)
-        self.annotation_q_obj = annotation_q_obj
+        self.annotation_keys = set(annotation_objs.keys())
         self.relation_info = relation_info
-        return annotation_objs
+        return list(annotation_objs.values())
 
     def get_annotation2mutation_objs(self) -> list[AnnotationType.mutations.through]:
-        annotations = AnnotationType.objects.filter(self.annotation_q_obj)
+        annotations = AnnotationType.objects.filter(
+            seq_ontology__in={ontology for ontology, _ in self.annotation_keys},
+            impact__in={impact for _, impact in self.annotation_keys},
+        )
         mutation2annotation_objs = []
         for annotation in annotations:
+            if (annotation.seq_ontology, annotation.impact) not in self.annotation_keys:
+                continue
             for relation in self.relation_info[annotation.seq_ontology][
                 annotation.impact
             ]:
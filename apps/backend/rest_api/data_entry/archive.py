@@ -0,0 +1,70 @@
+from contextlib import contextmanager
+import fnmatch
+import gzip
+import io
+import struct
+import zipfile
+
+import pyarrow as pa
+
+
+def list_members(archive_path: str, pattern: str) -> list[str]:
+    """Names of the archive members matching a glob pattern (e.g. "anno/*.vcf.*")."""
+    with zipfile.ZipFile(archive_path, "r") as zip_ref:
+        return [
+            name
+            for name in zip_ref.namelist()
+            if not name.endswith("/") and fnmatch.fnmatch(name, pattern)
+        ]
+
+
+def has_member(archive_path: str, member: str) -> bool:
+    with zipfile.ZipFile(archive_path, "r") as zip_ref:
+        try:
+            zip_ref.getinfo(member)
+        except KeyError:
+            return False
+        return True
+
+
+@contextmanager
+def open_member(archive_path: str, member: str):
+    """
+    Binary, seekable file object of an archive member, read without extracting
+    it. Stored (uncompressed) members, which is what the CLI uses for parquet
+    files, are memory mapped: pyarrow seeks to the row groups it needs and
+    only those pages are read. A zipfile member would read everything before
+    the position again on every backward seek.
+    """
+    with zipfile.ZipFile(archive_path, "r") as zip_ref:
+        info = zip_ref.getinfo(member)
+        if info.compress_type != zipfile.ZIP_STORED:
+            with zip_ref.open(info, "r") as handle:
+                yield handle
+            return
+    yield _map_stored_member(archive_path, info)
+
+
+def _map_stored_member(archive_path: str, info: zipfile.ZipInfo) -> pa.BufferReader:
+    source = pa.memory_map(archive_path)
+    # the data follows the local file header, its name and extra field can
+    # differ in length from the central directory entry
+    header = source.read_at(zipfile.sizeFileHeader, info.header_offset)
+    name_length, extra_length = struct.unpack(zipfile.structFileHeader, header)[-2:]
+    source.seek(
+        info.header_offset + zipfile.sizeFileHeader + name_length + extra_length
+    )
+    return pa.BufferReader(source.read_buffer(info.file_size))
+
+
+@contextmanager
+def open_text_member(archive_path: str, member: str):
+    """Text file object of an archive member, gunzipped for .gz members."""
+    with zipfile.ZipFile(archive_path, "r") as zip_ref, zip_ref.open(
+        member, "r"
+    ) as handle:
+        if member.endswith(".gz"):
+            with gzip.open(handle, "rt") as text_handle:
+                yield text_handle
+        else:
+            yield io.TextIOWrapper(handle)
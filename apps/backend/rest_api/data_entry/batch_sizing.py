@@ -0,0 +1,91 @@
+from django.core.cache import cache
+
+from sonar_backend.settings import IMPORT_BATCH_TARGET_SECONDS
+from sonar_backend.settings import LOGGER
+from sonar_backend.settings import REDIS_URL
+from sonar_backend.settings import SAMPLE_BATCH_SIZE
+
+# observed import throughput in work rows per second, shared by all workers
+THROUGHPUT_CACHE_KEY = "sonar:import:rows_per_sec"
+# weight of the latest batch in the moving average
+THROUGHPUT_SMOOTHING = 0.3
+# fixed work of a sample (sequence, alignment and sample rows), in variant rows
+SAMPLE_ROW_WEIGHT = 20
+# upper bound on the samples of one batch, whatever the throughput
+MAX_BATCH_SAMPLES = 1000
+
+
+def batch_work(variant_rows: int, sample_count: int) -> int:
+    """Estimated work of a batch, in rows."""
+    return variant_rows + SAMPLE_ROW_WEIGHT * sample_count
+
+
+def get_throughput() -> float | None:
+    """Moving average of the work rows imported per second, if known."""
+    if not REDIS_URL:
+        return None
+    return cache.get(THROUGHPUT_CACHE_KEY)
+
+
+def record_throughput(rows: int, seconds: float):
+    """
+    Update the moving average with a finished batch. Concurrent updates can
+    overwrite each other, which only drops a sample of the average.
+    """
+    if not REDIS_URL or seconds <= 0 or rows <= 0:
+        return
+    observed = rows / seconds
+    current = cache.get(THROUGHPUT_CACHE_KEY)
+    if current is not None:
+        observed = (
+            THROUGHPUT_SMOOTHING * observed + (1 - THROUGHPUT_SMOOTHING) * current
+        )
+    cache.set(THROUGHPUT_CACHE_KEY, observed, timeout=None)
+
+
+def target_batch_work() -> int | None:
+    """
+    Work rows a batch should have to take IMPORT_BATCH_TARGET_SECONDS, or
+    None if adaptive sizing is disabled or no throughput was observed yet.
+    """
+    if IMPORT_BATCH_TARGET_SECONDS <= 0:
+        return None
+    throughput = get_throughput()
+    if not throughput:
+        return None
+    return max(int(throughput * IMPORT_BATCH_TARGET_SECONDS), 1)
+
+
+def plan_batches(variant_counts: list[int]) -> list[tuple[int, int]]:
+    """
+    Split the manifest rows into [start, stop) ranges. With a known
+    throughput, every batch gets about `target_batch_work()` rows of work
+    (at least one sample, at most MAX_BATCH_SAMPLES), otherwise
+    SAMPLE_BATCH_SIZE samples.
+
+    Args:
+        variant_counts: number of variants per manifest row
+    """
+    sample_count = len(variant_counts)
+    target = target_batch_work()
+    if target is None:
+        return [
+            (i, min(i + SAMPLE_BATCH_SIZE, sample_count))
+            for i in range(0, sample_count, SAMPLE_BATCH_SIZE)
+        ]
+    batches = []
+    start = 0
+    work = 0
+    for row, variant_count in enumerate(variant_counts):
+        work += batch_work(variant_count, 1)
+        if work >= target or row + 1 - start >= MAX_BATCH_SAMPLES:
+            batches.append((start, row + 1))
+            start = row + 1
+            work = 0
+    if start < sample_count:
+        batches.append((start, sample_count))
+    LOGGER.info(
+        f"{len(batches)} batches of about {target} rows "
+        f"for {IMPORT_BATCH_TARGET_SECONDS}s each"
+    )
+    return batches
@@ -0,0 +1,215 @@
+from contextlib import contextmanager
+from contextlib import nullcontext
+import socket
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.db import OperationalError
+from django.db import transaction
+
+from sonar_backend.settings import IMPORT_DEADLOCK_RETRIES
+from sonar_backend.settings import IMPORT_GLOBAL_LOCKS
+from sonar_backend.settings import LOGGER
+
+# PostgreSQL SQLSTATE for "deadlock detected"
+DEADLOCK_DETECTED = "40P01"
+# IMPORT_GLOBAL_LOCKS lock of the batch transactions
+BATCH_LOCK = "import_batch"
+# Advisory lock key. Imports hold it shared while they write mutations and
+# their links, the mutation cleanup (see mutation_gc) holds it exclusively.
+MUTATION_LOCK_KEY = 0x736F6E6172
+
+
+def is_deadlock(error: Exception) -> bool:
+    return getattr(error.__cause__, "pgcode", None) == DEADLOCK_DETECTED
+
+
+@contextmanager
+def mutation_write_lock():
+    """
+    Keep the mutation cleanup from deleting mutations that this import looks
+    up or links meanwhile. Imports never block each other.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock_shared(%s)", [MUTATION_LOCK_KEY])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock_shared(%s)", [MUTATION_LOCK_KEY])
+
+
+class BatchWriteStats:
+    """
+    Timing of the steps of one import batch.
+
+    Writes go through `run()`, which keeps lock wait time (only non-zero with
+    IMPORT_GLOBAL_LOCKS) separate from the time spent in the database.
+    Without global locks, concurrent batches rely on the sorted upsert order
+    (see MutationRegistry) and a statement that still ends up in a deadlock
+    is retried (`run_transaction()` retries a whole transaction instead).
+    With global locks, a batch transaction holds one lock until it commits.
+
+    Every write is also recorded as a step, named after the table it writes
+    to, together with its row count. Other steps (reading, building objects)
+    are timed with `stage()`.
+    """
+
+    def __init__(self):
+        self.lock_wait = 0.0
+        self.write = 0.0
+        self.deadlock_retries = 0
+        self.steps: dict[str, dict[str, float | int]] = {}
+
+    def _step(self, name: str) -> dict[str, float | int]:
+        return self.steps.setdefault(name, {"seconds": 0.0, "rows": 0})
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time a step. The step entry is yielded, so the caller can add to its
+        "rows".
+        """
+        step = self._step(name)
+        start = time.perf_counter()
+        try:
+            yield step
+        finally:
+            step["seconds"] += time.perf_counter() - start
+
+    def call(self, func, *args, **kwargs):
+        """Run a write without lock or retry and record it as a step."""
+        with self.stage(_step_name(func)) as step:
+            result = func(*args, **kwargs)
+        if args and hasattr(args[0], "__len__"):
+            step["rows"] += len(args[0])
+        return result
+
+    @contextmanager
+    def _lock(self, name: str | None):
+        wait_start = time.perf_counter()
+        with cache.lock(name) if IMPORT_GLOBAL_LOCKS and name else nullcontext():
+            self.lock_wait += time.perf_counter() - wait_start
+            yield
+
+    def run(self, lock_name: str, func, *args, **kwargs):
+        """
+        Run a write, retrying it on deadlocks. A standalone write runs under
+        the named lock. Inside a transaction, a lock released after the
+        statement would not keep other batches from writing before the
+        commit, these writes rely on the lock of `run_transaction()`.
+        """
+        if connection.in_atomic_block:
+            lock_name = None
+        attempt = 0
+        while True:
+            with self._lock(lock_name):
+                write_start = time.perf_counter()
+                try:
+                    return self.call(func, *args, **kwargs)
+                except OperationalError as e:
+                    # inside an outer transaction the whole transaction is
+                    # aborted, so only standalone statements can be retried
+                    if (
+                        not is_deadlock(e)
+                        or connection.in_atomic_block
+                        or attempt >= IMPORT_DEADLOCK_RETRIES
+                    ):
+                        raise
+                finally:
+                    self.write += time.perf_counter() - write_start
+            attempt += 1
+            self._back_off(f"{lock_name} write", attempt)
+
+    def run_transaction(self, func, *args, **kwargs):
+        """
+        Run `func` in one transaction, retrying the whole transaction on
+        deadlocks. `func` has to build its model instances anew on every call,
+        the ids of a rolled back attempt do not exist. With IMPORT_GLOBAL_LOCKS,
+        the transaction holds the batch lock until it is committed.
+        """
+        attempt = 0
+        while True:
+            try:
+                with self._lock(BATCH_LOCK), transaction.atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as e:
+                if (
+                    not is_deadlock(e)
+                    or connection.in_atomic_block
+                    or attempt >= IMPORT_DEADLOCK_RETRIES
+                ):
+                    raise
+            attempt += 1
+            self._back_off("batch transaction", attempt)
+
+    def _back_off(self, name: str, attempt: int):
+        self.deadlock_retries += 1
+        LOGGER.warning(f"Deadlock on {name}, retry {attempt}/{IMPORT_DEADLOCK_RETRIES}")
+        # back off a little so the other transaction can finish
+        time.sleep(0.05 * attempt)
+
+    def as_dict(self) -> dict:
+        return {
+            "lock_wait": round(self.lock_wait, 3),
+            "write": round(self.write, 3),
+            "deadlock_retries": self.deadlock_retries,
+            "steps": {
+                name: {"seconds": round(step["seconds"], 3), "rows": step["rows"]}
+                for name, step in self.steps.items()
+            },
+            "host": socket.gethostname(),
+        }
+
+
+class InsertMissing:
+    """
+    Insert-only alternative to `bulk_create(update_conflicts=True)`.
+
+    The rows are written with ON CONFLICT DO NOTHING and the ids of all
+    objects are then looked up by their unique key in one query. Existing
+    rows are never rewritten, so re-importing known alignments and mutations
+    leaves no dead tuples and writes no WAL for them.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def bulk_create(self, objs: list, unique_fields: list[str]) -> list:
+        if not objs:
+            return objs
+        # also sets the foreign key ids from the related objects
+        self.model.objects.bulk_create(objs, ignore_conflicts=True)
+        fields = [self.model._meta.get_field(name) for name in unique_fields]
+        qn = connection.ops.quote_name
+        columns = [qn(field.column) for field in fields]
+        keys = ", ".join(f"%s::{field.db_type(connection)}[]" for field in fields)
+        selected = ", ".join(f"t.{column}" for column in columns)
+        on = " AND ".join(f"t.{column} = k.{column}" for column in columns)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT t.{qn(self.model._meta.pk.column)}, {selected}
+                FROM {qn(self.model._meta.db_table)} t
+                JOIN unnest({keys}) AS k({", ".join(columns)}) ON {on}
+                """,
+                [[getattr(obj, field.attname) for obj in objs] for field in fields],
+            )
+            ids = {tuple(row[1:]): row[0] for row in cursor.fetchall()}
+        for obj in objs:
+            key = tuple(getattr(obj, field.attname) for field in fields)
+            if key not in ids:
+                raise self.model.DoesNotExist(
+                    f"{self.model.__name__} {key} is missing after insert"
+                )
+            obj.pk = ids[key]
+        return objs
+
+
+def _step_name(func) -> str:
+    """Table name for Model.objects.bulk_create & co, else the function name."""
+    model = getattr(getattr(func, "__self__", None), "model", None)
+    if model is not None:
+        return model._meta.db_table
+    return func.__name__
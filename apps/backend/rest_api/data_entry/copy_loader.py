@@ -0,0 +1,294 @@
+import csv
+import io
+
+from django.db import connection
+from django.db import transaction
+
+from rest_api.data_entry.sample_import import SonarImport
+from rest_api.models import Alignment
+from rest_api.models import AminoAcidMutation
+from rest_api.models import CDS
+from rest_api.models import NucleotideMutation
+from rest_api.models import Replicon
+from rest_api.models import Sequence
+from sonar_backend.settings import LOGGER
+
+# Staging tables live only inside the loading transaction. Temporary tables
+# are never WAL-logged and are private to the session, so concurrent workers
+# can stage their batches without colliding.
+STAGING_TABLES = {
+    "stage_sequence": (
+        "name text, seqhash text, length integer, replicon text",
+        ["name", "seqhash", "length", "replicon"],
+    ),
+    "stage_nt": (
+        'sequence_name text, import_id bigint, ref text, alt text, start bigint, "end" bigint, is_frameshift boolean',
+        ["sequence_name", "import_id", "ref", "alt", "start", "end", "is_frameshift"],
+    ),
+    "stage_aa": (
+        'sequence_name text, cds text, ref text, alt text, start bigint, "end" bigint, parent_ids bigint[]',
+        ["sequence_name", "cds", "ref", "alt", "start", "end", "parent_ids"],
+    ),
+}
+# tables created by the merge statements
+RESOLVED_TABLES = ["stage_alignment", "stage_nt_resolved", "stage_aa_resolved"]
+
+
+def _tables() -> dict[str, str]:
+    return {
+        "sequence": Sequence._meta.db_table,
+        "alignment": Alignment._meta.db_table,
+        "replicon": Replicon._meta.db_table,
+        "cds": CDS._meta.db_table,
+        "nt_mutation": NucleotideMutation._meta.db_table,
+        "aa_mutation": AminoAcidMutation._meta.db_table,
+        "nt_alignments": NucleotideMutation.alignments.through._meta.db_table,
+        "aa_alignments": AminoAcidMutation.alignments.through._meta.db_table,
+        "aa_parent": AminoAcidMutation.parent.through._meta.db_table,
+    }
+
+
+def _staging_rows(
+    sonar_import_objs: list[SonarImport],
+) -> dict[str, list[tuple]]:
+    """Flatten the parsed samples of a batch into rows of the staging tables."""
+    rows = {"stage_sequence": [], "stage_nt": [], "stage_aa": []}
+    for sample_import_obj in sonar_import_objs:
+        sample_raw = sample_import_obj.sample_raw
+        rows["stage_sequence"].append(
+            (
+                sample_raw.name,
+                sample_raw.seqhash,
+                sample_raw.sequence_length,
+                sample_raw.source_acc,
+            )
+        )
+        nt_vars = sample_import_obj.nt_vars
+        for row in zip(
+            nt_vars.id,
+            nt_vars.ref,
+            nt_vars.alt,
+            nt_vars.start,
+            nt_vars.end,
+            nt_vars.frameshift,
+        ):
+            rows["stage_nt"].append((sample_raw.name, *row[:5], bool(row[5])))
+        cds_vars = sample_import_obj.cds_vars
+        for accession, ref, alt, start, end, parent_ids in zip(
+            cds_vars.accession,
+            cds_vars.ref,
+            cds_vars.alt,
+            cds_vars.start,
+            cds_vars.end,
+            cds_vars.parent_id,
+        ):
+            rows["stage_aa"].append(
+                (
+                    sample_raw.name,
+                    accession,
+                    ref,
+                    alt,
+                    start if start else 0,
+                    end if end else 0,
+                    "{" + ",".join(str(x) for x in parent_ids or []) + "}",
+                )
+            )
+    return rows
+
+
+def _copy_rows(cursor, table: str, columns: list[str], rows: list[tuple]):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    buffer.seek(0)
+    quoted_columns = ", ".join(f'"{column}"' for column in columns)
+    # unquoted empty values would be read as NULL, but an empty ref/alt is
+    # a real value (deletions)
+    force_not_null = ""
+    if "ref" in columns:
+        force_not_null = ', FORCE_NOT_NULL ("ref", "alt")'
+    cursor.copy_expert(
+        f"COPY {table} ({quoted_columns}) FROM STDIN WITH (FORMAT csv{force_not_null})",
+        buffer,
+    )
+
+
+def _check_accessions(cursor):
+    """
+    Raise for staged rows of unknown replicons or CDS, the merge statements
+    would drop them in their joins.
+    """
+    t = _tables()
+    for model, staging_table, column, table in [
+        (Replicon, "stage_sequence", "replicon", t["replicon"]),
+        (CDS, "stage_aa", "cds", t["cds"]),
+    ]:
+        cursor.execute(
+            f"""
+            SELECT DISTINCT st.{column} FROM {staging_table} st
+            LEFT JOIN {table} x ON x.accession = st.{column}
+            WHERE x.id IS NULL
+            ORDER BY st.{column}
+            """
+        )
+        unknown = [row[0] for row in cursor.fetchall()]
+        if unknown:
+            raise model.DoesNotExist(
+                f"{model.__name__} accessions not found: {', '.join(unknown)}"
+            )
+
+
+def _merge_statements() -> list[tuple[str, str]]:
+    t = _tables()
+    return [
+        (
+            "sequence",
+            f"""
+            INSERT INTO {t["sequence"]} (name, seqhash, length, last_update_date, init_upload_date)
+            SELECT DISTINCT ON (name) name, seqhash, length, now(), now()
+            FROM stage_sequence
+            ORDER BY name
+            ON CONFLICT (name) DO UPDATE SET
+                seqhash = EXCLUDED.seqhash,
+                length = EXCLUDED.length,
+                last_update_date = EXCLUDED.last_update_date
+            """,
+        ),
+        (
+            "alignment",
+            f"""
+            INSERT INTO {t["alignment"]} (replicon_id, sequence_id)
+            SELECT DISTINCT r.id, s.id
+            FROM stage_sequence st
+            JOIN {t["sequence"]} s ON s.name = st.name
+            JOIN {t["replicon"]} r ON r.accession = st.replicon
+            ORDER BY r.id, s.id
+            ON CONFLICT (replicon_id, sequence_id) DO NOTHING
+            """,
+        ),
+        (
+            "resolve alignment",
+            f"""
+            CREATE TEMP TABLE stage_alignment ON COMMIT DROP AS
+            SELECT st.name AS sequence_name, r.id AS replicon_id, a.id AS alignment_id
+            FROM stage_sequence st
+            JOIN {t["sequence"]} s ON s.name = st.name
+            JOIN {t["replicon"]} r ON r.accession = st.replicon
+            JOIN {t["alignment"]} a ON a.sequence_id = s.id AND a.replicon_id = r.id
+            """,
+        ),
+        (
+            "nucleotide mutation",
+            f"""
+            INSERT INTO {t["nt_mutation"]} (ref, alt, start, "end", replicon_id, is_frameshift)
+            SELECT DISTINCT ON (n.ref, n.alt, n.start, n."end", sa.replicon_id)
+                n.ref, n.alt, n.start, n."end", sa.replicon_id, n.is_frameshift
+            FROM stage_nt n
+            JOIN stage_alignment sa ON sa.sequence_name = n.sequence_name
+            ORDER BY n.ref, n.alt, n.start, n."end", sa.replicon_id
+            ON CONFLICT (ref, alt, start, "end", replicon_id) DO NOTHING
+            """,
+        ),
+        (
+            "resolve nucleotide mutation",
+            f"""
+            CREATE TEMP TABLE stage_nt_resolved ON COMMIT DROP AS
+            SELECT n.sequence_name, n.import_id, m.id AS mutation_id, sa.alignment_id
+            FROM stage_nt n
+            JOIN stage_alignment sa ON sa.sequence_name = n.sequence_name
+            JOIN {t["nt_mutation"]} m
+                ON m.ref = n.ref AND m.alt = n.alt AND m.start = n.start
+                AND m."end" = n."end" AND m.replicon_id = sa.replicon_id
+            """,
+        ),
+        (
+            "nucleotide mutation alignments",
+            f"""
+            INSERT INTO {t["nt_alignments"]} (nucleotidemutation_id, alignment_id)
+            SELECT DISTINCT mutation_id, alignment_id
+            FROM stage_nt_resolved
+            ORDER BY mutation_id, alignment_id
+            ON CONFLICT DO NOTHING
+            """,
+        ),
+        (
+            "amino acid mutation",
+            f"""
+            INSERT INTO {t["aa_mutation"]} (ref, alt, start, "end", cds_id)
+            SELECT DISTINCT p.ref, p.alt, p.start, p."end", c.id
+            FROM stage_aa p
+            JOIN {t["cds"]} c ON c.accession = p.cds
+            ORDER BY p.ref, p.alt, p.start, p."end", c.id
+            ON CONFLICT (ref, alt, start, "end", cds_id) DO NOTHING
+            """,
+        ),
+        (
+            "resolve amino acid mutation",
+            f"""
+            CREATE TEMP TABLE stage_aa_resolved ON COMMIT DROP AS
+            SELECT p.sequence_name, p.parent_ids, m.id AS mutation_id, sa.alignment_id
+            FROM stage_aa p
+            JOIN stage_alignment sa ON sa.sequence_name = p.sequence_name
+            JOIN {t["cds"]} c ON c.accession = p.cds
+            JOIN {t["aa_mutation"]} m
+                ON m.ref = p.ref AND m.alt = p.alt AND m.start = p.start
+                AND m."end" = p."end" AND m.cds_id = c.id
+            """,
+        ),
+        (
+            "amino acid mutation alignments",
+            f"""
+            INSERT INTO {t["aa_alignments"]} (aminoacidmutation_id, alignment_id)
+            SELECT DISTINCT mutation_id, alignment_id
+            FROM stage_aa_resolved
+            ORDER BY mutation_id, alignment_id
+            ON CONFLICT DO NOTHING
+            """,
+        ),
+        (
+            # Parent IDs that were not imported (skip-nx, see
+            # SonarImport.get_mutation_objs_cds_and_parent_relations) drop out
+            # of the join.
+            "amino acid mutation parents",
+            f"""
+            INSERT INTO {t["aa_parent"]} (aminoacidmutation_id, nucleotidemutation_id)
+            SELECT DISTINCT ar.mutation_id, nr.mutation_id
+            FROM stage_aa_resolved ar
+            CROSS JOIN LATERAL unnest(ar.parent_ids) AS parent(import_id)
+            JOIN stage_nt_resolved nr
+                ON nr.sequence_name = ar.sequence_name
+                AND nr.import_id = parent.import_id
+            ORDER BY ar.mutation_id, nr.mutation_id
+            ON CONFLICT DO NOTHING
+            """,
+        ),
+    ]
+
+
+def copy_load_batch(sonar_import_objs: list[SonarImport]) -> dict[str, int]:
+    """
+    Load a batch of parsed samples with PostgreSQL COPY.
+
+    All rows of the batch are streamed into temporary staging tables and then
+    merged into the real tables with set-based INSERT ... SELECT ... ON
+    CONFLICT statements. Mutation and alignment IDs are resolved with joins
+    in the database, no model instances are created. Samples of unknown
+    replicons or with mutations in unknown CDS raise `DoesNotExist`.
+
+    Returns:
+        dict[str, int]: number of rows written per merge step.
+    """
+    rows = _staging_rows(sonar_import_objs)
+    row_counts = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        for table, (definition, columns) in STAGING_TABLES.items():
+            cursor.execute(f"CREATE TEMP TABLE {table} ({definition}) ON COMMIT DROP")
+            _copy_rows(cursor, table, columns, rows[table])
+        _check_accessions(cursor)
+        for step, sql in _merge_statements():
+            cursor.execute(sql)
+            row_counts[step] = cursor.rowcount
+        # inside an outer transaction (the whole batch, see process_batch_run),
+        # ON COMMIT DROP would keep the tables until that one ends
+        cursor.execute(f"DROP TABLE {', '.join([*STAGING_TABLES, *RESOLVED_TABLES])}")
+    LOGGER.debug(f"COPY loader row counts: {row_counts}")
+    return row_counts
@@ -9,6 +9,7 @@ from Bio import SeqRecord
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.db import transaction
 
+from rest_api.data_entry.reference_cache import invalidate_reference_cache
 from rest_api.models import CDS
 from rest_api.models import CDSSegment
 from rest_api.models import Gene
@@ -17,13 +18,7 @@ from rest_api.models import Peptide
 from rest_api.models import PeptideSegment
 from rest_api.models import Reference
 from rest_api.models import Replicon
-from rest_api.serializers import CDSSegmentSerializer
-from rest_api.serializers import CDSSerializer
 from rest_api.serializers import find_or_create
-from rest_api.serializers import GeneSegmentSerializer
-from rest_api.serializers import GeneSerializer
-from rest_api.serializers import PeptideSegmentSerializer
-from rest_api.serializers import PeptideSerializer
 from rest_api.serializers import ReferenceSerializer
 from rest_api.serializers import RepliconSerializer
 from sonar_backend.settings import SONAR_DATA_ENTRY_FOLDER
@@ -33,6 +28,9 @@ def import_gbk_file(uploaded_files: list[InMemoryUploadedFile], translation_id:
     """
     Import GenBank file. or Import multiple GenBank files as segments.
 
+    All features are parsed and validated first, then every table is written
+    with one bulk insert (see ReferenceFeatures).
+
     Args:
         - uploaded_files (list): List of InMemoryUploadedFile objects.
         - translation_id (int): ID for translation.
@@ -48,128 +46,261 @@ def import_gbk_file(uploaded_files: list[InMemoryUploadedFile], translation_id:
         file_paths
     )  # join multiple file paths into a comma-space separated string
     records: list[SeqRecord.SeqRecord]
+    features = [ReferenceFeatures(record) for record in records]
     reference = _put_reference_from_record(records[0], translation_id, file_path_str)
     with transaction.atomic():
         # record = complete gbk file
-        for record in records:
-            source_features = list(
-                filter(lambda x: x.type == "source", record.features)
+        for record_features in features:
+            record_features.replicon_data["reference"] = reference.id
+            replicon = find_or_create(
+                record_features.replicon_data, Replicon, RepliconSerializer
             )
-            if len(source_features) != 1:
-                raise ValueError("Expecting exactly one source feature.")
-            source_feature = source_features[0]
-            source_feature: SeqFeature.SeqFeature
-            if source_feature.location is None:
-                raise ValueError("No location information found for source feature.")
-            replicon_data = {
-                "accession": f"{record.name}.{record.annotations['sequence_version']}",
-                "description": record.description,
-                "length": int(source_feature.location.end)
-                - int(source_feature.location.start),
-                "sequence": str(source_feature.extract(record.seq)),
-                "reference": reference.id,
-            }
-            # If the record has a segment number at the top level, use that
-            # else look at the source feature for segment number
-            if "segment_number" in record.annotations:
-                replicon_data["segment_number"] = record.annotations["segment_number"]
-            else:
-                source_features = [f for f in record.features if f.type == "source"]
-
-                if (
-                    len(source_features) == 1
-                    and "segment" in source_features[0].qualifiers
-                ):
-                    replicon_data["segment_number"] = source_features[0].qualifiers[
-                        "segment"
-                    ][0]
-
-            replicon = find_or_create(replicon_data, Replicon, RepliconSerializer)
-            # features with gene qualifier
-            gene_features = [
-                f
-                for f in record.features
-                if f.type == "gene" and "pseudogene" not in f.qualifiers
-            ]
-            none_gene_features = [
-                f
-                for f in record.features
-                if f.type != "gene" and "pseudogene" not in f.qualifiers
-            ]
+            record_features.save(replicon)
 
-            gene_id_to_gene_obj: dict[str, Gene] = {}
-            for gene_feature in gene_features:
-                """
-                gene_feature = type: gene, location: [26244:26472](+), qualifiers: Key: gene, Value: ['E']
-                """
-                gene_symbol = _determine_symbol(gene_feature)
-                gene_accession = _determine_gene_accession(gene_feature)
-                if gene_accession is None:
-                    raise ValueError(
-                        f"No gene symbol found for feature at {gene_feature.location}."
-                    )
+    invalidate_reference_cache()
+    return records
 
-                gene_type = determine_gene_type(none_gene_features, gene_symbol)
-                # TODO : check if join/multiple orders
-                gene_obj = _put_gene_from_feature(
-                    gene_feature,
-                    record.seq,
-                    replicon,
-                    gene_type,
-                    gene_accession,
-                    gene_symbol,
+
+class ReferenceFeatures:
+    """
+    Genes, CDS and peptides of one GenBank record with their segments, as
+    unsaved model objects. Children refer to their parent objects, so their
+    foreign keys are filled in once the parents are saved.
+    """
+
+    def __init__(self, record: SeqRecord.SeqRecord):
+        self.replicon_data = _replicon_data_from_record(record)
+        self.genes: list[Gene] = []
+        self.gene_segments: list[GeneSegment] = []
+        self.cds: list[CDS] = []
+        self.cds_segments: list[CDSSegment] = []
+        self.peptides: list[Peptide] = []
+        self.peptide_segments: list[PeptideSegment] = []
+        self._parse_features(record)
+
+    def _parse_features(self, record: SeqRecord.SeqRecord):
+        # features with gene qualifier
+        gene_features = [
+            f
+            for f in record.features
+            if f.type == "gene" and "pseudogene" not in f.qualifiers
+        ]
+        none_gene_features = [
+            f
+            for f in record.features
+            if f.type != "gene" and "pseudogene" not in f.qualifiers
+        ]
+
+        gene_id_to_gene_obj: dict[str, Gene] = {}
+        for gene_feature in gene_features:
+            """
+            gene_feature = type: gene, location: [26244:26472](+), qualifiers: Key: gene, Value: ['E']
+            """
+            gene_symbol = _determine_symbol(gene_feature)
+            gene_accession = _determine_gene_accession(gene_feature)
+            if gene_accession is None:
+                raise ValueError(
+                    f"No gene symbol found for feature at {gene_feature.location}."
+                )
+
+            gene_type = determine_gene_type(none_gene_features, gene_symbol)
+            # TODO : check if join/multiple orders
+            gene = _gene_from_feature(
+                gene_feature,
+                record.seq,
+                gene_type,
+                gene_accession,
+                gene_symbol,
+            )
+            if gene_accession in gene_id_to_gene_obj:
+                known = gene_id_to_gene_obj[gene_accession]
+                if (known.start, known.end) != (gene.start, gene.end):
+                    raise ValueError(f"Duplicate gene accession {gene_accession}.")
+                continue
+            self.genes.append(gene)
+            gene_id_to_gene_obj[gene_accession] = gene
+            self.gene_segments.extend(
+                GeneSegment(gene=gene, **elempart)
+                for elempart in _process_segments(
+                    gene_feature.location.parts, include_strand=True
+                )
+            )
+
+        # features with CDS qualifier
+        gene_id_to_cds_obj: dict[str, list[CDS]] = {}
+        cds_to_segments: dict[str, list[CDSSegment]] = {}
+        cds_features = [
+            f
+            for f in record.features
+            if f.type == "CDS" and "pseudogene" not in f.qualifiers
+        ]
+        for cds_feature in cds_features:
+            # TODO add note to cds table (e.g. ORF1)
+            gene_accession = _determine_gene_accession(cds_feature)
+            if gene_accession is None:
+                raise ValueError("No gene accession found.")
+            gene = gene_id_to_gene_obj.get(gene_accession, None)
+            if gene is None:
+                raise ValueError("No gene object found for CDS.")
+            cds = _cds_from_feature(cds_feature, gene)
+            if cds.accession in cds_to_segments:
+                # the same CDS listed twice
+                if cds_to_segments[cds.accession][0].cds.gene is not gene:
+                    raise ValueError(f"Duplicate CDS accession {cds.accession}.")
+                continue
+            self.cds.append(cds)
+            # different cds in one gene
+            gene_id_to_cds_obj.setdefault(gene_accession, []).append(cds)
+            cds_segments = [
+                CDSSegment(cds=cds, **elempart)
+                for elempart in _process_segments(
+                    cds_feature.location.parts, include_strand=True
                 )
-                gene_id_to_gene_obj[gene_accession] = gene_obj
-                _create_gene_segments(gene_feature, gene_obj)
-
-            # features with CDS qualifier
-            gene_id_to_cds_obj: dict[str, list[CDS]] = {}
-            cds_features = [
-                f
-                for f in record.features
-                if f.type == "CDS" and "pseudogene" not in f.qualifiers
-            ]
-            for cds_feature in cds_features:
-                # TODO add note to cds table (e.g. ORF1)
-                gene_accession = _determine_gene_accession(cds_feature)
-                if gene_accession is None:
-                    raise ValueError("No gene accession found.")
-                gene = gene_id_to_gene_obj.get(gene_accession, None)
-                if gene is None:
-                    raise ValueError("No gene object found for CDS.")
-                cds = _put_cds_from_feature(cds_feature, gene)
-                # different cds in one gene
-                if gene_accession not in gene_id_to_cds_obj:
-                    gene_id_to_cds_obj[gene_accession] = []
-                    gene_id_to_cds_obj[gene_accession].append(cds)
-                else:
-                    gene_id_to_cds_obj[gene_accession].append(cds)
-                _create_cds_segments(cds_feature, cds)
-
-            # features with peptide qualifier (e.g. HIV)
-            peptide_features = [
-                f for f in record.features if f.type in ["mat_peptide", "sig_peptide"]
             ]
-            for peptide_feature in peptide_features:
-                gene_accession = _determine_gene_accession(peptide_feature)
-                if gene_accession is None:
-                    raise ValueError("No gene symbol found.")
-                cds_objects = gene_id_to_cds_obj.get(gene_accession, None)
-                cds_segments = CDSSegment.objects.filter(
-                    cds__in=[cds.pk for cds in cds_objects]
+            cds_to_segments[cds.accession] = cds_segments
+            self.cds_segments.extend(cds_segments)
+
+        # features with peptide qualifier (e.g. HIV)
+        peptide_features = [
+            f for f in record.features if f.type in ["mat_peptide", "sig_peptide"]
+        ]
+        peptide_locations: dict[tuple[str, str, str], str] = {}
+        for peptide_feature in peptide_features:
+            gene_accession = _determine_gene_accession(peptide_feature)
+            if gene_accession is None:
+                raise ValueError("No gene symbol found.")
+            cds_objects = gene_id_to_cds_obj.get(gene_accession, None)
+            if not cds_objects:
+                raise ValueError("No gene found for peptide.")
+            elif len(cds_objects) > 1:
+                raise ValueError(
+                    f"Multiple CDS objects found for gene symbol {gene_accession}. Can't assign mat_peptides to CDS."
                 )
-                if cds is None:
-                    raise ValueError("No gene found for peptide.")
-                elif len(cds_objects) > 1:
+            cds = cds_objects[0]
+            peptide = _peptide_from_feature(peptide_feature, cds)
+            peptide_key = (cds.accession, peptide.type, peptide.description)
+            location = str(peptide_feature.location)
+            if peptide_key in peptide_locations:
+                # the same peptide listed twice
+                if peptide_locations[peptide_key] != location:
                     raise ValueError(
-                        f"Multiple CDS objects found for gene symbol {gene_accession}. Can't assign mat_peptides to CDS."
+                        f"Duplicate {peptide.type} '{peptide.description}' in CDS {cds.accession}."
                     )
-                elif len(cds_objects) == 1:
-                    cds = cds_objects[0]
-                    peptide = _put_peptide_from_feature(peptide_feature, cds)
-                    _create_peptide_segments(peptide_feature, peptide, cds_segments)
+                continue
+            peptide_locations[peptide_key] = location
+            self.peptides.append(peptide)
+            self.peptide_segments.extend(
+                _peptide_segments(
+                    peptide_feature, peptide, cds_to_segments[cds.accession]
+                )
+            )
 
-    return records
+    def save(self, replicon: Replicon):
+        """
+        Write the features with one bulk insert per table, parents first.
+        Existing rows (re-import of a reference) are updated in place, the
+        segments a feature no longer has are deleted.
+        """
+        for gene in self.genes:
+            gene.replicon = replicon
+        Gene.objects.bulk_create(
+            self.genes,
+            update_conflicts=True,
+            unique_fields=["replicon", "accession"],
+            update_fields=[
+                "start",
+                "end",
+                "forward_strand",
+                "symbol",
+                "type",
+                "sequence",
+                "description",
+            ],
+        )
+        GeneSegment.objects.bulk_create(
+            self.gene_segments,
+            update_conflicts=True,
+            unique_fields=["gene", "order"],
+            update_fields=["start", "end", "forward_strand"],
+        )
+        _delete_stale_segments(GeneSegment, "gene", self.genes, self.gene_segments)
+        # CDS accessions are unique across all references
+        taken = list(
+            CDS.objects.filter(accession__in=[cds.accession for cds in self.cds])
+            .exclude(gene__replicon=replicon)
+            .values_list("accession", flat=True)
+        )
+        if taken:
+            raise ValueError(f"CDS accessions already exist: {', '.join(taken)}")
+        CDS.objects.bulk_create(
+            self.cds,
+            update_conflicts=True,
+            unique_fields=["accession"],
+            update_fields=["gene", "sequence", "description"],
+        )
+        CDSSegment.objects.bulk_create(
+            self.cds_segments,
+            update_conflicts=True,
+            unique_fields=["cds", "order"],
+            update_fields=["start", "end", "forward_strand"],
+        )
+        _delete_stale_segments(CDSSegment, "cds", self.cds, self.cds_segments)
+        # peptides have no unique key, reuse the rows of an earlier import
+        existing_peptides = {
+            (peptide.cds_id, peptide.type, peptide.description): peptide.pk
+            for peptide in Peptide.objects.filter(cds__in=self.cds)
+        }
+        new_peptides = []
+        for peptide in self.peptides:
+            peptide.pk = existing_peptides.get(
+                (peptide.cds.pk, peptide.type, peptide.description)
+            )
+            if peptide.pk is None:
+                new_peptides.append(peptide)
+        Peptide.objects.bulk_create(new_peptides)
+        PeptideSegment.objects.bulk_create(
+            self.peptide_segments,
+            update_conflicts=True,
+            unique_fields=["peptide", "order"],
+            update_fields=["start", "end", "start_cds", "end_cds"],
+        )
+        _delete_stale_segments(
+            PeptideSegment, "peptide", self.peptides, self.peptide_segments
+        )
+
+
+def _delete_stale_segments(model, parent_field: str, parents: list, segments: list):
+    """
+    Delete the segments of the given parents that were not just saved, e.g.
+    the higher order segments of a feature that lost parts on re-import.
+    The pks of the upserted segments are set by bulk_create.
+    """
+    model.objects.filter(**{f"{parent_field}__in": parents}).exclude(
+        pk__in=[segment.pk for segment in segments]
+    ).delete()
+
+
+def _replicon_data_from_record(record: SeqRecord.SeqRecord) -> dict:
+    source_features = list(filter(lambda x: x.type == "source", record.features))
+    if len(source_features) != 1:
+        raise ValueError("Expecting exactly one source feature.")
+    source_feature = source_features[0]
+    source_feature: SeqFeature.SeqFeature
+    if source_feature.location is None:
+        raise ValueError("No location information found for source feature.")
+    replicon_data = {
+        "accession": f"{record.name}.{record.annotations['sequence_version']}",
+        "description": record.description,
+        "length": int(source_feature.location.end) - int(source_feature.location.start),
+        "sequence": str(source_feature.extract(record.seq)),
+    }
+    # If the record has a segment number at the top level, use that
+    # else look at the source feature for segment number
+    if "segment_number" in record.annotations:
+        replicon_data["segment_number"] = record.annotations["segment_number"]
+    elif "segment" in source_feature.qualifiers:
+        replicon_data["segment_number"] = source_feature.qualifiers["segment"][0]
+    return replicon_data
 
 
 def determine_gene_type(
@@ -251,26 +382,24 @@ def _determine_symbol(feature: SeqFeature.SeqFeature) -> str | None:
     raise ValueError("No qualifier for gene symbol found.")
 
 
-def _put_gene_from_feature(
+def _gene_from_feature(
     feature: SeqFeature.SeqFeature,
     replicon_seq: str,
-    replicon: Replicon,
     gene_type: Gene.GeneTypes,
     gene_accession: str,
     gene_symbol: str,
 ) -> Gene:
     """
-    Processes a gene feature from a gene bank file and updates or creates a corresponding Gene object.
+    Creates an unsaved Gene object from a gene feature of a gene bank file.
 
     Args:
         feature (SeqFeature.SeqFeature): The gene feature containing location and qualifiers.
             e.g. type: gene, location: [26244:26472](+), qualifiers: Key: gene, Value: ['E']
         replicon_seq (str): The full nucleotide sequence of the replicon.
-        replicon (Replicon): The associated Replicon object.
         gene_type (Gene.GeneTypes): The type of gene (e.g. CDS, rRNA, etc.).
 
     Returns:
-        Gene: The updated or newly created Gene object.
+        Gene: The unsaved Gene object, without replicon.
         gene_accession: filled with first existing tag in this order [locus_tag == systematic gene name, gene, protein_id]
         gene_symbol: filled with first existing tag in this order [gene, locus_tag]
         gene_sequence: complete sequence of gene
@@ -281,29 +410,21 @@ def _put_gene_from_feature(
     """
     if feature.location is None:
         raise ValueError("No location information found for gene feature.")
-    gene_base_data = {
-        "start": int(feature.location.start),
-        "end": int(feature.location.end),
-        "forward_strand": True if feature.location.strand == 1 else False,
-        "replicon": replicon.pk,
-        "type": gene_type,
-        "accession": gene_accession,
-        "symbol": gene_symbol,
-    }
-    gene_update_data = {}
-    gene_update_data["sequence"] = str(feature.extract(replicon_seq))
-    gene_update_data["description"] = feature.qualifiers.get("gene_synonym", [""])[0]
-
-    gene = find_or_create(gene_base_data, Gene, GeneSerializer)
-    for attr_name, value in gene_update_data.items():
-        setattr(gene, attr_name, value)
-
-    return GeneSerializer(gene).update(gene, gene_update_data)
+    return Gene(
+        start=int(feature.location.start),
+        end=int(feature.location.end),
+        forward_strand=True if feature.location.strand == 1 else False,
+        type=gene_type,
+        accession=gene_accession,
+        symbol=gene_symbol,
+        sequence=str(feature.extract(replicon_seq)),
+        description=feature.qualifiers.get("gene_synonym", [""])[0],
+    )
 
 
-def _put_cds_from_feature(feature: SeqFeature.SeqFeature, gene: Gene) -> CDS:
+def _cds_from_feature(feature: SeqFeature.SeqFeature, gene: Gene) -> CDS:
     """
-    Processes a cds feature from a gene bank file and updates or creates a corresponding CDS object.
+    Creates an unsaved CDS object from a cds feature of a gene bank file.
     Location information stored in related cds_segment table
 
     Args:
@@ -311,7 +432,7 @@ def _put_cds_from_feature(feature: SeqFeature.SeqFeature, gene: Gene) -> CDS:
         gene (Gene): The associated gene object.
 
     Returns:
-        CDS: The updated or newly created CDS object.
+        CDS: The unsaved CDS object.
         cds_accession: filled with first existing tag in this order [protein_id, locus_tag, gene]
         cds_sequence: complete aa-sequence of cds
         cds_descritption: product tag = protein name
@@ -321,23 +442,19 @@ def _put_cds_from_feature(feature: SeqFeature.SeqFeature, gene: Gene) -> CDS:
     """
     if feature.location is None:
         raise ValueError("No location information found for CDS feature.")
-    cds_update_data = {}
-    cds_update_data["accession"] = _determine_cds_accession(feature)
-    _validate_segment_lengths(feature.location.parts, cds_update_data["accession"])
-    cds_update_data["sequence"] = feature.qualifiers.get("translation", [""])[0]
-    cds_update_data["description"] = feature.qualifiers.get("product", [""])[0]
-    cds = find_or_create(
-        {"gene": gene.pk, "accession": cds_update_data["accession"]}, CDS, CDSSerializer
+    accession = _determine_cds_accession(feature)
+    _validate_segment_lengths(feature.location.parts, accession)
+    return CDS(
+        gene=gene,
+        accession=accession,
+        sequence=feature.qualifiers.get("translation", [""])[0],
+        description=feature.qualifiers.get("product", [""])[0],
     )
 
-    for attr_name, value in cds_update_data.items():
-        setattr(cds, attr_name, value)
-    return CDSSerializer(cds).update(cds, cds_update_data)
-
 
-def _put_peptide_from_feature(feature: SeqFeature.SeqFeature, cds: CDS) -> Peptide:
+def _peptide_from_feature(feature: SeqFeature.SeqFeature, cds: CDS) -> Peptide:
     """
-    Processes a peptide feature from a gene bank file and updates or creates a corresponding Peptide object.
+    Creates an unsaved Peptide object from a peptide feature of a gene bank file.
     Location information stored in related peptide_segment table
 
     Args:
@@ -345,7 +462,7 @@ def _put_peptide_from_feature(feature: SeqFeature.SeqFeature, cds: CDS) -> Pepti
         cds (CDS): The associated CDS object.
 
     Returns:
-        Peptide: The updated or newly created peptide object.
+        Peptide: The unsaved peptide object.
         peptide_type: mat_peptide or sig_peptide
         peptide_descritption: product tag = protein name
 
@@ -354,16 +471,11 @@ def _put_peptide_from_feature(feature: SeqFeature.SeqFeature, cds: CDS) -> Pepti
     """
     if feature.location is None:
         raise ValueError("No location information found for peptide feature.")
-    peptide_base_data = {
-        "cds": cds.pk,
-        "type": feature.type,
-        "description": feature.qualifiers.get("product", [""])[0],
-    }
-    peptide_update_data = {}
-    peptide = find_or_create(peptide_base_data, Peptide, PeptideSerializer)
-    for attr_name, value in peptide_update_data.items():
-        setattr(peptide, attr_name, value)
-    return PeptideSerializer(peptide).update(peptide, peptide_update_data)
+    return Peptide(
+        cds=cds,
+        type=feature.type,
+        description=feature.qualifiers.get("product", [""])[0],
+    )
 
 
 def parse_date(date_string: str) -> datetime.date:
@@ -430,24 +542,6 @@ def _put_reference_from_record(
         return serializer.save()
 
 
-def _create_gene_segments(feature: SeqFeature.SeqFeature, gene: Gene):
-    for elempart in _process_segments(feature.location.parts, include_strand=True):
-        elempart_data = {
-            "gene": gene.pk,
-            **elempart,
-        }
-        find_or_create(elempart_data, GeneSegment, GeneSegmentSerializer)
-
-
-def _create_cds_segments(feature: SeqFeature.SeqFeature, cds: CDS):
-    for elempart in _process_segments(feature.location.parts, include_strand=True):
-        elempart_data = {
-            "cds": cds.pk,
-            **elempart,
-        }
-        find_or_create(elempart_data, CDSSegment, CDSSegmentSerializer)
-
-
 def calculate_cds_start_end(
     seq_feature: SeqFeature.SeqFeature,
     cds_segments: list[CDSSegment],
@@ -496,29 +590,32 @@ def calculate_cds_start_end(
     return start_cds_aa, end_cds_aa
 
 
-def _create_peptide_segments(
+def _peptide_segments(
     seq_feature: SeqFeature.SeqFeature, peptide, cds_segments: list[CDSSegment]
-):
+) -> list[PeptideSegment]:
     """
-    Create peptide segments based on the provided sequence feature and peptide object.
+    Create unsaved peptide segments based on the provided sequence feature and peptide object.
     Args:
         seq_feature (SeqFeature.SeqFeature): The sequence feature containing location information.
         peptide (Peptide): The associated peptide object.
         cds_segments (list[CDSSegment]): List of CDS segments (start, end, strand, order) of associated CDS
     """
+    peptide_segments = []
     for elempart in _process_segments(seq_feature.location.parts):
         start_cds_aa, end_cds_aa = calculate_cds_start_end(
             seq_feature,
             cds_segments,
             peptide.cds.accession,
         )
-        elempart_data = {
-            "peptide": peptide.pk,
-            "start_cds": start_cds_aa,
-            "end_cds": end_cds_aa,
-            **elempart,
-        }
-        find_or_create(elempart_data, PeptideSegment, PeptideSegmentSerializer)
+        peptide_segments.append(
+            PeptideSegment(
+                peptide=peptide,
+                start_cds=start_cds_aa,
+                end_cds=end_cds_aa,
+                **elempart,
+            )
+        )
+    return peptide_segments
 
 
 def _temp_save_file(uploaded_file: InMemoryUploadedFile):
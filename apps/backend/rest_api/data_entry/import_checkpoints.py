@@ -0,0 +1,49 @@
+from rest_api.models import ImportBatch
+
+
+def record_checkpoint(
+    file_name: str, member: str, start: int | None = None, stop: int | None = None
+):
+    """
+    Remember that a part of an archive was imported: a [start, stop) range
+    of the member's rows, or the whole member without a range.
+    """
+    ImportBatch.objects.bulk_create(
+        [ImportBatch(file_id=file_name, member=member, start=start, stop=stop)],
+        ignore_conflicts=True,
+    )
+
+
+def completed_members(file_name: str) -> set[str]:
+    """Members of the archive that were imported as a whole."""
+    return set(
+        ImportBatch.objects.filter(file_id=file_name, start=None).values_list(
+            "member", flat=True
+        )
+    )
+
+
+def missing_ranges(file_name: str, member: str, row_count: int) -> list[tuple]:
+    """
+    The [start, stop) row ranges of a member without a checkpoint. Without
+    checkpoints, this is the whole member.
+    """
+    missing = []
+    position = 0
+    for start, stop in (
+        ImportBatch.objects.filter(file_id=file_name, member=member)
+        .exclude(start=None)
+        .order_by("start")
+        .values_list("start", "stop")
+    ):
+        if start > position:
+            missing.append((position, start))
+        position = max(position, stop)
+    if position < row_count:
+        missing.append((position, row_count))
+    return missing
+
+
+def clear_checkpoints(file_name: str):
+    """Drop the checkpoints of a completely imported archive."""
+    ImportBatch.objects.filter(file_id=file_name).delete()
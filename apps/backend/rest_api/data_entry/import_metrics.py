@@ -0,0 +1,91 @@
+import socket
+
+from django.db.models import Count
+from django.db.models import Sum
+
+from rest_api.models import FileProcessing
+from rest_api.models import ImportMetric
+from sonar_backend.settings import LOGGER
+from sonar_backend.version import get_version
+
+
+class ImportMetrics:
+    """
+    Collects the metrics of one imported file: file-level steps and the
+    `BatchWriteStats.as_dict()` results of its batches. `save()` stores them
+    as ImportMetric rows.
+    """
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.metrics: list[ImportMetric] = []
+        self.version = get_version()
+
+    def add_step(self, step: str, seconds: float, rows: int | None = None):
+        self.metrics.append(
+            ImportMetric(
+                step=step,
+                seconds=seconds,
+                rows=rows,
+                host=socket.gethostname(),
+                version=self.version,
+            )
+        )
+
+    def add_batch(self, batch_start: int, stats: dict):
+        host = stats.get("host")
+        batch_metrics = [
+            ("lock_wait", stats["lock_wait"], None),
+            ("deadlock_retries", 0.0, stats["deadlock_retries"]),
+        ] + [
+            (name, step["seconds"], step["rows"])
+            for name, step in stats.get("steps", {}).items()
+        ]
+        for step, seconds, rows in batch_metrics:
+            self.metrics.append(
+                ImportMetric(
+                    batch=batch_start,
+                    step=step,
+                    seconds=seconds,
+                    rows=rows,
+                    host=host,
+                    version=self.version,
+                )
+            )
+
+    def save(self):
+        """Store the metrics, errors are logged and never fail the import."""
+        try:
+            file = FileProcessing.objects.get(file_name=self.file_name)
+            for metric in self.metrics:
+                metric.file = file
+                metric.processing_job_id = file.processing_job_id
+            ImportMetric.objects.bulk_create(self.metrics)
+        except Exception as e:
+            LOGGER.error(f"Could not store import metrics: {e}")
+
+
+def summarize_metrics(metrics) -> list[dict]:
+    """
+    Sum up ImportMetric rows per step, with throughput in rows per second.
+    """
+    summary = []
+    for step in (
+        metrics.values("step")
+        .annotate(seconds=Sum("seconds"), rows=Sum("rows"), batches=Count("batch"))
+        .order_by("step")
+    ):
+        seconds = step["seconds"] or 0.0
+        rows = step["rows"]
+        summary.append(
+            {
+                "step": step["step"],
+                "seconds": round(seconds, 3),
+                "rows": rows,
+                "batches": step["batches"],
+                "rows_per_sec": (
+                    round(rows / seconds, 1) if rows is not None and seconds else None
+                ),
+            }
+        )
+    return summary
@@ -0,0 +1,110 @@
+import time
+
+from django_redis import get_redis_connection
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from rest_api.models import ProcessingJob
+from sonar_backend.settings import LOGGER
+from sonar_backend.settings import REDIS_URL
+
+# published when a job was queued, the scheduler process listens on it
+JOB_QUEUED_CHANNEL = "sonar:jobs:queued"
+# prefix of the per-job channels, the new status is published on them
+JOB_STATUS_CHANNEL = "sonar:jobs:status:"
+# back-off of the listener while Redis is unreachable
+LISTEN_RETRY_MIN_SECONDS = 1
+LISTEN_RETRY_MAX_SECONDS = 60
+
+FINAL_STATUSES = {
+    ProcessingJob.ImportType.COMPLETED,
+    ProcessingJob.ImportType.FAILED,
+}
+
+
+def notify_job_queued(job_name: str):
+    """Wake up the scheduler (see `runapscheduler`) for a newly queued job."""
+    get_redis_connection("default").publish(JOB_QUEUED_CHANNEL, job_name)
+
+
+def publish_job_status(job_name: str, status: ProcessingJob.ImportType):
+    """Publish a status change to clients waiting on the job."""
+    if REDIS_URL:
+        get_redis_connection("default").publish(
+            JOB_STATUS_CHANNEL + job_name, str(status)
+        )
+
+
+def set_job_status(job_name: str, status: ProcessingJob.ImportType):
+    """Store the status of a job and publish it."""
+    ProcessingJob.objects.filter(job_name=job_name).update(status=status)
+    publish_job_status(job_name, status)
+
+
+def wait_for_job_status(job_name: str, timeout: float) -> str:
+    """
+    Block until the job has a final status or `timeout` seconds passed.
+    Without Redis, the status is read from the database once per second.
+
+    Returns:
+        str: the current status of the job
+    Raises:
+        ProcessingJob.DoesNotExist: for an unknown job
+    """
+    deadline = time.monotonic() + timeout
+    if not REDIS_URL:
+        while True:
+            status = ProcessingJob.objects.get(job_name=job_name).status
+            if status in FINAL_STATUSES or time.monotonic() >= deadline:
+                return status
+            time.sleep(1)
+
+    pubsub = get_redis_connection("default").pubsub(ignore_subscribe_messages=True)
+    try:
+        # subscribe before reading the status, so no change is missed
+        pubsub.subscribe(JOB_STATUS_CHANNEL + job_name)
+        status = ProcessingJob.objects.get(job_name=job_name).status
+        while status not in FINAL_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            message = pubsub.get_message(timeout=remaining)
+            if message is not None:
+                status = message["data"].decode()
+    finally:
+        pubsub.close()
+    return status
+
+
+def listen_for_queued_jobs(callback):
+    """
+    Run `callback` for every batch of job notifications, forever. Jobs that
+    are queued while the callback runs are handled by one more run right
+    after, so the callback never runs twice at the same time. It also runs
+    once at start and after every reconnect, for jobs queued while no
+    listener was subscribed.
+    """
+    delay = LISTEN_RETRY_MIN_SECONDS
+    while True:
+        pubsub = get_redis_connection("default").pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(JOB_QUEUED_CHANNEL)
+            delay = LISTEN_RETRY_MIN_SECONDS
+            callback()
+            while True:
+                message = pubsub.get_message(timeout=None)
+                if message is None:
+                    continue
+                # notifications that arrived meanwhile are covered by this run
+                while pubsub.get_message(timeout=0) is not None:
+                    pass
+                LOGGER.debug(f"Job queued: {message['data'].decode()}")
+                callback()
+        except (RedisConnectionError, RedisTimeoutError) as e:
+            LOGGER.warning(
+                f"Lost the job notifications ({e}), reconnecting in {delay}s"
+            )
+            time.sleep(delay)
+            delay = min(delay * 2, LISTEN_RETRY_MAX_SECONDS)
+        finally:
+            pubsub.close()
@@ -0,0 +1,141 @@
+from django.db import connection
+from django.db import transaction
+
+from rest_api.data_entry.batch_write import MUTATION_LOCK_KEY
+from rest_api.models import AminoAcidMutation
+from rest_api.models import AnnotationType
+from rest_api.models import NucleotideMutation
+from sonar_backend.settings import LOGGER
+from sonar_backend.settings import MUTATION_GC_BATCH_SIZE
+
+
+def _tables() -> dict[str, str]:
+    return {
+        "nt_mutation": NucleotideMutation._meta.db_table,
+        "aa_mutation": AminoAcidMutation._meta.db_table,
+        "nt_alignments": NucleotideMutation.alignments.through._meta.db_table,
+        "aa_alignments": AminoAcidMutation.alignments.through._meta.db_table,
+        "aa_parent": AminoAcidMutation.parent.through._meta.db_table,
+        "annotations": AnnotationType.mutations.through._meta.db_table,
+    }
+
+
+# Unreferenced mutations of one kind: no alignment links to them anymore.
+# The link tables are indexed by mutation, so this is an anti join.
+UNREFERENCED = {
+    "nt": """
+        FROM {nt_mutation} m
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {nt_alignments} a WHERE a.nucleotidemutation_id = m.id
+        )
+    """,
+    "aa": """
+        FROM {aa_mutation} m
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {aa_alignments} a WHERE a.aminoacidmutation_id = m.id
+        )
+    """,
+}
+
+# rows that reference the mutations (`%(ids)s`), deleted before them
+DEPENDENT_ROWS = {
+    "nt": [
+        ("annotation_links", "{annotations}", "nucleotidemutation_id"),
+        ("parent_links", "{aa_parent}", "nucleotidemutation_id"),
+    ],
+    "aa": [
+        ("parent_links", "{aa_parent}", "aminoacidmutation_id"),
+    ],
+}
+
+MUTATION_TABLES = {"nt": "{nt_mutation}", "aa": "{aa_mutation}"}
+
+
+def unused_mutations_report() -> dict:
+    """
+    Dry run: count the unreferenced mutations and the rows that would be
+    deleted with them, without deleting or locking anything.
+    """
+    tables = _tables()
+    report = {}
+    with connection.cursor() as cursor:
+        for kind, unreferenced in UNREFERENCED.items():
+            unreferenced = unreferenced.format(**tables)
+            cursor.execute(f"SELECT count(*) {unreferenced}")
+            counts = {"mutations": cursor.fetchone()[0]}
+            for name, table, column in DEPENDENT_ROWS[kind]:
+                cursor.execute(
+                    f"""
+                    SELECT count(*) FROM {table.format(**tables)}
+                    WHERE {column} IN (SELECT m.id {unreferenced})
+                    """
+                )
+                counts[name] = cursor.fetchone()[0]
+            report[kind] = counts
+    return report
+
+
+def delete_unused_mutation_batch(kind: str, after_id: int, limit: int) -> list[int]:
+    """
+    Delete up to `limit` unreferenced mutations ("nt" or "aa") with an id
+    above `after_id`, together with their annotation and parent links.
+
+    The transaction holds the mutation advisory lock exclusively, so no import
+    batch links a mutation while it is checked and deleted. Rows locked by
+    other transactions are skipped and left for the next run.
+
+    Returns:
+        list[int]: ids of the deleted mutations, sorted
+    """
+    tables = _tables()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [MUTATION_LOCK_KEY])
+        cursor.execute(
+            f"""
+            SELECT m.id {UNREFERENCED[kind].format(**tables)}
+            AND m.id > %(after_id)s
+            ORDER BY m.id
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+            """,
+            {"after_id": after_id, "limit": limit},
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            return ids
+        for _, table, column in DEPENDENT_ROWS[kind]:
+            cursor.execute(
+                f"DELETE FROM {table.format(**tables)} WHERE {column} = ANY(%(ids)s)",
+                {"ids": ids},
+            )
+        cursor.execute(
+            f"DELETE FROM {MUTATION_TABLES[kind].format(**tables)} WHERE id = ANY(%(ids)s)",
+            {"ids": ids},
+        )
+    return ids
+
+
+def clean_unused_mutations(batch_size: int = MUTATION_GC_BATCH_SIZE) -> dict:
+    """
+    Delete all nucleotide and amino acid mutations that no alignment refers
+    to anymore, e.g. after samples were deleted or re-imported. Amino acid
+    mutations go first, so their parent links are gone before the nucleotide
+    mutations are checked. Every batch is its own transaction, imports only
+    wait for the batch that is running.
+
+    Returns:
+        dict: number of deleted mutations per kind
+    """
+    deleted = {}
+    for kind in ("aa", "nt"):
+        deleted[kind] = 0
+        after_id = 0
+        while True:
+            ids = delete_unused_mutation_batch(kind, after_id, batch_size)
+            if not ids:
+                break
+            deleted[kind] += len(ids)
+            after_id = ids[-1]
+            LOGGER.debug(f"Deleted {deleted[kind]} unused {kind} mutations so far")
+    LOGGER.info(f"Deleted unused mutations: {deleted}")
+    return deleted
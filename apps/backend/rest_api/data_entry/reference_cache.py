@@ -0,0 +1,95 @@
+from django.core.cache import cache
+
+from rest_api.models import CDS
+from rest_api.models import Replicon
+from sonar_backend.settings import LOGGER
+from sonar_backend.settings import REDIS_URL
+
+# bumped in the shared (redis) cache whenever a reference changes
+REFERENCE_CACHE_VERSION_KEY = "reference_cache_version"
+# without redis, there are no other worker processes to notify and the
+# version is only kept in this process
+_local_version = 0
+
+
+class ReferenceCache:
+    """
+    Replicon and CDS lookups for the sample import, kept per process.
+
+    Lookups are by accession. On a miss, every replicon and CDS of the
+    reference the accession belongs to is loaded at once, so a worker process
+    queries a reference once instead of once per task. Large sequence columns
+    are deferred, only IDs and coordinates are needed for the import.
+
+    Use `get_reference_cache()` to obtain the process instance.
+    """
+
+    def __init__(self, version: int = 0):
+        self.version = version
+        self.replicons: dict[str, Replicon] = {}
+        self.cds: dict[str, CDS | None] = {}
+        self._loaded_references: set[int] = set()
+
+    def _load_reference(self, reference_id: int):
+        if reference_id in self._loaded_references:
+            return
+        replicons = Replicon.objects.filter(reference_id=reference_id).defer("sequence")
+        for replicon in replicons:
+            self.replicons[replicon.accession] = replicon
+        cds_list = CDS.objects.filter(gene__replicon__reference_id=reference_id).defer(
+            "sequence"
+        )
+        for cds in cds_list:
+            self.cds[cds.accession] = cds
+        self._loaded_references.add(reference_id)
+        LOGGER.debug(f"Reference cache: loaded reference {reference_id}")
+
+    def get_replicon(self, accession: str) -> Replicon:
+        """Raises Replicon.DoesNotExist for unknown accessions."""
+        if accession not in self.replicons:
+            replicon = Replicon.objects.only("reference_id").get(accession=accession)
+            self._load_reference(replicon.reference_id)
+        return self.replicons[accession]
+
+    def get_cds(self, accession: str) -> CDS | None:
+        if accession not in self.cds:
+            reference_id = (
+                CDS.objects.filter(accession=accession)
+                .values_list("gene__replicon__reference_id", flat=True)
+                .first()
+            )
+            if reference_id is not None:
+                self._load_reference(reference_id)
+            # remember unknown accessions as well
+            self.cds.setdefault(accession, None)
+        return self.cds[accession]
+
+
+def invalidate_reference_cache():
+    """Make every process drop its reference cache before the next batch."""
+    global _local_version
+    if not REDIS_URL:
+        _local_version += 1
+        return
+    try:
+        cache.incr(REFERENCE_CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(REFERENCE_CACHE_VERSION_KEY, 1, timeout=None)
+
+
+_reference_cache: ReferenceCache | None = None
+
+
+def get_reference_cache() -> ReferenceCache:
+    """
+    The reference cache of this process. The shared version key is checked on
+    every call, so call it once per batch and not per variant.
+    """
+    global _reference_cache
+    if REDIS_URL:
+        version = cache.get(REFERENCE_CACHE_VERSION_KEY, 0)
+    else:
+        version = _local_version
+    if _reference_cache is None or _reference_cache.version != version:
+        _reference_cache = ReferenceCache(version)
+    return _reference_cache
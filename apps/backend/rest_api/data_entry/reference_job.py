@@ -1,3 +1,4 @@
+from rest_api.data_entry.reference_cache import invalidate_reference_cache
 from rest_api.models import Alignment
 from rest_api.models import Reference
 
@@ -10,6 +11,7 @@ def delete_reference(reference_accession):
     ).count()
     _ref = Reference.objects.filter(accession=reference_accession)
     _ref.delete()
+    invalidate_reference_cache()
 
     # check if sample likned to any ref? if none also delete it
     # and property as well....
@@ -2,22 +2,53 @@ from datetime import datetime
 import pathlib
 import pickle
 import shutil
+import tempfile
+import time
 import traceback
-import zipfile
 
-from celery import group
+from celery import chord
 from celery import shared_task
 from django.core.cache import cache
 from django.core.exceptions import FieldDoesNotExist
 from django.db import DataError
 from django.db import transaction
+from django.db.models import F
+from django.db.models import FloatField
+from django.db.models import OuterRef
 from django.db.models import Q
+from django.db.models import Subquery
+from django.db.models.functions import Cast
 from django.utils import timezone
 from line_profiler import LineProfiler
 import pandas as pd
 
 from rest_api import models
+from rest_api.data_entry.alignment_reuse import link_reused_alignments
+from rest_api.data_entry.alignment_reuse import mark_alignments_complete
 from rest_api.data_entry.annotation_import import AnnotationImport
+from rest_api.data_entry.archive import has_member
+from rest_api.data_entry.archive import list_members
+from rest_api.data_entry.archive import open_member
+from rest_api.data_entry.batch_sizing import batch_work
+from rest_api.data_entry.batch_sizing import plan_batches
+from rest_api.data_entry.batch_sizing import record_throughput
+from rest_api.data_entry.batch_write import BatchWriteStats
+from rest_api.data_entry.batch_write import InsertMissing
+from rest_api.data_entry.batch_write import mutation_write_lock
+from rest_api.data_entry.copy_loader import copy_load_batch
+from rest_api.data_entry.import_checkpoints import clear_checkpoints
+from rest_api.data_entry.import_checkpoints import completed_members
+from rest_api.data_entry.import_checkpoints import missing_ranges
+from rest_api.data_entry.import_checkpoints import record_checkpoint
+from rest_api.data_entry.import_metrics import ImportMetrics
+from rest_api.data_entry.job_events import publish_job_status
+from rest_api.data_entry.job_events import set_job_status
+from rest_api.data_entry.reference_cache import get_reference_cache
+from rest_api.data_entry.reference_cache import ReferenceCache
+from rest_api.data_entry.sample_import import count_manifest_variants
+from rest_api.data_entry.sample_import import load_batch
+from rest_api.data_entry.sample_import import MANIFEST_FILE
+from rest_api.data_entry.sample_import import MutationRegistry
 from rest_api.data_entry.sample_import import SonarImport
 from rest_api.models import Alignment
 from rest_api.models import AminoAcidMutation
@@ -31,68 +62,98 @@ from rest_api.models import Sequence
 from rest_api.serializers import Sample2PropertyBulkCreateOrUpdateSerializer
 from rest_api.utils import parse_date
 from rest_api.utils import PropertyColumnMapping
+from sonar_backend.settings import IMPORT_BATCH_RETRIES
+from sonar_backend.settings import IMPORT_REUSE_ALIGNMENTS
 from sonar_backend.settings import KEEP_IMPORTED_DATA_FILES
 from sonar_backend.settings import LOGGER
 from sonar_backend.settings import PROFILE_IMPORT
 from sonar_backend.settings import PROPERTY_BATCH_SIZE
 from sonar_backend.settings import REDIS_URL
 from sonar_backend.settings import SAMPLE_BATCH_SIZE
+from sonar_backend.settings import SAMPLE_IMPORT_LOADER
 from sonar_backend.settings import SONAR_DATA_ARCHIVE
 from sonar_backend.settings import SONAR_DATA_ENTRY_FOLDER
 from sonar_backend.settings import SONAR_DATA_PROCESSING_FOLDER
 
-property_cache = {}
-
 
 def check_for_new_data():
-    """Checks for new processing jobs in the database queue and processes them sequentially.
+    """Runs the queued processing jobs, one at a time.
     Steps:
-    - Fetches jobs with `QUEUED` status from the 'ProcessingJob' table, ordered by 'entry_time'.
-    - For each job:
-        - Retrieves associated files from 'FileProcessing'.
-        - If an error occurs (files not found), updates job status to 'FAILED'.
-        - Moves valid files to the processing directory.
-        - Calls 'import_archive' to handle import logic.
-    - Recursively calls itself to process subsequent jobs.
-
+    - Claims jobs with `QUEUED` status from the 'ProcessingJob' table, by
+      priority and then 'entry_time', see `_claim_next_job`.
+    - Runs every claimed job (`_run_job`).
+    - Returns when no queued job is left.
+
+    With Celery, a job only runs here until its batches are dispatched, the
+    batches of several jobs are imported by the Celery workers side by side.
+    Jobs are claimed with SKIP LOCKED, so concurrent callers (the upload view,
+    the scheduler, management commands) never pick the same job.
     """
-    processing_dir = pathlib.Path(SONAR_DATA_PROCESSING_FOLDER)
     if REDIS_URL is None:
         print("--------------- WARNING -----------------")
         print("REDIS_URL not set, running without celery.")
         print("This will take a long time.")
         print("--------------- ------- -----------------")
-    # only one worker (Master) can take a job at a time
+    while (job := _claim_next_job()) is not None:
+        try:
+            _run_job(job)
+        except Exception as e:
+            # _run_job handles import errors itself, anything else is a bug
+            LOGGER.error(f"Processing job {job.job_name} crashed: {e}")
+    print("---- No new jobs found. ----")
+
+
+def _claim_next_job() -> ProcessingJob | None:
+    """Take the next queued job and mark it as in progress."""
     with transaction.atomic():
-        # Fetch and lock a single job with QUEUED status NOTE: Order of entrytime is matter!!
+        # Rows locked by another caller are skipped, NOTE: Order of entrytime is matter!!
         job = (
-            ProcessingJob.objects.select_for_update()
+            ProcessingJob.objects.select_for_update(skip_locked=True)
             .filter(status=ProcessingJob.ImportType.QUEUED)
-            .order_by("entry_time")
+            .order_by("-priority", "entry_time")
             .first()
         )
         if job is None:
-            return
+            return None
         # Update job status to IN_PROGRESS
         job.status = ProcessingJob.ImportType.IN_PROGRESS
-        job.save()
+        job.save(update_fields=["status"])
+    publish_job_status(job.job_name, job.status)
+    return job
+
 
+def _run_job(job: ProcessingJob):
+    """
+    Import the files of a claimed job.
+    Steps:
+    - Retrieves associated files from 'FileProcessing'.
+    - If an error occurs (files not found), updates job status to 'FAILED'.
+    - Skips files that were imported before the job was retried.
+    - Moves valid files to the processing directory.
+    - Calls 'import_archive' for every file and stores the job progress.
+
+    With Celery, this returns as soon as the batches of all files are
+    dispatched, the chord callbacks finish the job.
+    """
+    processing_dir = pathlib.Path(SONAR_DATA_PROCESSING_FOLDER)
     LOGGER.info(f"## New processing job: {job.job_name} ---")
-    files = FileProcessing.objects.filter(processing_job=job)
-    if not files.exists():
+    files = list(FileProcessing.objects.filter(processing_job=job))
+    if not files:
         LOGGER.warning(
             f"No associated files found, in {job.job_name}, marking as FAILED, continue the proces.."
         )
-        job.status = ProcessingJob.ImportType.FAILED
-        job.save()
+        set_job_status(job.job_name, ProcessingJob.ImportType.FAILED)
         return
 
-    for file in files:
+    # files imported before the job was retried
+    states = _file_states(job)
+    imported = [file for file in files if states[file.file_name]]
+    files = [file for file in files if not states[file.file_name]]
+    for number, file in enumerate(files, start=len(imported) + 1):
         file_path = pathlib.Path(SONAR_DATA_ENTRY_FOLDER).joinpath(file.file_name)
         if not file_path.exists():
             LOGGER.error(f"File {file_path} does not exist, marking job as FAILED!")
-            job.status = ProcessingJob.ImportType.FAILED
-            job.save()
+            set_job_status(job.job_name, ProcessingJob.ImportType.FAILED)
             return
 
         # move files to SONAR_DATA_PROCESSING_FOLDER
@@ -101,67 +162,69 @@ def check_for_new_data():
             pkl_file = file_path.with_suffix(".pkl")
             new_zip_path = file_path.rename(processing_dir.joinpath(file_path.name))
             new_pkl_path = pkl_file.rename(processing_dir.joinpath(pkl_file.name))
-            import_archive(
+            finished = import_archive(
                 new_zip_path, pkl_path=new_pkl_path
             )  # Pass the .pkl path to import_archive
         else:
             # process as normal sample or annotation import
             new_zip_path = file_path.rename(processing_dir.joinpath(file_path.name))
-            import_archive(new_zip_path)
-
-    # Recursively check for new data after processing current batch
-    check_for_new_data()
-    print("---- No new jobs found. ----")
+            finished = import_archive(new_zip_path)
+        if finished:
+            # with celery, the progress is counted per batch instead
+            ProcessingJob.objects.filter(pk=job.pk).update(
+                progress=number / (len(imported) + len(files))
+            )
 
 
 def import_archive(process_file_path: pathlib.Path, pkl_path: pathlib.Path = None):
-    """Processes an archive file by extracting and importing its contents.
+    """Processes an archive file by importing its contents.
     Steps:
     - Determines the corresponding `ProcessingJob` based on the file.
-    - Updates the job status to `IN_PROGRESS`.
-    - Extracts the archive into a temporary directory.
+    - Reads the archive members in place, nothing is extracted to disk.
     - Differentiates between property imports (requires `.pkl` mapping) and sample/annotation imports.
     - Uses Celery (if available) to process batches; otherwise, processes sequentially.
-    - On success, moves files to `completed` directory or deletes them.
-    - On failure, moves files to `error` directory and logs the error.
-    - Updates the job status based on the completion of the processed file.
+    - Finishes the import with `_finish_import`: moves the files, logs the
+      result and updates the job status.
 
-    NOTE: [optional] if it just starts, we update the ProcessingJob (to IP)
+    With Celery, the batches are dispatched as a chord and this returns right
+    away. The chord callbacks (`on_sample_batches_done` & co) record failed
+    batches on the job, retry them and finish the import.
+
+    Returns:
+        bool: False if the import continues in Celery, True if it is finished
     """
-    temp_dir = (
-        pathlib.Path(SONAR_DATA_ARCHIVE)
-        .joinpath("temp")
-        .joinpath(process_file_path.stem)
-    )
+    archive_path = str(process_file_path)
+    metrics = ImportMetrics(process_file_path.name)
+    filename_ID = process_file_path.name
+    # get JOB ID based on the given files
+    proJob_obj = ProcessingJob.objects.filter(files__file_name=filename_ID).first()
+    if not proJob_obj:
+        LOGGER.warning(
+            "The given import files is not related to any jobID (skip this batch)"
+        )
+        return True
+    LOGGER.info(f"Process job: {proJob_obj.job_name}")
+    # everything the chord callbacks need, JSON-serializable
+    context = {
+        "file_name": filename_ID,
+        "job_name": proJob_obj.job_name,
+        "archive_path": archive_path,
+        "pkl_path": str(pkl_path) if pkl_path else None,
+        "import_type": ImportLog.ImportType.UNKNOWN,
+        "started": time.time(),
+    }
+    chunk_dir = None
     try:
-        filename_ID = process_file_path.name
-        # get JOB ID based on the given files
-        proJob_obj = ProcessingJob.objects.filter(files__file_name=filename_ID).first()
-        if not proJob_obj:
-            LOGGER.warning(
-                "The given import files is not related to any jobID (skip this batch)"
-            )
-            return
-        job_ID = proJob_obj.job_name
-        LOGGER.info(f"Process job: {job_ID}")
-        print(f"Unzip to {temp_dir}")
-        # ProcessingJob.objects.filter(job_name=job_ID).update(
-        #     status=ProcessingJob.ImportType.IN_PROGRESS
-        # )
-        # unzip the zip file to SONAR_DATA_ARCHIVE
-        with zipfile.ZipFile(process_file_path, "r") as zip_ref:
-            zip_ref.extractall(temp_dir)
-
         # Files are distributed and processed
-        print(f"Running data entry for {temp_dir}")
+        print(f"Running data entry for {archive_path}")
         if pkl_path and pkl_path.exists():
             # property import
-            import_type = ImportLog.ImportType.PROPERTY
+            context["import_type"] = ImportLog.ImportType.PROPERTY
             print(f"Property import detected")
             batch_size = PROPERTY_BATCH_SIZE
             print("Batch size:", batch_size)
-            property_files_tsv = list(temp_dir.glob("**/*.tsv"))
-            property_files_csv = list(temp_dir.glob("**/*.csv"))
+            property_files_tsv = list_members(archive_path, "*.tsv")
+            property_files_csv = list_members(archive_path, "*.csv")
             property_files = (
                 property_files_tsv + property_files_csv
             )  # Combine both types
@@ -173,120 +236,314 @@ def import_archive(process_file_path: pathlib.Path, pkl_path: pathlib.Path = Non
                         pkl_file
                     )  # Load the .pkl file into column_mapping
 
-                use_celery = bool(REDIS_URL)  # Use Celery if Redis is configured
+                if REDIS_URL:
+                    # Use Celery if Redis is configured
+                    chunk_dir = pathlib.Path(
+                        tempfile.mkdtemp(
+                            prefix="properties_", dir=SONAR_DATA_PROCESSING_FOLDER
+                        )
+                    )
+                property_jobs = []
+                property_rows = 0
+                property_timer = time.perf_counter()
                 for property_file in property_files:
-                    sep = "," if property_file.suffix == ".csv" else "\t"
-                    import_property(
-                        str(property_file),
-                        sep,
-                        use_celery,
-                        column_mapping,
-                        batch_size=batch_size,
-                    )  # Pass column_mapping
+                    sep = "," if property_file.endswith(".csv") else "\t"
+                    with open_member(archive_path, property_file) as handle:
+                        rows, jobs = import_property(
+                            handle,
+                            sep,
+                            column_mapping,
+                            batch_size=batch_size,
+                            chunk_dir=chunk_dir,
+                        )  # Pass column_mapping
+                    property_rows += rows
+                    property_jobs.extend(jobs)
+                if chunk_dir is not None and not property_jobs:
+                    shutil.rmtree(chunk_dir, ignore_errors=True)
+                if property_jobs:
+                    context["chunk_dir"] = str(chunk_dir)
+                    context["property_rows"] = property_rows
+                    chord(property_jobs)(
+                        on_property_batches_done.s(context).on_error(
+                            on_import_error.s(context)
+                        )
+                    )
+                    metrics.save()
+                    return False
+                metrics.add_step(
+                    "properties",
+                    time.perf_counter() - property_timer,
+                    property_rows,
+                )
 
         else:
             batch_size = SAMPLE_BATCH_SIZE
             print("Batch size:", batch_size)
             # var and vcf
-            sample_files = list(temp_dir.joinpath("samples").glob("**/*.sample"))
-            anno_files = list(temp_dir.joinpath("anno").glob("**/*.vcf.*"))
-            print(f"Sample: {len(sample_files)} files found")
+            scan_timer = time.perf_counter()
+            if has_member(archive_path, MANIFEST_FILE):
+                variant_counts = count_manifest_variants(archive_path)
+            elif list_members(archive_path, "samples/*.sample"):
+                raise Exception(
+                    "Archive contains per-sample .sample files, which are no longer "
+                    "supported. Please update sonar-cli."
+                )
+            else:
+                variant_counts = []
+            sample_count = len(variant_counts)
+            anno_files = list_members(archive_path, "anno/*.vcf.*")
+            # parts imported by an earlier, failed run of this archive
+            imported_members = completed_members(filename_ID)
+            anno_files = [file for file in anno_files if file not in imported_members]
+            metrics.add_step("archive_scan", time.perf_counter() - scan_timer)
+            print(f"Sample: {sample_count} samples found")
             print(f"Annotation (vcfs): {len(anno_files)} files found")
-            if len(sample_files) > 0:
-                import_type = ImportLog.ImportType.SAMPLE
+            if sample_count > 0:
+                context["import_type"] = ImportLog.ImportType.SAMPLE
             elif len(anno_files) > 0:
-                import_type = ImportLog.ImportType.ANNOTATION
+                context["import_type"] = ImportLog.ImportType.ANNOTATION
             else:
-                import_type = ImportLog.ImportType.SAMPLE_ANNOTATION_ARCHIVE
+                context["import_type"] = ImportLog.ImportType.SAMPLE_ANNOTATION_ARCHIVE
 
             timer = datetime.now()
 
-            number_of_batches = (
-                (len(sample_files) + batch_size - 1) // batch_size
-                if sample_files
-                else (len(anno_files) + batch_size - 1) // batch_size
-            )
-
-            print(f"Total number of batches: {number_of_batches}")
-            sample_files = [str(file) for file in sample_files]
+            # [start, stop) row ranges of the manifest, sized by their variants
+            batches = [
+                (offset + start, offset + stop)
+                for offset, end in missing_ranges(
+                    filename_ID, MANIFEST_FILE, sample_count
+                )
+                for start, stop in plan_batches(variant_counts[offset:end])
+            ]
+            print(f"Total number of batches: {len(batches)}")
             if batch_size:
-                replicon_cache = {}
-                gene_cache_by_accession = {}
-                gene_cache_by_var_pos = {}
                 if REDIS_URL:
                     print("setting up sample import celery jobs..")
-                    sample_jobs = []
-                    for i in range(0, len(sample_files), batch_size):
-                        batch = sample_files[i : i + batch_size]
-                        sample_jobs.append(
-                            process_batch.s(
-                                batch,
-                                replicon_cache,
-                                gene_cache_by_accession,
-                                gene_cache_by_var_pos,
-                                str(temp_dir),
-                            )
-                        )
-                    results = group(sample_jobs).apply_async().get()
-                    for result in results:
-                        if not result[0]:
-                            raise Exception(
-                                f"Sample Import Error: {result[1]} - {result[2]}"
-                            )
-                    results = (
-                        group([process_annotation.s(str(file)) for file in anno_files])
-                        .apply_async()
-                        .get()
-                    )
-                    for result in results:
-                        if not result[0]:
-                            raise Exception(
-                                f"Annotation Import Error: {result[1]} - {result[2]}"
-                            )
+                    context["sample_count"] = sample_count
+                    context["anno_files"] = anno_files
+                    if batches:
+                        ProcessingJob.objects.filter(
+                            job_name=context["job_name"]
+                        ).update(batch_count=F("batch_count") + len(batches))
+                        _dispatch_sample_batches(context, batches, attempt=0)
+                    else:
+                        _dispatch_annotations(context)
+                    metrics.save()
+                    return False
                 else:
-                    replicon_cache = {}
-                    gene_cache_by_accession = {}
+                    reference_cache = get_reference_cache()
                     # Samples
-                    for i in range(0, len(sample_files), batch_size):
+                    step_timer = time.perf_counter()
+                    for batch in batches:
                         # print(
                         #     f"processing batch {(i//batch_size) + 1} of {number_of_batches}"
                         # )
                         # batchtimer = datetime.now()
-                        batch = sample_files[i : i + batch_size]
-                        process_batch_single_thread(
-                            batch,
-                            replicon_cache,
-                            gene_cache_by_accession,
-                            gene_cache_by_var_pos,
-                            str(temp_dir),
+                        batch_timer = time.perf_counter()
+                        with mutation_write_lock():
+                            batch_stats = process_batch_single_thread(
+                                batch,
+                                reference_cache,
+                                archive_path,
+                                filename_ID,
+                            )
+                        _record_batch_throughput(
+                            batch, batch_stats, time.perf_counter() - batch_timer
                         )
+                        metrics.add_batch(batch[0], batch_stats)
+                    metrics.add_step(
+                        "samples", time.perf_counter() - step_timer, sample_count
+                    )
                     # annotation
+                    step_timer = time.perf_counter()
                     for file in anno_files:
-                        process_annotation(str(file))
+                        process_annotation(file, archive_path, filename_ID)
+                    metrics.add_step(
+                        "annotations", time.perf_counter() - step_timer, len(anno_files)
+                    )
 
                     # print(
-                    #     f"batch {(i//batch_size) + 1} done in {datetime.now() - batchtimer}"
+                    #     f"batch {(i//batch_size) + 1} done in {datetime.now() - timer}"
                     # )
 
             LOGGER.info(f"import done in {datetime.now() - timer}")
     except Exception as e:
+        metrics.save()
+        if chunk_dir is not None:
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+        _finish_import(context, e, traceback.format_exc())
+        return True
+    metrics.save()
+    _finish_import(context)
+    return True
+
+
+def _dispatch_sample_batches(context: dict, batches: list, attempt: int):
+    chord(
+        process_batch.s(
+            batch, context["archive_path"], context["job_name"], context["file_name"]
+        )
+        for batch in batches
+    )(
+        on_sample_batches_done.s(
+            {**context, "batches": batches, "attempt": attempt}
+        ).on_error(on_import_error.s(context))
+    )
+
+
+def _dispatch_annotations(context: dict):
+    if not context["anno_files"]:
+        _finish_import(context)
+        return
+    context = {**context, "started": time.time()}
+    chord(
+        process_annotation.s(file, context["archive_path"], context["file_name"])
+        for file in context["anno_files"]
+    )(on_annotations_done.s(context).on_error(on_import_error.s(context)))
+
+
+def _record_failed_batches(job_name: str, failures: list[dict]):
+    with transaction.atomic():
+        job = ProcessingJob.objects.select_for_update().get(job_name=job_name)
+        job.failed_batches = job.failed_batches + failures
+        job.save(update_fields=["failed_batches"])
+
+
+@shared_task
+def on_sample_batches_done(results: list, context: dict):
+    """
+    Chord callback of the sample batches of one file: stores the batch
+    metrics, dispatches failed batches again (up to IMPORT_BATCH_RETRIES
+    times) and continues with the annotations.
+    """
+    try:
+        metrics = ImportMetrics(context["file_name"])
+        failed = []
+        for batch, result in zip(context["batches"], results):
+            if result[0]:
+                metrics.add_batch(batch[0], result[3])
+            else:
+                failed.append((batch, result))
+        if not failed:
+            # the whole sample import, including retries
+            metrics.add_step(
+                "samples", time.time() - context["started"], context["sample_count"]
+            )
+        metrics.save()
+        successful = [result for result in results if result[0]]
+        lock_wait = sum(result[3]["lock_wait"] for result in successful)
+        write_time = sum(result[3]["write"] for result in successful)
+        LOGGER.info(
+            f"Sample batches: {lock_wait:.2f}s lock wait, {write_time:.2f}s write"
+        )
+        if failed:
+            _record_failed_batches(
+                context["job_name"],
+                [
+                    {
+                        "file": context["file_name"],
+                        "batch": batch,
+                        "attempt": context["attempt"],
+                        "error": result[1],
+                    }
+                    for batch, result in failed
+                ],
+            )
+            if context["attempt"] < IMPORT_BATCH_RETRIES:
+                LOGGER.warning(
+                    f"{len(failed)} sample batches of {context['file_name']} failed, retrying"
+                )
+                _dispatch_sample_batches(
+                    context,
+                    [batch for batch, _ in failed],
+                    attempt=context["attempt"] + 1,
+                )
+                return
+            batch, result = failed[0]
+            raise Exception(
+                f"Sample Import Error: {len(failed)} batches failed, "
+                f"first at row {batch[0]}: {result[1]} - {result[2]}"
+            )
+        _dispatch_annotations(context)
+    except Exception as e:
+        _finish_import(context, e, traceback.format_exc())
+
+
+@shared_task
+def on_annotations_done(results: list, context: dict):
+    """Chord callback of the annotation files of one archive."""
+    try:
+        for result in results:
+            if not result[0]:
+                raise Exception(f"Annotation Import Error: {result[1]} - {result[2]}")
+        metrics = ImportMetrics(context["file_name"])
+        metrics.add_step("annotations", time.time() - context["started"], len(results))
+        metrics.save()
+    except Exception as e:
+        _finish_import(context, e, traceback.format_exc())
+    else:
+        _finish_import(context)
+
+
+@shared_task
+def on_property_batches_done(results: list, context: dict):
+    """Chord callback of the property chunks of one archive."""
+    shutil.rmtree(context["chunk_dir"], ignore_errors=True)
+    try:
+        for result in results:
+            if not result[0]:
+                raise Exception(f"Property Import Error: {result[1]}")
+        metrics = ImportMetrics(context["file_name"])
+        metrics.add_step(
+            "properties", time.time() - context["started"], context["property_rows"]
+        )
+        metrics.save()
+    except Exception as e:
+        _finish_import(context, e, traceback.format_exc())
+    else:
+        _finish_import(context)
+
+
+@shared_task
+def on_import_error(request, exc, trace, context: dict):
+    """
+    Error callback of the chords, for batch tasks that did not return a result
+    (e.g. killed by the time limit) or a failing chord callback.
+    """
+    if context.get("chunk_dir"):
+        shutil.rmtree(context["chunk_dir"], ignore_errors=True)
+    _finish_import(context, exc, str(trace or ""))
+
+
+def _finish_import(context: dict, error: Exception = None, stack_trace: str = None):
+    """
+    Move the imported files to the archive (or delete them), log the import
+    result and update the job status.
+    """
+    process_file_path = pathlib.Path(context["archive_path"])
+    pkl_path = pathlib.Path(context["pkl_path"]) if context["pkl_path"] else None
+    filename_ID = context["file_name"]
+    job_ID = context["job_name"]
+    if error is not None:
         # TODO: [optional] if fail, we update the ProcessingJob right now.
-        LOGGER.error(f"Error : {e}")
+        LOGGER.error(f"Error : {error}")
         error_dir = pathlib.Path(SONAR_DATA_ARCHIVE).joinpath("error")
         error_dir.mkdir(parents=True, exist_ok=True)
         process_file_path.rename(error_dir.joinpath(process_file_path.name))
         if pkl_path and pkl_path.exists():
             pkl_path.rename(error_dir.joinpath(pkl_path.name))
         ImportLog.objects.create(
-            type=import_type,
+            type=context["import_type"],
             file=FileProcessing.objects.get(file_name=filename_ID),
             success=False,
-            exception_text=e,
-            stack_trace=traceback.format_exc(),
+            exception_text=error,
+            stack_trace=stack_trace,
         )
         LOGGER.error(f"--- Exception: move to {error_dir} ---")
 
     else:  # no exception occurs
+        # the checkpoints are only needed to retry a failed import
+        clear_checkpoints(filename_ID)
         if KEEP_IMPORTED_DATA_FILES:
             completed_dir = pathlib.Path(SONAR_DATA_ARCHIVE).joinpath("completed")
             completed_dir.mkdir(parents=True, exist_ok=True)
@@ -301,57 +558,155 @@ def import_archive(process_file_path: pathlib.Path, pkl_path: pathlib.Path = Non
             if pkl_path and pkl_path.exists():
                 pkl_path.unlink()
         ImportLog.objects.create(
-            type=import_type,
+            type=context["import_type"],
             file=FileProcessing.objects.get(file_name=filename_ID),
             success=True,
         )
-    finally:
-        # TODO: need to rethink about how to finalize the job status
-        # The  _file_count = total_all_file - total_file is not a great idea
-        shutil.rmtree(temp_dir)
-        # --- update job status
-
-        # list all related files
-        all_file_obj = FileProcessing.objects.filter(processing_job__job_name=job_ID)
-        total_all_file = all_file_obj.count()
-        all_file_names_list = all_file_obj.values_list("file_name", flat=True)
-        # Import search only success and count
-        _file_obj = ImportLog.objects.filter(file__in=all_file_names_list)
-        total_file = _file_obj.count()
-        # Calculate the difference between total files and successful imports
-        _file_count = total_all_file - total_file
-        # Update ProcessingJob status based on file processing status
-        if _file_count > 0:
-            # "In Progress"
-            ProcessingJob.objects.filter(job_name=job_ID).update(
-                status=ProcessingJob.ImportType.IN_PROGRESS
+
+    # --- update job status
+    # Files of one job can finish at the same time. The job row is locked, so
+    # the last file sees the logs of all others and sets the final status.
+    with transaction.atomic():
+        job = ProcessingJob.objects.select_for_update().get(job_name=job_ID)
+        states = _file_states(job).values()
+        if None in states:
+            # other files of the job are not imported yet, it stays in progress
+            return
+        job_status = (
+            ProcessingJob.ImportType.FAILED
+            if False in states
+            else ProcessingJob.ImportType.COMPLETED
+        )
+        ProcessingJob.objects.filter(pk=job.pk).update(status=job_status)
+    publish_job_status(job_ID, job_status)
+    if job_status == ProcessingJob.ImportType.FAILED:
+        LOGGER.error(f"### Job ID: {job_ID} \nRun status: Failed")
+    else:
+        LOGGER.info(f"### Job ID: {job_ID} \nRun status: Completed")
+
+
+def _file_states(job: ProcessingJob) -> dict[str, bool | None]:
+    """
+    Import result per file of the job, from its latest import log: True or
+    False, None while the file is not imported yet. Failures from before the
+    job was retried count as not imported.
+    """
+    latest = ImportLog.objects.filter(file_id=OuterRef("file_name")).order_by(
+        "-updated"
+    )
+    states = {}
+    for file_name, success, logged in (
+        FileProcessing.objects.filter(processing_job=job)
+        .annotate(
+            success=Subquery(latest.values("success")[:1]),
+            logged=Subquery(latest.values("updated")[:1]),
+        )
+        .values_list("file_name", "success", "logged")
+    ):
+        if success is False and job.retried_at and logged < job.retried_at:
+            success = None
+        states[file_name] = success
+    return states
+
+
+def retry_failed_job(job_name: str, force: bool = False) -> list[str]:
+    """
+    Queue the files of a failed job again. Their archives are moved back to
+    the entry folder and the import skips the batches and annotation files
+    with a checkpoint. Files that were imported are not touched. With
+    `force`, a job that is still in progress is retried as well, e.g. after
+    its worker was killed.
+
+    Returns:
+        list[str]: names of the queued files
+    Raises:
+        ProcessingJob.DoesNotExist: for an unknown job
+        ValueError: if the job is not failed or an archive is missing
+    """
+    allowed = {ProcessingJob.ImportType.FAILED}
+    if force:
+        allowed.add(ProcessingJob.ImportType.IN_PROGRESS)
+    entry_dir = pathlib.Path(SONAR_DATA_ENTRY_FOLDER)
+    with transaction.atomic():
+        job = ProcessingJob.objects.select_for_update().get(job_name=job_name)
+        if job.status not in allowed:
+            raise ValueError(
+                f"Job {job_name} is {job.get_status_display().lower()}, "
+                "only failed jobs can be retried"
             )
-            # print("In progress: %s", _file_count)
-        else:
-            # If all files are successfully processed, check if any errors occurred during import
-            error_files = ImportLog.objects.filter(file__in=all_file_obj, success=False)
-            if error_files.exists():
-                #  "Failed"
-                ProcessingJob.objects.filter(job_name=job_ID).update(
-                    status=ProcessingJob.ImportType.FAILED
-                )
-                # print(f"### Job ID: {job_ID} \nRun status: Failed")
-                LOGGER.error(f"### Job ID: {job_ID} \nRun status: Failed")
+        # where the archives of the not imported files are now
+        archives = {}
+        for file_name, success in _file_states(job).items():
+            if success:
+                continue
+            for directory in [
+                entry_dir,
+                pathlib.Path(SONAR_DATA_ARCHIVE).joinpath("error"),
+                pathlib.Path(SONAR_DATA_PROCESSING_FOLDER),
+            ]:
+                if directory.joinpath(file_name).exists():
+                    archives[file_name] = directory.joinpath(file_name)
+                    break
             else:
-                #  "Completed"
-                ProcessingJob.objects.filter(job_name=job_ID).update(
-                    status=ProcessingJob.ImportType.COMPLETED
-                )
-                LOGGER.info(f"### Job ID: {job_ID} \nRun status: Completed")
+                raise ValueError(f"Archive {file_name} of job {job_name} not found")
+        for file_name, path in archives.items():
+            pkl_path = path.with_suffix(".pkl")
+            if pkl_path.exists():
+                pkl_path.rename(entry_dir.joinpath(pkl_path.name))
+            path.rename(entry_dir.joinpath(file_name))
+        job.status = ProcessingJob.ImportType.QUEUED
+        job.retried_at = timezone.now()
+        # the unfinished batches are counted again when they are dispatched
+        job.batch_count = job.batches_done
+        job.save(update_fields=["status", "retried_at", "batch_count"])
+    publish_job_status(job_name, job.status)
+    LOGGER.info(f"Retrying {len(archives)} files of job {job_name}")
+    return list(archives)
+
+
+def _count_variants(sonar_import_objs: list[SonarImport]) -> int:
+    return sum(
+        len(sonar_import_obj.nt_vars) + len(sonar_import_obj.cds_vars)
+        for sonar_import_obj in sonar_import_objs
+    )
 
 
 @shared_task
 def process_batch(
-    batch: list[str],
-    replicon_cache,
-    gene_cache_by_accession,
-    gene_cache_by_var_pos,
-    temp_dir,
+    batch: tuple[int, int],
+    archive_path: str,
+    job_name: str = None,
+    file_name: str = None,
+):
+    """
+    Import one batch of samples. Successful batches are counted on the job,
+    get a checkpoint (a retry skips them) and update the throughput the next
+    batches are sized with. The checkpoint is written in the transaction of
+    the batch.
+    """
+    timer = time.perf_counter()
+    result = _process_batch(batch, archive_path, file_name)
+    if result[0]:
+        _record_batch_throughput(batch, result[3], time.perf_counter() - timer)
+    if result[0] and job_name:
+        ProcessingJob.objects.filter(job_name=job_name, batch_count__gt=0).update(
+            batches_done=F("batches_done") + 1,
+            progress=Cast(F("batches_done") + 1, FloatField())
+            / Cast(F("batch_count"), FloatField()),
+        )
+    return result
+
+
+def _record_batch_throughput(batch: tuple[int, int], stats: dict, seconds: float):
+    start, stop = batch
+    variant_rows = stats["steps"]["read_parquet"]["rows"]
+    record_throughput(batch_work(variant_rows, stop - start), seconds)
+
+
+def _process_batch(
+    batch: tuple[int, int],
+    archive_path: str,
+    checkpoint_file: str = None,
 ):
     parameters = locals().copy()
     if PROFILE_IMPORT:
@@ -360,119 +715,187 @@ def process_batch(
         # process_batch_run() function
         lp.add_function(SonarImport.get_mutation_objs_cds_and_parent_relations)
         lp.add_function(SonarImport.get_mutation_objs_nt)
+        lp.add_function(load_batch)
         lp.add_function(process_batch_run)
         lp.add_function(process_annotation)
         process_batch_profiled = lp(process_batch_run)
-        retval = process_batch_profiled(**parameters)
+        with mutation_write_lock():
+            retval = process_batch_profiled(**parameters)
         lp.print_stats()
         return retval
     else:
-        return process_batch_run(**parameters)
+        with mutation_write_lock():
+            return process_batch_run(**parameters)
 
 
-def process_batch_run(
-    batch: list[str],
-    replicon_cache,
-    gene_cache_by_accession,
-    gene_cache_by_var_pos,
-    temp_dir,
+def _write_batch(
+    sonar_import_objs: list[SonarImport],
+    reference_cache: ReferenceCache,
+    stats: BatchWriteStats,
+    checkpoint: tuple[str, int, int] = None,
 ):
-    try:
-        sonar_import_objs = [
-            SonarImport(pathlib.Path(file), import_folder=temp_dir) for file in batch
-        ]
-        sequences = [
+    """
+    Write the sequences, alignments and mutations of a batch. Runs in the
+    transaction of the batch (see `process_batch_run`), so its alignments are
+    only visible, and complete, together with all of their mutation links.
+    The `checkpoint` (file name, start, stop) of the batch is committed with
+    it as well.
+    """
+    if SAMPLE_IMPORT_LOADER == "copy":
+        stats.run("mutation", copy_load_batch, sonar_import_objs)
+        _complete_alignments(sonar_import_objs, stats, checkpoint)
+        return
+    sequences = sorted(
+        (
             sample_import_obj.get_sequence_obj()
             for sample_import_obj in sonar_import_objs
-        ]
+        ),
+        key=lambda sequence: sequence.name,
+    )
 
-        # Use bulk upsert
-        # performs INSERT ... ON CONFLICT DO UPDATE
-        with cache.lock("sequence"):
-            Sequence.objects.bulk_create(
-                sequences,
-                update_conflicts=True,
-                unique_fields=["name"],
-                update_fields=["seqhash", "length", "last_update_date"],
-            )
-        alignments: list[Alignment] = []
+    # Use bulk upsert, sequences may get a new seqhash
+    # performs INSERT ... ON CONFLICT DO UPDATE
+    stats.run(
+        "sequence",
+        Sequence.objects.bulk_create,
+        sequences,
+        update_conflicts=True,
+        unique_fields=["name"],
+        update_fields=["seqhash", "length", "last_update_date"],
+    )
+    registry = MutationRegistry()
+    with stats.stage("build_alignments") as step:
         for sample_import_obj in sonar_import_objs:
-            sample_import_obj.update_replicon_obj(replicon_cache)
-            sample_import_obj.create_alignment(alignments)
-
-        with cache.lock("alignment"):
-            Alignment.objects.bulk_create(
-                alignments,
-                update_conflicts=True,
-                unique_fields=["sequence", "replicon"],
-                update_fields=["sequence", "replicon"],
-            )
+            sample_import_obj.update_replicon_obj(reference_cache)
+            sample_import_obj.create_alignment(registry)
+        step["rows"] += len(sonar_import_objs)
+
+    stats.run(
+        "alignment",
+        InsertMissing(Alignment).bulk_create,
+        registry.alignment_list,
+        unique_fields=["sequence", "replicon"],
+    )
 
-        nt_mutation_set: list[NucleotideMutation] = []
-        cds_mutation_set: list[AminoAcidMutation] = []
-        mutation_parent_relations = []
-        nt_mutation_alignment_relations: list[NucleotideMutation.alignments.through] = (
-            []
-        )
-        aa_mutation_alignment_relations: list[AminoAcidMutation.alignments.through] = []
+    mutation_parent_relations = []
+    nt_mutation_alignment_relations: list[NucleotideMutation.alignments.through] = []
+    aa_mutation_alignment_relations: list[AminoAcidMutation.alignments.through] = []
+    with stats.stage("build_mutations") as step:
         for sample_import_obj in sonar_import_objs:
             id_to_mutation_mapping = sample_import_obj.get_mutation_objs_nt(
-                nt_mutation_set,
-                replicon_cache,
-                gene_cache_by_var_pos,
+                registry,
                 nt_mutation_alignment_relations,
             )
             parent_relations = (
                 sample_import_obj.get_mutation_objs_cds_and_parent_relations(
-                    cds_mutation_set,
-                    gene_cache_by_accession,
+                    registry,
+                    reference_cache,
                     id_to_mutation_mapping,
                     aa_mutation_alignment_relations,
                 )
             )
             mutation_parent_relations.extend(parent_relations)
-        with cache.lock("mutation"):
-            NucleotideMutation.objects.bulk_create(
-                nt_mutation_set,
-                update_conflicts=True,
-                unique_fields=["ref", "alt", "start", "end", "replicon"],
-                update_fields=[
-                    "is_frameshift",
-                ],
-            )
+        step["rows"] += len(registry.nt_mutation_list) + len(registry.cds_mutation_list)
+    stats.run(
+        "mutation",
+        InsertMissing(NucleotideMutation).bulk_create,
+        registry.nt_mutation_list,
+        unique_fields=["ref", "alt", "start", "end", "replicon"],
+    )
+    stats.run(
+        "mutation",
+        InsertMissing(AminoAcidMutation).bulk_create,
+        registry.cds_mutation_list,
+        unique_fields=["ref", "alt", "start", "end", "cds"],
+    )
+    # relations are inserted ordered by their key columns as well
+    stats.run(
+        "mutation",
+        AminoAcidMutation.parent.through.objects.bulk_create,
+        sorted(
+            mutation_parent_relations,
+            key=lambda rel: (
+                rel.aminoacidmutation.id,
+                rel.nucleotidemutation.id,
+            ),
+        ),
+        ignore_conflicts=True,
+    )
+    stats.run(
+        "mutation",
+        NucleotideMutation.alignments.through.objects.bulk_create,
+        sorted(
+            (
+                NucleotideMutation.alignments.through(
+                    nucleotidemutation_id=rel.nucleotidemutation.id,
+                    alignment_id=rel.alignment.id,
+                )
+                for rel in nt_mutation_alignment_relations
+            ),
+            key=lambda rel: (rel.nucleotidemutation_id, rel.alignment_id),
+        ),
+        ignore_conflicts=True,
+    )
+    stats.run(
+        "mutation",
+        AminoAcidMutation.alignments.through.objects.bulk_create,
+        sorted(
+            (
+                AminoAcidMutation.alignments.through(
+                    aminoacidmutation_id=rel.aminoacidmutation.id,
+                    alignment_id=rel.alignment.id,
+                )
+                for rel in aa_mutation_alignment_relations
+            ),
+            key=lambda rel: (rel.aminoacidmutation_id, rel.alignment_id),
+        ),
+        ignore_conflicts=True,
+    )
+    _complete_alignments(sonar_import_objs, stats, checkpoint)
 
-            AminoAcidMutation.objects.bulk_create(
-                cds_mutation_set,
-                update_conflicts=True,
-                unique_fields=["ref", "alt", "start", "end", "cds"],
-                update_fields=["ref", "alt", "start", "end", "cds"],
-            )
-            AminoAcidMutation.parent.through.objects.bulk_create(
-                mutation_parent_relations,
-                ignore_conflicts=True,
-            )
-            NucleotideMutation.alignments.through.objects.bulk_create(
-                [
-                    NucleotideMutation.alignments.through(
-                        nucleotidemutation_id=rel.nucleotidemutation.id,
-                        alignment_id=rel.alignment.id,
-                    )
-                    for rel in nt_mutation_alignment_relations
-                ],
-                ignore_conflicts=True,
-            )
-            AminoAcidMutation.alignments.through.objects.bulk_create(
-                [
-                    AminoAcidMutation.alignments.through(
-                        aminoacidmutation_id=rel.aminoacidmutation.id,
-                        alignment_id=rel.alignment.id,
-                    )
-                    for rel in aa_mutation_alignment_relations
-                ],
-                ignore_conflicts=True,
-            )
 
-        return (True, None, None)
+def _complete_alignments(
+    sonar_import_objs: list[SonarImport],
+    stats: BatchWriteStats,
+    checkpoint: tuple[str, int, int] = None,
+):
+    """
+    Link the reused alignments and mark all alignments of a batch complete,
+    the last writes of a batch. With a `checkpoint` (file name, start, stop),
+    the batch is recorded as imported.
+    """
+    reused = [obj for obj in sonar_import_objs if obj.source_alignment_id]
+    if reused:
+        stats.run("mutation", link_reused_alignments, reused)
+    stats.run("alignment", mark_alignments_complete, sonar_import_objs)
+    if checkpoint:
+        file_name, start, stop = checkpoint
+        record_checkpoint(file_name, MANIFEST_FILE, start, stop)
+
+
+def process_batch_run(
+    batch: tuple[int, int],
+    archive_path: str,
+    checkpoint_file: str = None,
+):
+    try:
+        # warm across the tasks this worker process runs
+        reference_cache = get_reference_cache()
+        start, stop = batch
+        stats = BatchWriteStats()
+        with stats.stage("read_parquet") as step:
+            sonar_import_objs = load_batch(
+                archive_path, start, stop, IMPORT_REUSE_ALIGNMENTS
+            )
+            step["rows"] += _count_variants(sonar_import_objs)
+        # one transaction per batch, a failed batch leaves no partial
+        # alignments behind that a later batch could reuse
+        checkpoint = (checkpoint_file, start, stop) if checkpoint_file else None
+        stats.run_transaction(
+            _write_batch, sonar_import_objs, reference_cache, stats, checkpoint
+        )
+        LOGGER.info(f"Batch write stats: {stats.as_dict()}")
+        return (True, None, None, stats.as_dict())
 
     except Exception as e:
         # Handle the DataError exception here
@@ -483,47 +906,72 @@ def process_batch_run(
 
 
 @shared_task
-def process_annotation(file_name):
+def process_annotation(file_name, archive_path=None, checkpoint_file=None):
+    """
+    Import one annotation file of an archive. With `checkpoint_file` (the
+    uploaded archive), the imported file gets a checkpoint.
+    """
     try:
-        annotation_import = AnnotationImport(file_name)
-        if REDIS_URL:
-            with cache.lock("annotation"):
-                AnnotationType.objects.bulk_create(
-                    annotation_import.get_annotation_objs(),
-                    ignore_conflicts=True,
-                )
-            with cache.lock("annotation2mutation"):
-                AnnotationType.mutations.through.objects.bulk_create(
-                    annotation_import.get_annotation2mutation_objs(),
-                    ignore_conflicts=True,
-                )
-        else:
-            AnnotationType.objects.bulk_create(
-                annotation_import.get_annotation_objs(),
-                ignore_conflicts=True,
-            )
-            AnnotationType.mutations.through.objects.bulk_create(
-                annotation_import.get_annotation2mutation_objs(), ignore_conflicts=True
-            )
+        annotation_import = AnnotationImport(file_name, archive_path)
+        for lookups in annotation_import.batches():
+            # the looked up mutations must exist until they are linked
+            with mutation_write_lock():
+                annotation_objs = annotation_import.get_annotation_objs(lookups)
+                if REDIS_URL:
+                    with cache.lock("annotation"):
+                        AnnotationType.objects.bulk_create(
+                            annotation_objs,
+                            ignore_conflicts=True,
+                        )
+                    with cache.lock("annotation2mutation"):
+                        AnnotationType.mutations.through.objects.bulk_create(
+                            annotation_import.get_annotation2mutation_objs(),
+                            ignore_conflicts=True,
+                        )
+                else:
+                    AnnotationType.objects.bulk_create(
+                        annotation_objs,
+                        ignore_conflicts=True,
+                    )
+                    AnnotationType.mutations.through.objects.bulk_create(
+                        annotation_import.get_annotation2mutation_objs(),
+                        ignore_conflicts=True,
+                    )
     except Exception as e:
         LOGGER.error(f"Error in process_annotation: {e}")
         return (False, str(e), traceback.format_exc())
+    if checkpoint_file:
+        record_checkpoint(checkpoint_file, file_name)
     return (True, None, None)
 
 
 def process_batch_single_thread(
-    batch, replicon_cache, gene_cache_by_accession, gene_cache_by_var_pos, temp_dir
+    batch,
+    reference_cache: ReferenceCache,
+    archive_path: str,
+    checkpoint_file: str = None,
 ):
     try:
-        sample_import_objs = [
-            SonarImport(file, import_folder=temp_dir) for file in batch
-        ]
+        start, stop = batch
+        checkpoint = (checkpoint_file, start, stop) if checkpoint_file else None
+        stats = BatchWriteStats()
+        with stats.stage("read_parquet") as step:
+            sample_import_objs = load_batch(
+                archive_path, start, stop, IMPORT_REUSE_ALIGNMENTS
+            )
+            step["rows"] += _count_variants(sample_import_objs)
+        if SAMPLE_IMPORT_LOADER == "copy":
+            with transaction.atomic():
+                stats.call(copy_load_batch, sample_import_objs)
+                _complete_alignments(sample_import_objs, stats, checkpoint)
+            return stats.as_dict()
         with transaction.atomic():
             sequences = [
                 sample_import_obj.get_sequence_obj()
                 for sample_import_obj in sample_import_objs
             ]
-            Sequence.objects.bulk_create(
+            stats.call(
+                Sequence.objects.bulk_create,
                 sequences,
                 update_conflicts=True,
                 unique_fields=["name"],  # Use name as the unique identifier
@@ -533,18 +981,15 @@ def process_batch_single_thread(
                     "last_update_date",
                 ],  # Update these fields
             )
-            [x.update_replicon_obj(replicon_cache) for x in sample_import_objs]
-            alignments: list[Alignment] = []
+            [x.update_replicon_obj(reference_cache) for x in sample_import_objs]
+            registry = MutationRegistry()
             for sample_import_obj in sample_import_objs:
-                sample_import_obj.create_alignment(alignments)
-            Alignment.objects.bulk_create(
-                alignments,
-                update_conflicts=True,
+                sample_import_obj.create_alignment(registry)
+            stats.call(
+                InsertMissing(Alignment).bulk_create,
+                registry.alignment_list,
                 unique_fields=["sequence", "replicon"],
-                update_fields=["sequence", "replicon"],
             )
-            nt_mutation_set: list[NucleotideMutation] = []
-            cds_mutation_set: list[AminoAcidMutation] = []
             mutation_parent_relations = []
             nt_mutation_alignment_relations: list[
                 NucleotideMutation.alignments.through
@@ -555,38 +1000,36 @@ def process_batch_single_thread(
 
             for sample_import_obj in sample_import_objs:
                 id_to_mutation_mapping = sample_import_obj.get_mutation_objs_nt(
-                    nt_mutation_set,
-                    replicon_cache,
-                    gene_cache_by_var_pos,
+                    registry,
                     nt_mutation_alignment_relations,
                 )
                 parent_relations = (
                     sample_import_obj.get_mutation_objs_cds_and_parent_relations(
-                        cds_mutation_set,
-                        gene_cache_by_accession,
+                        registry,
+                        reference_cache,
                         id_to_mutation_mapping,
                         aa_mutation_alignment_relations,
                     )
                 )
                 mutation_parent_relations.extend(parent_relations)
 
-            NucleotideMutation.objects.bulk_create(
-                nt_mutation_set,
-                update_conflicts=True,
+            stats.call(
+                InsertMissing(NucleotideMutation).bulk_create,
+                registry.nt_mutation_list,
                 unique_fields=["ref", "alt", "start", "end", "replicon"],
-                update_fields=["ref", "alt", "start", "end", "replicon"],
             )
-            AminoAcidMutation.objects.bulk_create(
-                cds_mutation_set,
-                update_conflicts=True,
+            stats.call(
+                InsertMissing(AminoAcidMutation).bulk_create,
+                registry.cds_mutation_list,
                 unique_fields=["ref", "alt", "start", "end", "cds"],
-                update_fields=["ref", "alt", "start", "end", "cds"],
             )
-            AminoAcidMutation.parent.through.objects.bulk_create(
+            stats.call(
+                AminoAcidMutation.parent.through.objects.bulk_create,
                 mutation_parent_relations,
                 ignore_conflicts=True,
             )
-            NucleotideMutation.alignments.through.objects.bulk_create(
+            stats.call(
+                NucleotideMutation.alignments.through.objects.bulk_create,
                 [
                     NucleotideMutation.alignments.through(
                         nucleotidemutation_id=rel.nucleotidemutation.id,
@@ -596,7 +1039,8 @@ def process_batch_single_thread(
                 ],
                 ignore_conflicts=True,
             )
-            AminoAcidMutation.alignments.through.objects.bulk_create(
+            stats.call(
+                AminoAcidMutation.alignments.through.objects.bulk_create,
                 [
                     AminoAcidMutation.alignments.through(
                         aminoacidmutation_id=rel.aminoacidmutation.id,
@@ -606,6 +1050,7 @@ def process_batch_single_thread(
                 ],
                 ignore_conflicts=True,
             )
+            _complete_alignments(sample_import_objs, stats, checkpoint)
 
             # annotations = []
             # for sample_import_obj in sample_import_objs:
@@ -625,6 +1070,7 @@ def process_batch_single_thread(
 
             # Filter sequences without associated samples
             # clean_unused_sequences()
+        return stats.as_dict()
 
     except DataError as data_error:
         # Handle the DataError exception here
@@ -632,7 +1078,7 @@ def process_batch_single_thread(
         # Perform additional error handling or logging as needed
         LOGGER.error("Error happens on this batch")
         for sample_import_obj in sample_import_objs:
-            LOGGER.error(f"{sample_import_obj.sample_file_path}")
+            LOGGER.error(f"{sample_import_obj.get_sample_name()}")
         raise
     except Exception as e:
         # Handle other exceptions if necessary
@@ -641,16 +1087,19 @@ def process_batch_single_thread(
 
 
 def import_property(
-    property_file, sep, use_celery=False, column_mapping=None, batch_size=1000
+    property_file, sep, column_mapping=None, batch_size=1000, chunk_dir=None
 ):
+    """
+    Import a property file in chunks of `batch_size` rows, so only one chunk
+    is held in memory. With a `chunk_dir` (Celery), every chunk is written to
+    a parquet file there and a batch task signature with the file path is
+    returned instead of importing the rows.
+
+    Returns:
+        tuple[int, list]: number of rows, batch task signatures (Celery only)
+    """
+    use_celery = chunk_dir is not None
     try:
-        # Load the CSV file in batches
-        properties_df = pd.read_csv(
-            property_file,
-            sep=sep,
-            dtype="string",
-            keep_default_na=False,
-        ).replace("", pd.NA)
         timer = datetime.now()
 
         # Use Celery if parallel processing is enabled
@@ -672,81 +1121,59 @@ def import_property(
             sample_name_column = "ID"
             related_sequences_column = "ID"
 
-        # Data preprocessing
-
-        for column_name, col_info in serializable_column_mapping.items():
-            if column_name not in properties_df.columns:
-                print(
-                    f"Skipping column '{column_name}' as it is not in the property file."
-                )
-                continue
-            # Apply default values for missing or empty fields
-            default_value = col_info["default"]
-            print(f"{column_name} :pairs with: {col_info}")
-
-            if default_value is not None:
-                properties_df[column_name] = properties_df[column_name].fillna(
-                    default_value
-                )  # Replace NaN values
-
-            # # Explicitly convert the column to string to avoid .0 issues
-            # if (
-            #     col_info["data_type"] == "value_varchar"
-            #     and column_name in properties_df.columns
-            # ):
-            #     properties_df[column_name] = properties_df[column_name].astype(str)
-
-            # Format columns with 'value_date' type
-            if (
-                col_info["data_type"] == "value_date"
-                and column_name in properties_df.columns
-            ):
-                properties_df[column_name] = properties_df[column_name].apply(
-                    parse_date
-                )
+        # Load the CSV file in batches
+        reader = pd.read_csv(
+            property_file,
+            sep=sep,
+            dtype="string",
+            keep_default_na=False,
+            chunksize=batch_size,
+        )
         if use_celery:
             print("Setting up property import celery jobs...")
+            # one subdirectory per property file of the archive
+            file_dir = pathlib.Path(tempfile.mkdtemp(dir=chunk_dir))
+        else:
+            print("Processing properties in single-threaded mode...")
 
-            property_jobs = []
-            for i in range(0, len(properties_df), batch_size):
-                batch = properties_df.iloc[i : i + batch_size]
-                if isinstance(batch, pd.Series):
-                    batch = (
-                        batch.to_frame().T
-                    )  # Ensure it's a DataFrame if it's a Series
-                batch_as_dict = batch.to_dict(orient="records")
+        property_ids = None
+        property_jobs = []
+        row_count = 0
+        for i, properties_df in enumerate(reader):
+            row_count += len(properties_df)
+            properties_df = _prepare_property_chunk(
+                properties_df.replace("", pd.NA),
+                serializable_column_mapping,
+                verbose=i == 0,
+            )
+            if property_ids is None:
+                property_ids = _resolve_property_ids(
+                    properties_df.columns, column_mapping["column_mapping"]
+                )
+            if use_celery:
+                chunk_path = file_dir / f"chunk_{i}.parquet"
+                properties_df.to_parquet(chunk_path, index=False)
                 property_jobs.append(
                     process_property_batch.s(
-                        batch_as_dict,
+                        str(chunk_path),
                         sample_name_column,
                         serializable_column_mapping,
                         related_sequences_column,
+                        property_ids,
                     )  # Pass column_mapping
                 )
-
-            # Run the Celery group of tasks and collect results
-            results = group(property_jobs).apply_async().get()
-
-            for result in results:
-                if not result[0]:
-                    raise Exception(f"Property Import Error: {result[1]}")
-
-        else:
-            print("Processing properties in single-threaded mode...")
-
-            # Process the CSV file in a single-threaded manner
-            if isinstance(properties_df, pd.Series):
-                properties_df = properties_df.to_frame().T
-            batch_as_dict = properties_df.to_dict(orient="records")
-            # column_mapping does not need to be JSON-serializable format, because we use only single thread
-            _process_property_file(
-                batch_as_dict,
-                sample_name_column,
-                column_mapping["column_mapping"],
-                related_sequences_column,
-            )
+            else:
+                # column_mapping does not need to be JSON-serializable format, because we use only single thread
+                _process_property_file(
+                    properties_df.to_dict(orient="records"),
+                    sample_name_column,
+                    column_mapping["column_mapping"],
+                    related_sequences_column,
+                    property_ids,
+                )
 
         print(f"Property import usage time: {datetime.now() - timer}")
+        return row_count, property_jobs
 
     except Exception as e:
         print("Error in import_property func.:", e)
@@ -754,12 +1181,40 @@ def import_property(
         raise  # Re-raise the exception to propagate it up the stack?
 
 
+def _prepare_property_chunk(
+    properties_df: pd.DataFrame, serializable_column_mapping: dict, verbose=False
+) -> pd.DataFrame:
+    """Apply defaults and date parsing of the column mapping to a chunk."""
+    for column_name, col_info in serializable_column_mapping.items():
+        if column_name not in properties_df.columns:
+            if verbose:
+                print(
+                    f"Skipping column '{column_name}' as it is not in the property file."
+                )
+            continue
+        # Apply default values for missing or empty fields
+        default_value = col_info["default"]
+        if verbose:
+            print(f"{column_name} :pairs with: {col_info}")
+
+        if default_value is not None:
+            properties_df[column_name] = properties_df[column_name].fillna(
+                default_value
+            )  # Replace NaN values
+
+        # Format columns with 'value_date' type
+        if col_info["data_type"] == "value_date":
+            properties_df[column_name] = properties_df[column_name].apply(parse_date)
+    return properties_df
+
+
 @shared_task
 def process_property_batch(
-    batch_as_dict,
+    chunk_path,
     sample_name_column,
     serialized_column_mapping,
     related_sequences_column,
+    property_ids,
 ):
     # Reconstruct column_mapping from the serialized format
     if serialized_column_mapping is not None:
@@ -775,8 +1230,13 @@ def process_property_batch(
         column_mapping = None
 
     try:
+        batch_as_dict = pd.read_parquet(chunk_path).to_dict(orient="records")
         _process_property_file(
-            batch_as_dict, sample_name_column, column_mapping, related_sequences_column
+            batch_as_dict,
+            sample_name_column,
+            column_mapping,
+            related_sequences_column,
+            property_ids,
         )
     except Exception as e:
         print("Error in process_property_batch func.:", e)
@@ -785,11 +1245,59 @@ def process_property_batch(
     return True, "Batch processed successfully"
 
 
+def _split_property_columns(
+    columns, column_mapping: dict[str, PropertyColumnMapping]
+) -> tuple[list[str], list[str]]:
+    """
+    Split the mapped columns into Sample fields (as db property names) and
+    custom property columns (as column names).
+    """
+    sample_property_names = []
+    custom_property_names = []
+    for property_name in columns:
+        if property_name in column_mapping.keys():
+            db_property_name = column_mapping[property_name].db_property_name
+            try:
+                models.Sample._meta.get_field(db_property_name)
+                sample_property_names.append(db_property_name)
+            except FieldDoesNotExist:
+                custom_property_names.append(property_name)
+    return sample_property_names, custom_property_names
+
+
+def _resolve_property_ids(
+    columns, column_mapping: dict[str, PropertyColumnMapping]
+) -> dict[str, int]:
+    """
+    Get or create the custom properties of a property file once per import
+    job, instead of once per row.
+
+    Returns:
+        dict[str, int]: property ID by db property name
+    """
+    _, custom_property_names = _split_property_columns(columns, column_mapping)
+    property_ids = {}
+    for name in custom_property_names:
+        db_property_name = column_mapping[name].db_property_name
+        property_ids[db_property_name] = models.Property.objects.get_or_create(
+            name=db_property_name, datatype=column_mapping[name].data_type
+        )[0].id
+    return property_ids
+
+
 def _process_property_file(
-    batch_as_dict, sample_name_column, column_mapping, related_sequences_column
+    batch_as_dict,
+    sample_name_column,
+    column_mapping,
+    related_sequences_column,
+    property_ids: dict[str, int],
 ):
     """
     Logic for processing a batch of the property file
+
+    The batch is written set-based: samples and sequences are resolved with
+    one query each, missing samples are bulk created and the sample-sequence
+    links are diffed against the through table.
     """
     properties_df = pd.DataFrame.from_dict(batch_as_dict, dtype=object)
     properties_df.drop_duplicates(
@@ -801,109 +1309,73 @@ def _process_property_file(
     properties_df[related_sequences_column] = properties_df[
         related_sequences_column
     ].apply(lambda x: x.split() if x else [])
-    sample_property_names = []
-    custom_property_names = []
 
     # Separate sample properties and custom properties
-    for property_name in properties_df.columns:
-        if property_name in column_mapping.keys():
-            db_property_name = column_mapping[property_name].db_property_name
-            try:
-                models.Sample._meta.get_field(db_property_name)
-                sample_property_names.append(db_property_name)
-            except FieldDoesNotExist:
-                custom_property_names.append(property_name)
-    sample_name_set = set(properties_df[sample_name_column])
-    properties_df.convert_dtypes()
-    properties_df.set_index(sample_name_column, inplace=True)
-
-    # Update existing samples
-    # Fetch existing samples from the database (empty before first property import)
-    samples = models.Sample.objects.filter(name__in=sample_name_set).iterator()
-    sample_updates = []
-    property_updates = []
-    existing_sample_names = set()
-    try:
-        for sample in samples:
-            existing_sample_names.add(sample.name)
-            row = properties_df.loc[sample.name]
-            sample.last_update_date = timezone.now()
+    sample_property_names, custom_property_names = _split_property_columns(
+        properties_df.columns, column_mapping
+    )
+    rows = properties_df.set_index(sample_name_column).to_dict(orient="index")
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Create samples that are not in the database yet (all of them
+        # before the first property import), then fetch every sample of the
+        # batch in one query
+        models.Sample.objects.bulk_create(
+            [models.Sample(name=name, last_update_date=now) for name in rows],
+            ignore_conflicts=True,
+        )
+        samples = models.Sample.objects.in_bulk(list(rows), field_name="name")
+        sequence_names = {
+            name for row in rows.values() for name in row[related_sequences_column]
+        }
+        sequence_ids = dict(
+            models.Sequence.objects.filter(name__in=sequence_names).values_list(
+                "name", "id"
+            )
+        )
+
+        sample_updates = []
+        property_updates = []
+        sample_sequence_links = set()
+        for sample_name, row in rows.items():
+            sample = samples[sample_name]
+            sample.last_update_date = now
             for name, value in row.items():
                 if name in column_mapping.keys():
                     db_name = column_mapping[name].db_property_name
                     if db_name in sample_property_names:
                         setattr(sample, db_name, value)
-            sequence_ids = row[related_sequences_column]
-            sequences = models.Sequence.objects.filter(name__in=sequence_ids)
-            sample.sequences.set(sequences)  # Update the ManyToMany relationship
             sample_updates.append(sample)
-
+            for sequence_name in row[related_sequences_column]:
+                if sequence_name in sequence_ids:
+                    sample_sequence_links.add((sample.id, sequence_ids[sequence_name]))
             # Update custom properties
-            property_updates += _create_property_updates(
-                sample,
-                {
-                    column_mapping[name].db_property_name: {
-                        "value": (
+            for name in custom_property_names:
+                value = row[name]
+                db_name = column_mapping[name].db_property_name
+                property_updates.append(
+                    {
+                        "sample": sample.id,
+                        "property": property_ids[db_name],
+                        column_mapping[name].data_type: (
                             value
                             if value
                             else column_mapping[name].default
                             # Fallback value if default is also None (NULL in database)
                         ),
-                        "datatype": column_mapping[name].data_type,
-                    }
-                    for name, value in row.items()
-                    if name in custom_property_names
-                },
-                use_property_cache=True,
-                property_cache=property_cache,  # global variable
-            )
-
-        # Create new samples for names not in the database
-        new_sample_name_set = sample_name_set - existing_sample_names
-        for sample_name in new_sample_name_set:
-            row = properties_df.loc[sample_name]
-            new_sample = models.Sample(
-                name=sample_name,
-                last_update_date=timezone.now(),
-            )
-            new_sample.save()  # Save to generate an ID for the new sample
-            for name, value in row.items():
-                if name in column_mapping.keys():
-                    db_name = column_mapping[name].db_property_name
-                    if db_name in sample_property_names:
-                        setattr(new_sample, db_name, value)
-
-            sequence_ids = row[related_sequences_column]
-            sequences_qs = models.Sequence.objects.filter(name__in=sequence_ids)
-            new_sample.sequences.set(sequences_qs)
-            sample_updates.append(new_sample)
-            # Create custom properties for the new sample
-            property_updates += _create_property_updates(
-                new_sample,
-                {
-                    column_mapping[name].db_property_name: {
-                        "value": (value if value else column_mapping[name].default),
-                        "datatype": column_mapping[name].data_type,
                     }
-                    for name, value in row.items()
-                    if name in custom_property_names
-                },
-                use_property_cache=True,
-                property_cache=property_cache,  # global variable
-            )
-    except Exception as e:
-        print(f"Error :{e}")
-        print(f"Error processing sample data: {row.to_dict()}")
-        print(f"error in _process_property_file line#: {e.__traceback__.tb_lineno}")
-        raise  # Or raise the exception
+                )
 
-    with transaction.atomic():
         # Bulk update samples
         # when there is no update/add to based prop.
         if sample_property_names:
             models.Sample.objects.bulk_update(
                 sample_updates, sample_property_names + ["last_update_date"]
             )
+        _sync_sample_sequences(
+            [sample.id for sample in sample_updates], sample_sequence_links
+        )
         # update custom prop. for Sample
         serializer = Sample2PropertyBulkCreateOrUpdateSerializer(
             data=property_updates, many=True
@@ -925,30 +1397,26 @@ def _process_property_file(
         )
 
 
-def _create_property_updates(
-    sample, properties: dict, use_property_cache=False, property_cache=None
-) -> list[dict]:
-    property_objects = []
-    if use_property_cache:
-        if property_cache is None:
-            property_cache = {}
-        # Pre-build or refresh cache for all properties
-        for name, value in properties.items():
-            # if name not in property_cache:
-            property_cache[name] = models.Property.objects.get_or_create(
-                name=name, datatype=value["datatype"]
-            )[0].id
-
-    for name, value in properties.items():
-        property = {"sample": sample.id, value["datatype"]: value["value"]}
-        if use_property_cache:
-            # Use the prebuilt property_cache
-            property["property"] = property_cache[name]
+def _sync_sample_sequences(sample_ids: list[int], links: set[tuple[int, int]]):
+    """
+    Make the sequences of the given samples exactly the (sample ID, sequence
+    ID) links, like `sample.sequences.set()` but for all samples at once.
+    """
+    through = models.Sample.sequences.through
+    stale_ids = []
+    for link_id, sample_id, sequence_id in through.objects.filter(
+        sample_id__in=sample_ids
+    ).values_list("id", "sample_id", "sequence_id"):
+        if (sample_id, sequence_id) in links:
+            links.discard((sample_id, sequence_id))
         else:
-            # Fetch property directly
-            property["property"] = models.Property.objects.get_or_create(
-                name=name, datatype=value["datatype"]
-            )[0].id
-
-        property_objects.append(property)
-    return property_objects
+            stale_ids.append(link_id)
+    if stale_ids:
+        through.objects.filter(id__in=stale_ids).delete()
+    through.objects.bulk_create(
+        [
+            through(sample_id=sample_id, sequence_id=sequence_id)
+            for sample_id, sequence_id in sorted(links)
+        ],
+        ignore_conflicts=True,
+    )
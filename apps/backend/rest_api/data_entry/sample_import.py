@@ -1,17 +1,22 @@
 from dataclasses import dataclass
+from dataclasses import fields
+import json
 import pathlib
-import pickle
 import typing
 from typing import Any
 from typing import Optional
 
 from django.utils import timezone
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
+from rest_api.data_entry.alignment_reuse import find_reusable_alignments
+from rest_api.data_entry.archive import has_member
+from rest_api.data_entry.archive import open_member
+from rest_api.data_entry.reference_cache import ReferenceCache
 from rest_api.models import Alignment
 from rest_api.models import AminoAcidMutation
-from rest_api.models import CDS
-from rest_api.models import Gene
 from rest_api.models import NucleotideMutation
 from rest_api.models import Replicon
 from rest_api.models import Sample
@@ -44,20 +49,55 @@ class SampleRaw:
     algn_file: Optional[str] = None
     anno_tsv_file: Optional[str] = None
     lift_file: Optional[str] = None
+    # number of the var file in the archive, see read_variants
+    var_index: Optional[int] = None
+
+
+# columns of the var parquet files written by the CLI (label is not needed)
+VAR_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("ref", pa.string()),
+        ("start", pa.int64()),
+        ("end", pa.int64()),
+        ("alt", pa.string()),
+        ("reference_acc", pa.string()),
+        ("type", pa.string()),
+        ("frameshift", pa.int64()),
+        ("parent_id", pa.string()),
+    ]
+)
 
 
 @dataclass
-class VarRaw:
-    id: int
-    ref: str
-    start: int
-    end: int
-    alt: str | None
-    replicon_or_cds_accession: str
-    # lable: str
-    type: str
-    frameshift: int
-    parent_id: list[int] | None
+class VarColumns:
+    """Variants of one type (nt or cds) of one sample, column by column."""
+
+    id: list[int]
+    ref: list[str]
+    start: list[int | None]
+    end: list[int | None]
+    alt: list[str]
+    # replicon accession for nt, CDS accession for cds variants
+    accession: list[str]
+    frameshift: list[int]
+    parent_id: list[list[int] | None]
+
+    @classmethod
+    def from_table(cls, table: pa.Table) -> "VarColumns":
+        return cls(
+            id=table["id"].to_pylist(),
+            ref=table["ref"].to_pylist(),
+            start=table["start"].to_pylist(),
+            end=table["end"].to_pylist(),
+            alt=table["alt"].to_pylist(),
+            accession=table["reference_acc"].to_pylist(),
+            frameshift=table["frameshift"].to_pylist(),
+            parent_id=table["parent_ids"].to_pylist(),
+        )
+
+    def __len__(self):
+        return len(self.id)
 
 
 class VCFInfoLOFRaw:
@@ -76,30 +116,275 @@ class VCFInfoNMDRaw:
     percent_of_transcripts_affected: str
 
 
+class MutationRegistry:
+    """
+    Batch-scoped registry of the mutation objects collected for one bulk write.
+
+    Mutations are keyed by their unique constraint, so every sample of a batch
+    resolves an already collected mutation with a dict lookup instead of
+    scanning all mutations of the batch.
+
+    The lists are returned sorted by their conflict key, so concurrent
+    batches lock existing rows in the same order and cannot deadlock each
+    other on upsert.
+    """
+
+    def __init__(self):
+        # (ref, alt, start, end, replicon_id) -> NucleotideMutation
+        self.nt_mutations: dict[tuple, NucleotideMutation] = {}
+        # (ref, alt, start, end, cds_id) -> AminoAcidMutation
+        self.cds_mutations: dict[tuple, AminoAcidMutation] = {}
+        # (sequence name, replicon_id) -> Alignment
+        self.alignments: dict[tuple, Alignment] = {}
+
+    def get_or_add_alignment(self, sequence: Sequence, replicon: Replicon) -> Alignment:
+        key = (sequence.name, replicon.id)
+        alignment = self.alignments.get(key)
+        if alignment is None:
+            alignment = Alignment(sequence=sequence, replicon=replicon)
+            self.alignments[key] = alignment
+        return alignment
+
+    def get_or_add_nt_mutation(self, mutation_data: dict) -> NucleotideMutation:
+        key = (
+            mutation_data["ref"],
+            mutation_data["alt"],
+            mutation_data["start"],
+            mutation_data["end"],
+            mutation_data["replicon"].id,
+        )
+        mutation = self.nt_mutations.get(key)
+        if mutation is None:
+            mutation = NucleotideMutation(**mutation_data)
+            self.nt_mutations[key] = mutation
+        return mutation
+
+    def get_or_add_cds_mutation(self, mutation_data: dict) -> AminoAcidMutation:
+        key = (
+            mutation_data["ref"],
+            mutation_data["alt"],
+            mutation_data["start"],
+            mutation_data["end"],
+            mutation_data["cds"].id,
+        )
+        mutation = self.cds_mutations.get(key)
+        if mutation is None:
+            mutation = AminoAcidMutation(**mutation_data)
+            self.cds_mutations[key] = mutation
+        return mutation
+
+    @property
+    def alignment_list(self) -> list[Alignment]:
+        return [self.alignments[key] for key in sorted(self.alignments)]
+
+    @property
+    def nt_mutation_list(self) -> list[NucleotideMutation]:
+        return [self.nt_mutations[key] for key in sorted(self.nt_mutations)]
+
+    @property
+    def cds_mutation_list(self) -> list[AminoAcidMutation]:
+        return [self.cds_mutations[key] for key in sorted(self.cds_mutations)]
+
+
+# members of a sample import archive, written by the CLI
+MANIFEST_FILE = "samples/manifest.parquet"
+VARIANTS_FILE = "var/variants.parquet"
+# variants of all samples of the archive, keyed by the var parquet file name
+VARIANTS_SCHEMA = VAR_SCHEMA.append(pa.field("var_file", pa.string()))
+
+
+def count_manifest_rows(archive_path: str) -> int:
+    with open_member(archive_path, MANIFEST_FILE) as handle:
+        return pq.read_metadata(handle).num_rows
+
+
+def count_manifest_variants(archive_path: str) -> list[int]:
+    """
+    Number of variants of every manifest row, to size the import batches.
+    Only the var file columns of the manifest and variants are read.
+    """
+    with open_member(archive_path, MANIFEST_FILE) as handle:
+        var_files = pq.read_table(handle, columns=["var_parquet_file"])[
+            "var_parquet_file"
+        ].to_pylist()
+    if not has_member(archive_path, VARIANTS_FILE):
+        return [0] * len(var_files)
+    with open_member(archive_path, VARIANTS_FILE) as handle:
+        counts = pc.value_counts(
+            pq.read_table(handle, columns=["var_file"])["var_file"]
+        ).to_pylist()
+    counts = {count["values"]: count["counts"] for count in counts}
+    return [
+        counts.get(pathlib.Path(var_file).name, 0) if var_file else 0
+        for var_file in var_files
+    ]
+
+
+def _row_groups(metadata: pq.FileMetaData, start: int, stop: int) -> tuple:
+    """
+    Row groups holding the rows [start, stop) and the position of the first
+    row of the first one.
+    """
+    row_groups = []
+    first_row = position = 0
+    for index in range(metadata.num_row_groups):
+        rows = metadata.row_group(index).num_rows
+        if position < stop and position + rows > start:
+            if not row_groups:
+                first_row = position
+            row_groups.append(index)
+        position += rows
+    return row_groups, first_row
+
+
+def read_manifest(archive_path: str, start: int, stop: int) -> list[SampleRaw]:
+    """
+    SampleRaw objects of the manifest rows [start, stop). Only the row groups
+    holding these rows are read.
+    """
+    with open_member(archive_path, MANIFEST_FILE) as handle:
+        manifest = pq.ParquetFile(handle)
+        row_groups, first_row = _row_groups(manifest.metadata, start, stop)
+        table = manifest.read_row_groups(row_groups).slice(
+            start - first_row, stop - start
+        )
+    field_names = {field.name for field in fields(SampleRaw)}
+    sample_raws = []
+    for row in table.to_pylist():
+        row["properties"] = json.loads(row["properties"] or "{}")
+        sample_raws.append(
+            SampleRaw(
+                **{key: value for key, value in row.items() if key in field_names}
+            )
+        )
+    return sample_raws
+
+
+def read_variants(
+    archive_path: str, var_files: set[str], var_indexes: set[int] | None = None
+) -> dict[str, pa.Table]:
+    """
+    Read the variants of the given var files from the variants member of the
+    archive. The CLI writes the variants of a var file together, in the
+    order of their `var_index`, so a filter on the indexes (if given) lets
+    pyarrow skip every row group outside their range. Archives without the
+    column are filtered by the var file names.
+
+    Cleaning is done on all variants at once: missing or blank ref/alt
+    become "", parent IDs are parsed into lists and N/X variants are flagged
+    in an `is_nx` column.
+
+    Returns:
+        dict[str, pa.Table]: table per var file name.
+    """
+    with open_member(archive_path, VARIANTS_FILE) as handle:
+        variants = pq.ParquetFile(handle)
+        if variants.metadata.num_rows == 0:
+            table = VARIANTS_SCHEMA.empty_table()
+        else:
+            if var_indexes is not None and "var_index" in variants.schema_arrow.names:
+                filters = [("var_index", "in", sorted(var_indexes))]
+            else:
+                filters = [("var_file", "in", sorted(var_files))]
+            table = pq.read_table(
+                handle, columns=VARIANTS_SCHEMA.names, filters=filters
+            )
+    # columns written from empty frames are null-typed
+    table = table.cast(VARIANTS_SCHEMA)
+    for column in ["ref", "alt"]:
+        values = pc.fill_null(table[column], "")
+        values = pc.if_else(pc.equal(values, " "), "", values)
+        table = table.set_column(table.schema.get_field_index(column), column, values)
+    parent_id = pc.utf8_trim_whitespace(table["parent_id"])
+    parent_id = pc.if_else(
+        pc.equal(parent_id, ""), pa.scalar(None, pa.string()), parent_id
+    )
+    table = table.append_column(
+        "parent_ids", pc.split_pattern(parent_id, ",").cast(pa.list_(pa.int64()))
+    )
+    is_nt = pc.equal(table["type"], "nt")
+    is_cds = pc.equal(table["type"], "cds")
+    table = table.append_column(
+        "is_nx",
+        pc.or_(
+            pc.and_(is_nt, pc.match_substring(table["alt"], "N")),
+            pc.and_(is_cds, pc.match_substring(table["alt"], "X")),
+        ),
+    )
+    # the sort is stable, so rows keep their order within a var file
+    table = table.take(pc.sort_indices(table["var_file"]))
+    tables = {}
+    offset = 0
+    for count in pc.value_counts(table["var_file"]):
+        length = count["counts"].as_py()
+        tables[count["values"].as_py()] = table.slice(offset, length)
+        offset += length
+    for var_file in var_files:
+        # samples without any variant
+        tables.setdefault(var_file, table.slice(0, 0))
+    return tables
+
+
+def load_batch(
+    archive_path: str, start: int, stop: int, reuse_alignments: bool = False
+) -> list["SonarImport"]:
+    """
+    Create the SonarImport objects for the manifest rows [start, stop). With
+    `reuse_alignments`, the variants of samples whose seqhash is aligned to
+    the replicon already are not parsed, see `find_reusable_alignments`.
+    """
+    sample_raws = read_manifest(archive_path, start, stop)
+    for sample_raw in sample_raws:
+        if not sample_raw.var_parquet_file:
+            raise Exception(f"No var file found for sample {sample_raw.name}")
+    # samples with the same seqhash share a var file
+    var_indexes = {sample_raw.var_index for sample_raw in sample_raws}
+    var_tables = read_variants(
+        archive_path,
+        {pathlib.Path(sample_raw.var_parquet_file).name for sample_raw in sample_raws},
+        None if None in var_indexes else var_indexes,
+    )
+    source_alignments = (
+        find_reusable_alignments(sample_raws, var_tables) if reuse_alignments else {}
+    )
+    return [
+        SonarImport(
+            sample_raw,
+            var_tables[pathlib.Path(sample_raw.var_parquet_file).name],
+            source_alignments.get(sample_raw.name),
+        )
+        for sample_raw in sample_raws
+    ]
+
+
 class SonarImport:
     def __init__(
         self,
-        path: pathlib.Path,
-        import_folder="import_data",
+        sample_raw: SampleRaw,
+        var_table: pa.Table,
+        source_alignment_id: int | None = None,
     ):
-        self.sample_file_path = path
-        self.import_folder = import_folder
-        self.sample_raw = SampleRaw(**self._import_pickle(path))
+        self.sample_raw = sample_raw
+        # existing alignment of the same seqhash, its mutations are linked
+        # instead of the variants
+        self.source_alignment_id = source_alignment_id
         self.sequence: None | Sequence = None
         self.sample: None | Sample = None
         self.replicon: None | Replicon = None
         self.alignment: None | Alignment = None
         self.success = False
 
-        if self.sample_raw.var_parquet_file:
-            self.vars_raw = [
-                var
-                for var in self._import_vars(
-                    self.sample_raw.var_parquet_file, self.sample_raw.include_nx
-                )
-            ]
-        else:
-            raise Exception("No var file found")
+        if source_alignment_id is not None:
+            var_table = var_table.slice(0, 0)
+        elif not self.sample_raw.include_nx:
+            # remove all alt containing Ns for nt, or X for cds
+            var_table = var_table.filter(pc.invert(var_table["is_nx"]))
+        self.nt_vars = VarColumns.from_table(
+            var_table.filter(pc.equal(var_table["type"], "nt"))
+        )
+        self.cds_vars = VarColumns.from_table(
+            var_table.filter(pc.equal(var_table["type"], "cds"))
+        )
 
     def get_sample_name(self):
         return self.sample_raw.name
@@ -118,212 +403,97 @@ class SonarImport:
         )
         return self.sequence
 
-    def update_replicon_obj(self, replicon_cache: dict[str, Replicon]):
-        if self.sample_raw.source_acc not in replicon_cache:
-            replicon_cache[self.sample_raw.source_acc] = Replicon.objects.get(
-                accession=self.sample_raw.source_acc
-            )
-        self.replicon = replicon_cache[self.sample_raw.source_acc]
-
-    def create_alignment(self, alignments_list: list[Alignment]):
-        self.alignment = next(
-            filter(
-                lambda x: x.sequence == self.sequence and x.replicon == self.replicon,
-                alignments_list,
-            ),
-            None,
-        )
-        if not self.alignment:
-            self.alignment = Alignment(sequence=self.sequence, replicon=self.replicon)
-            alignments_list.append(self.alignment)
+    def update_replicon_obj(self, reference_cache: ReferenceCache):
+        self.replicon = reference_cache.get_replicon(self.sample_raw.source_acc)
+
+    def create_alignment(self, registry: MutationRegistry):
+        self.alignment = registry.get_or_add_alignment(self.sequence, self.replicon)
 
     def get_mutation_objs_nt(
         self,
-        nt_mutation_set: list[NucleotideMutation],
-        replicon_cache: dict[str, Replicon | None],
-        gene_cache_by_var_pos: dict[Replicon | None, dict[int, dict[int, Gene | None]]],
+        registry: MutationRegistry,
         nt_mutation_alignment_relations: list[NucleotideMutation.alignments.through],
     ) -> dict[int, NucleotideMutation]:
         import_id_to_sample_mutations: dict[int, NucleotideMutation] = {}
-        for var_raw in self.vars_raw:
-            replicon = None
-            if var_raw.type == "nt":
-                if not var_raw.replicon_or_cds_accession in replicon_cache:
-                    replicon_cache[var_raw.replicon_or_cds_accession] = (
-                        Replicon.objects.get(
-                            accession=var_raw.replicon_or_cds_accession
-                        )
-                    )
-                replicon = replicon_cache[var_raw.replicon_or_cds_accession]
-                if not replicon in gene_cache_by_var_pos:
-                    gene_cache_by_var_pos[replicon] = {}
-                if not var_raw.start in gene_cache_by_var_pos[replicon]:
-                    gene_cache_by_var_pos[replicon][var_raw.start] = {}
-                if not var_raw.end in gene_cache_by_var_pos[replicon][var_raw.start]:
-                    gene_cache_by_var_pos[replicon][var_raw.start][var_raw.end] = (
-                        Gene.objects.filter(
-                            replicon=replicon,
-                            start__gte=var_raw.start,
-                            end__lte=var_raw.end,
-                        ).first()
-                    )
-                gene = gene_cache_by_var_pos[replicon][var_raw.start][var_raw.end]
-                # in DEL, we dont keep REF in the database.
-                if var_raw.alt is None:
-                    var_raw.ref = ""
-
-                mutation_data = {
-                    "ref": var_raw.ref if var_raw.ref else "",
-                    "alt": var_raw.alt if var_raw.alt else "",
-                    "start": var_raw.start,
-                    "end": var_raw.end,
-                    "replicon": self.replicon,
-                    "is_frameshift": var_raw.frameshift,
-                }
-                mutation = next(
-                    filter(
-                        lambda x: self.is_same_mutation(mutation_data, x),
-                        nt_mutation_set,
-                    ),
-                    None,
-                )
-                if not mutation:
-                    mutation = NucleotideMutation(**mutation_data)
-                    nt_mutation_set.append(mutation)
-                nt_mutation_alignment_relations.append(
-                    NucleotideMutation.alignments.through(
-                        nucleotidemutation=mutation, alignment=self.alignment
-                    )
+        nt_vars = self.nt_vars
+        for import_id, ref, alt, start, end, frameshift in zip(
+            nt_vars.id,
+            nt_vars.ref,
+            nt_vars.alt,
+            nt_vars.start,
+            nt_vars.end,
+            nt_vars.frameshift,
+        ):
+            mutation_data = {
+                "ref": ref,
+                "alt": alt,
+                "start": start,
+                "end": end,
+                "replicon": self.replicon,
+                "is_frameshift": frameshift,
+            }
+            mutation = registry.get_or_add_nt_mutation(mutation_data)
+            nt_mutation_alignment_relations.append(
+                NucleotideMutation.alignments.through(
+                    nucleotidemutation=mutation, alignment=self.alignment
                 )
-                import_id_to_sample_mutations[var_raw.id] = mutation
+            )
+            import_id_to_sample_mutations[import_id] = mutation
         return import_id_to_sample_mutations
 
-    def is_same_mutation(
-        self, mutation_data: dict, mutation: NucleotideMutation | AminoAcidMutation
-    ) -> bool:
-        return all(getattr(mutation, k) == v for k, v in mutation_data.items())
-
     def get_mutation_objs_cds_and_parent_relations(
         self,
-        cds_mutation_set: list[AminoAcidMutation],
-        gene_cache_by_accession: dict[str, CDS | None],
+        registry: MutationRegistry,
+        reference_cache: ReferenceCache,
         parent_id_mapping: dict[int, NucleotideMutation],
         aa_mutation_alignment_relations: list[AminoAcidMutation.alignments.through],
     ) -> list[AminoAcidMutation.parent.through]:
         sample_cds_mutations: list[AminoAcidMutation] = []
         mutation_parent_relations = []
-        for var_raw in self.vars_raw:
-            if var_raw.type == "cds":
-                if not var_raw.replicon_or_cds_accession in gene_cache_by_accession:
+        cds_vars = self.cds_vars
+        for ref, alt, start, end, accession, parent_ids in zip(
+            cds_vars.ref,
+            cds_vars.alt,
+            cds_vars.start,
+            cds_vars.end,
+            cds_vars.accession,
+            cds_vars.parent_id,
+        ):
+            cds = reference_cache.get_cds(accession)
+            if cds is None:
+                LOGGER.error(f"CDS not found for accession: {accession}")
+                continue
+            mutation_data = {
+                "cds": cds,
+                "ref": ref,
+                "alt": alt,
+                "start": start if start else 0,
+                "end": end if end else 0,
+            }
+            mutation = registry.get_or_add_cds_mutation(mutation_data)
+            aa_mutation_alignment_relations.append(
+                AminoAcidMutation.alignments.through(
+                    aminoacidmutation=mutation, alignment=self.alignment
+                )
+            )
+            if parent_ids:
+                # This KeyError occurs due to the skip-nx flag.
+                # If the third nucleotide of a codon is 'N', the corresponding nucleotide mutation is not read in.
+                # However, if the first or second nucleotide is also mutated, an amino acid mutation can still be inferred
+                # due to the ambiguity of the genetic code.
+                # For this mutations we cannot store the relation to the nt parent
+                for parent_id in parent_ids:
                     try:
-                        gene_cache_by_accession[var_raw.replicon_or_cds_accession] = (
-                            CDS.objects.get(accession=var_raw.replicon_or_cds_accession)
+                        mutation_parent_relations.append(
+                            AminoAcidMutation.parent.through(
+                                aminoacidmutation=mutation,
+                                nucleotidemutation=parent_id_mapping[parent_id],
+                            )
                         )
-                    except CDS.DoesNotExist:
-                        LOGGER.error(
-                            f"CDS not found for accession: {var_raw.replicon_or_cds_accession}"
+                    except KeyError:
+                        LOGGER.warning(
+                            f"Parent ID {parent_id} not found in parent_id_mapping for mutation {mutation_data}"
                         )
-                        continue
-                cds = gene_cache_by_accession[var_raw.replicon_or_cds_accession]
-                if var_raw.alt is None:
-                    var_raw.ref = ""
-                mutation_data = {
-                    "cds": cds,
-                    "ref": var_raw.ref if var_raw.ref else "",
-                    "alt": var_raw.alt if var_raw.alt else "",
-                    "start": var_raw.start if var_raw.start else 0,
-                    "end": var_raw.end if var_raw.end else 0,
-                }
-                mutation = next(
-                    filter(
-                        lambda x: self.is_same_mutation(mutation_data, x),
-                        cds_mutation_set,
-                    ),
-                    None,
-                )
-                if not mutation:
-                    mutation = AminoAcidMutation(**mutation_data)
-                    cds_mutation_set.append(mutation)
-                aa_mutation_alignment_relations.append(
-                    AminoAcidMutation.alignments.through(
-                        aminoacidmutation=mutation, alignment=self.alignment
-                    )
-                )
-                if var_raw.parent_id:
-                    # This KeyError occurs due to the skip-nx flag.
-                    # If the third nucleotide of a codon is 'N', the corresponding nucleotide mutation is not read in.
-                    # However, if the first or second nucleotide is also mutated, an amino acid mutation can still be inferred
-                    # due to the ambiguity of the genetic code.
-                    # For this mutations we cannot store the relation to the nt parent
-                    for parent_id in var_raw.parent_id:
-                        try:
-                            mutation_parent_relations.append(
-                                AminoAcidMutation.parent.through(
-                                    aminoacidmutation=mutation,
-                                    nucleotidemutation=parent_id_mapping[parent_id],
-                                )
-                            )
-                        except KeyError:
-                            LOGGER.warning(
-                                f"Parent ID {parent_id} not found in parent_id_mapping for mutation {mutation_data}"
-                            )
-                            pass
-                sample_cds_mutations.append(mutation)
+                        pass
+            sample_cds_mutations.append(mutation)
         return mutation_parent_relations
-
-    def _import_pickle(self, path: str):
-        with open(path, "rb") as f:
-            return pickle.load(f)
-
-    def _import_vars(self, path, include_nx: bool):
-        file_name = pathlib.Path(path).name
-        self.var_file_path = (
-            pathlib.Path(self.import_folder)
-            .joinpath("var")
-            .joinpath(file_name[:2])
-            .joinpath(file_name)
-        )
-        var_df = pd.read_parquet(self.var_file_path)
-        var_df[["ref", "alt"]] = var_df[["ref", "alt"]].fillna("").replace({" ": ""})
-
-        if not include_nx:
-            # remove all ref containing Ns for nt, or X for cds
-            var_df = var_df[
-                ~((var_df["type"] == "nt") & var_df["alt"].str.contains("N", na=False))
-            ]
-            var_df = var_df[
-                ~((var_df["type"] == "cds") & var_df["alt"].str.contains("X", na=False))
-            ]
-        for _, row in var_df.iterrows():
-            try:
-                yield VarRaw(
-                    row["id"],
-                    row["ref"],
-                    row["start"],
-                    row["end"],
-                    row["alt"],
-                    row["reference_acc"],
-                    row["type"],
-                    row["frameshift"],
-                    (
-                        [int(x) for x in row["parent_id"].split(",")]
-                        if pd.notna(row["parent_id"]) and row["parent_id"].strip() != ""
-                        else None
-                    ),
-                )
-            except Exception as e:
-                print(f"Error processing row: {row}")
-                print(f"Error file: {self.var_file_path}")
-                raise e
-
-    def _import_seq(self, path):
-        file_name = pathlib.Path(path).name
-        self.seq_file_path = (
-            pathlib.Path(self.import_folder)
-            .joinpath("seq")
-            .joinpath(file_name[:2])
-            .joinpath(file_name)
-        )
-        with open(self.seq_file_path, "r") as handle:
-            for line in handle:
-                yield line.strip("\r\n")
@@ -1,4 +1,5 @@
 from rest_api.data_entry.sequence_job import clean_unused_sequences
+from rest_api.data_entry.sequence_job import delete_sequence_ids
 from rest_api.models import Alignment
 from rest_api.models import Sample
 from rest_api.models import Sample2Property
@@ -9,25 +10,22 @@ from sonar_backend.settings import LOGGER
 
 def delete_sequences(sequence_list: list):
     """
-    Delete sequences by name and cascade-delete all related samples,
-    alignments, properties, annotations, etc.
+    Delete sequences by name together with their alignments and mutation
+    links. Samples are kept, only their link to the sequences is removed.
     """
-    data = {}
-    sequences_qs = Sequence.objects.filter(name__in=sequence_list)
+    sequence_ids = list(
+        Sequence.objects.filter(name__in=sequence_list).values_list("id", flat=True)
+    )
 
-    if not sequences_qs.exists():
+    if not sequence_ids:
         LOGGER.warning(f"No sequences found for deletion: {sequence_list}")
         return {"deleted_sequences_count": 0}
 
-    deleted_info = (
-        sequences_qs.delete()
-    )  # cascade deletion, returns (num_deleted, dict_of_models)
-    LOGGER.info(f"Deleted sequence: {deleted_info}")
-
-    # Filter sequences without associated samples
-    clean_unused_sequences()
-
-    data["deleted_sequences_count"] = deleted_info[1].get("rest_api.Sequence", 0)
+    data = delete_sequence_ids(sequence_ids, orphans_only=False)
+    LOGGER.info(f"Deleted sequences: {data}")
+    if data["job_id"]:
+        # deleted in the background, report the sequences that were found
+        data["deleted_sequences_count"] = len(sequence_ids)
     return data
 
 
@@ -43,16 +41,22 @@ def delete_samples(sample_list: list):
         return {"deleted_samples_count": 0}
 
     sample_ids = list(samples_qs.values_list("id", flat=True))
-    sequence_ids = list(samples_qs.values_list("sequences__id", flat=True))
+    # only these sequences can become unused
+    sequence_ids = list(
+        Sample.sequences.through.objects.filter(sample_id__in=sample_ids)
+        .values_list("sequence_id", flat=True)
+        .distinct()
+    )
     LOGGER.info(f"Deleting samples with IDs: {sample_ids}")
     if DEBUG:
-        LOGGER.info("\nAssociated sequence IDs", sequence_ids)
+        LOGGER.info(f"Associated sequence IDs: {sequence_ids}")
 
     deleted_info = samples_qs.delete()  # returns (num_deleted, dict_of_models)
     LOGGER.info(f"Deleted samples: {deleted_info}")
 
-    # Filter sequences without associated samples
-    clean_unused_sequences()
+    # Delete the sequences of these samples that no other sample uses
+    cleanup = clean_unused_sequences(sequence_ids)
 
     data["deleted_samples_count"] = deleted_info[1].get("rest_api.Sample", 0)
+    data["job_id"] = cleanup["job_id"]
     return data
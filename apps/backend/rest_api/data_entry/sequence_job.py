@@ -1,14 +1,170 @@
+import uuid
+
+from celery import shared_task
+from django.core.cache import cache
+from django.db import connection
+from django.db import transaction
+
+from rest_api.data_entry.job_events import set_job_status
+from rest_api.models import Alignment
+from rest_api.models import AminoAcidMutation
+from rest_api.models import NucleotideMutation
+from rest_api.models import ProcessingJob
+from rest_api.models import Sample
 from rest_api.models import Sequence
 from sonar_backend.settings import DEBUG
+from sonar_backend.settings import DELETE_CHUNK_SIZE
+from sonar_backend.settings import LOGGER
+from sonar_backend.settings import REDIS_URL
+
+# chunks of a deletion job wait in the shared cache until their task runs,
+# long enough to survive a worker outage
+DELETE_CHUNK_TIMEOUT = 7 * 24 * 3600
+
+
+def _lock_statement(orphans_only: bool) -> str:
+    sequence = Sequence._meta.db_table
+    sample_sequences = Sample.sequences.through._meta.db_table
+    if orphans_only:
+        # keep sequences that an import linked to a sample meanwhile
+        return f"""
+            SELECT id FROM {sequence} s
+            WHERE s.id = ANY(%(ids)s)
+            AND NOT EXISTS (
+                SELECT 1 FROM {sample_sequences} ss WHERE ss.sequence_id = s.id
+            )
+            FOR UPDATE
+        """
+    return f"SELECT id FROM {sequence} WHERE id = ANY(%(ids)s) FOR UPDATE"
+
+
+def _delete_statements() -> list[str]:
+    """
+    Statements deleting a chunk of sequences (`%(ids)s`) and the rows that
+    depend on them. Django's delete() would load every related alignment and
+    mutation link into Python first.
+    """
+    sequence = Sequence._meta.db_table
+    sample_sequences = Sample.sequences.through._meta.db_table
+    alignment = Alignment._meta.db_table
+    nt_alignments = NucleotideMutation.alignments.through._meta.db_table
+    aa_alignments = AminoAcidMutation.alignments.through._meta.db_table
+    return [
+        f"DELETE FROM {sample_sequences} WHERE sequence_id = ANY(%(ids)s)",
+        f"""
+        DELETE FROM {nt_alignments}
+        WHERE alignment_id IN (
+            SELECT id FROM {alignment} WHERE sequence_id = ANY(%(ids)s)
+        )
+        """,
+        f"""
+        DELETE FROM {aa_alignments}
+        WHERE alignment_id IN (
+            SELECT id FROM {alignment} WHERE sequence_id = ANY(%(ids)s)
+        )
+        """,
+        f"DELETE FROM {alignment} WHERE sequence_id = ANY(%(ids)s)",
+        f"DELETE FROM {sequence} WHERE id = ANY(%(ids)s)",
+    ]
+
+
+def delete_sequence_chunk(sequence_ids: list[int], orphans_only: bool) -> int:
+    """
+    Delete the given sequences with their alignments and mutation links in
+    one transaction. With `orphans_only`, sequences that belong to a sample
+    are kept.
+
+    Returns:
+        int: number of deleted sequences
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(_lock_statement(orphans_only), {"ids": sequence_ids})
+        sequence_ids = [row[0] for row in cursor.fetchall()]
+        if not sequence_ids:
+            return 0
+        for sql in _delete_statements():
+            cursor.execute(sql, {"ids": sequence_ids})
+        return cursor.rowcount
+
+
+def _chunks(sequence_ids: list[int]) -> list[list[int]]:
+    sequence_ids = sorted(sequence_ids)
+    return [
+        sequence_ids[i : i + DELETE_CHUNK_SIZE]
+        for i in range(0, len(sequence_ids), DELETE_CHUNK_SIZE)
+    ]
+
+
+def _chunk_key(job_name: str, chunk: int) -> str:
+    return f"sonar:delete:{job_name}:{chunk}"
+
+
+def delete_sequence_ids(sequence_ids: list[int], orphans_only: bool) -> dict:
+    """
+    Delete sequences by ID in chunks of DELETE_CHUNK_SIZE.
+
+    Deletions of more than one chunk run as a Celery task (if available),
+    tracked as a ProcessingJob with progress. The chunks are stored in the
+    shared cache, the tasks only pass the job name and the number of the
+    next chunk. The result then contains the `job_id` instead of the number of deleted
+    sequences.
+    """
+    chunks = _chunks(sequence_ids)
+    if len(chunks) > 1 and REDIS_URL:
+        job = ProcessingJob.objects.create(
+            job_name=f"delete_{uuid.uuid4()}",
+            status=ProcessingJob.ImportType.IN_PROGRESS,
+        )
+        cache.set_many(
+            {_chunk_key(job.job_name, i): chunk for i, chunk in enumerate(chunks)},
+            timeout=DELETE_CHUNK_TIMEOUT,
+        )
+        delete_sequences_task.delay(job.job_name, len(chunks), orphans_only)
+        LOGGER.info(f"Deleting {len(sequence_ids)} sequences in job {job.job_name}")
+        return {"deleted_sequences_count": None, "job_id": job.job_name}
+    deleted = sum(delete_sequence_chunk(chunk, orphans_only) for chunk in chunks)
+    return {"deleted_sequences_count": deleted, "job_id": None}
+
 
+@shared_task
+def delete_sequences_task(
+    job_name: str, chunk_count: int, orphans_only: bool, done: int = 0
+):
+    """
+    Delete chunk number `done` of the job, then hand the next chunk to a new
+    task, so a single task never runs longer than one chunk.
+    """
+    key = _chunk_key(job_name, done)
+    try:
+        chunk = cache.get(key)
+        if chunk is None:
+            raise ValueError(f"chunk {done} of {chunk_count} is missing in the cache")
+        delete_sequence_chunk(chunk, orphans_only)
+    except Exception as e:
+        LOGGER.error(f"Deletion job {job_name} failed: {e}")
+        set_job_status(job_name, ProcessingJob.ImportType.FAILED)
+        raise
+    cache.delete(key)
+    done += 1
+    ProcessingJob.objects.filter(job_name=job_name).update(progress=done / chunk_count)
+    if done < chunk_count:
+        delete_sequences_task.delay(job_name, chunk_count, orphans_only, done)
+    else:
+        set_job_status(job_name, ProcessingJob.ImportType.COMPLETED)
 
-def clean_unused_sequences():
-    # Check the occurrences of each sequence (seqhash) in the table.
-    # Delete the sequence if it is not associated with any samples.
-    # Otherwise, leave it unchanged.
 
-    seqhash_result = Sequence.objects.filter(samples__id__isnull=True)
-    deleted_seqhash = seqhash_result.delete()
+def clean_unused_sequences(sequence_ids: list[int] | None = None) -> dict:
+    # Delete the sequences that are not associated with any sample.
+    # Only the given sequences are checked, all sequences without
+    # sequence_ids.
+    if sequence_ids is None:
+        sequence_ids = list(
+            Sequence.objects.filter(samples__id__isnull=True).values_list(
+                "id", flat=True
+            )
+        )
+    result = delete_sequence_ids(sequence_ids, orphans_only=True)
 
     if DEBUG:
-        print("Deleted seqhash:", deleted_seqhash)
+        print("Deleted unused sequences:", result)
+    return result
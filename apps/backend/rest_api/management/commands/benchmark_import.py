@@ -0,0 +1,91 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+
+from rest_api.data_entry.batch_write import mutation_write_lock
+from rest_api.data_entry.reference_cache import get_reference_cache
+from rest_api.data_entry.sample_entry_job import process_batch_single_thread
+from rest_api.data_entry.sample_import import count_manifest_rows
+from rest_api.models import Alignment
+from rest_api.models import AminoAcidMutation
+from rest_api.models import NucleotideMutation
+from rest_api.models import Sequence
+from sonar_backend.settings import SAMPLE_BATCH_SIZE
+
+TABLES = [
+    Sequence._meta.db_table,
+    Alignment._meta.db_table,
+    NucleotideMutation._meta.db_table,
+    AminoAcidMutation._meta.db_table,
+    NucleotideMutation.alignments.through._meta.db_table,
+    AminoAcidMutation.alignments.through._meta.db_table,
+]
+
+
+def _snapshot() -> tuple[int, dict[str, tuple[int, int, int]]]:
+    """Current WAL position and (inserted, updated, dead) tuples per table."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_current_wal_lsn() - '0/0'::pg_lsn")
+        wal = int(cursor.fetchone()[0])
+        cursor.execute(
+            """
+            SELECT relname, n_tup_ins, n_tup_upd, n_dead_tup
+            FROM pg_stat_user_tables WHERE relname = ANY(%s)
+            """,
+            [TABLES],
+        )
+        tables = {row[0]: row[1:] for row in cursor.fetchall()}
+    return wal, tables
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a sample archive several times and report the WAL volume and "
+        "the inserted, updated and dead tuples of every run. The samples are "
+        "written to the configured database, use a test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archive", help="Sample archive (.zip) sent by the CLI")
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=2,
+            help="Number of imports, runs after the first one are re-imports",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("The benchmark needs PostgreSQL statistics")
+        archive = options["archive"]
+        sample_count = count_manifest_rows(archive)
+        batches = [
+            (i, min(i + SAMPLE_BATCH_SIZE, sample_count))
+            for i in range(0, sample_count, SAMPLE_BATCH_SIZE)
+        ]
+        for run in range(1, options["runs"] + 1):
+            wal_before, tables_before = _snapshot()
+            timer = time.perf_counter()
+            reference_cache = get_reference_cache()
+            for batch in batches:
+                with mutation_write_lock():
+                    process_batch_single_thread(batch, reference_cache, archive)
+            seconds = time.perf_counter() - timer
+            # table statistics are flushed when the session ends
+            connection.close()
+            time.sleep(1)
+            wal_after, tables_after = _snapshot()
+            self.stdout.write(
+                f"Run {run}: {sample_count} samples in {seconds:.1f}s, "
+                f"{(wal_after - wal_before) / 1024**2:.1f} MiB WAL"
+            )
+            for table in TABLES:
+                before = tables_before.get(table, (0, 0, 0))
+                after = tables_after.get(table, (0, 0, 0))
+                inserted, updated, dead = (a - b for a, b in zip(after, before))
+                self.stdout.write(
+                    f"  {table}: {inserted} inserted, {updated} updated, "
+                    f"{dead} new dead tuples"
+                )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from rest_api.data_entry.mutation_gc import clean_unused_mutations
+from rest_api.data_entry.mutation_gc import unused_mutations_report
+from sonar_backend.settings import MUTATION_GC_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Delete mutations that are not part of any alignment anymore"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the number of unused mutations and their links",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=MUTATION_GC_BATCH_SIZE,
+            help="Mutations deleted per transaction",
+        )
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            for kind, counts in unused_mutations_report().items():
+                details = ", ".join(f"{name}: {n}" for name, n in counts.items())
+                self.stdout.write(f"{kind} {details}")
+            return
+        deleted = clean_unused_mutations(options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {deleted['nt']} nucleotide and {deleted['aa']} amino acid mutations"
+            )
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from rest_api.data_entry.alignment_reuse import complete_verified_alignments
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark the alignments of older imports complete whose mutation links "
+        "are verified, so they can be reused by the sample import"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the number of alignments that would be completed",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Alignments checked per transaction",
+        )
+
+    def handle(self, *args, **options):
+        counts = complete_verified_alignments(
+            options["batch_size"], dry_run=options["dry_run"]
+        )
+        verb = "Would complete" if options["dry_run"] else "Completed"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {counts['completed']} of {counts['checked']} incomplete alignments"
+            )
+        )
@@ -1,15 +1,17 @@
 import os
 import shutil
 from tempfile import mkdtemp
-from typing import List
 from typing import Optional
 
 from django.core.management.base import BaseCommand
 from django.core.management.base import CommandError
+from django.db import connection
 from django.db import transaction
+from django.db.models import Q
 import pandas as pd
 
 from rest_api.models import Lineage
+from rest_api.models import LineageClosure
 from rest_api.models import Reference
 
 
@@ -48,19 +50,24 @@ class LineageImport:
         # Can we remove this? playwright-e2e is failing without
         self.lineage_file = "lineage-test-data/lineages_test.tsv"
 
-    def process_lineage_data(self, reference: Reference):
+    def process_lineage_data(self, reference: Reference) -> dict[str, int]:
         """
         Process the lineage data.
 
+        The lineages of the reference are diffed against the file: new ones
+        are bulk inserted, changed parents are set with one bulk update and
+        lineages missing in the file are deleted. Unchanged rows are kept.
+
         Args:
             reference (Reference): The reference all imported lineages belong to.
+
+        Returns:
+            dict[str, int]: number of created, updated and deleted lineages
         """
         tsv_data = pd.read_csv(self.lineage_file, sep="\t")
 
-        # Use a single dictionary to track all lineage objects
-        all_lineages: dict[str, Lineage] = {}
-
-        # First pass: Create all lineage objects
+        # lineage name -> parent name, first occurrence of a sublineage wins
+        parents: dict[str, str | None] = {}
         for lineage, sublineages in tsv_data.itertuples(index=False):
             # Clean and validate lineage name
             lineage = str(lineage).strip()
@@ -70,10 +77,8 @@ class LineageImport:
                 )
 
             # Ensure the lineage is added even if it has no children
-            if lineage not in all_lineages:
-                all_lineages[lineage] = Lineage(name=lineage, reference=reference)
+            parents.setdefault(lineage, None)
 
-            # Process sublineages if they exist and create them if needed
             if sublineages != "none":
                 values = sublineages.split(",")
                 for val in values:
@@ -82,55 +87,80 @@ class LineageImport:
                         raise ValueError(
                             f"Sublineage name too long " f"({len(val)} chars): {val}"
                         )
-                    if val not in all_lineages:
-                        all_lineages[val] = Lineage(name=val, reference=reference)
-
-        # Second pass: Set parent relationships
-        for lineage, sublineages in tsv_data.itertuples(index=False):
-            lineage = str(lineage).strip()
-            if sublineages != "none":
-                values = sublineages.split(",")
-                for val in values:
-                    val = val.strip()
-                    # Set parent only if not set (first occurrence wins)
-                    if all_lineages[val].parent is None:
-                        all_lineages[val].parent = all_lineages[lineage]
-
-        # Save all lineages to the database
-        # Separate into parents (no parent set) and children (parent set)
-        parents_to_save = [
-            lineage_obj
-            for lineage_obj in all_lineages.values()
-            if lineage_obj.parent is None
-        ]
-        children_to_save = [
-            lineage_obj
-            for lineage_obj in all_lineages.values()
-            if lineage_obj.parent is not None
-        ]
+                    if parents.get(val) is None:
+                        parents[val] = lineage
 
         with transaction.atomic():
-            # Save parents first so they have IDs
-            for parent in parents_to_save:
-                parent.save()
-            # Then save children
-            for child in children_to_save:
-                child.save()
-
-    def update_lineage_data(self, lineages: str, reference: Reference) -> List[Lineage]:
+            existing: dict[str, Lineage] = {}
+            duplicates = []
+            for lineage_obj in Lineage.objects.filter(reference=reference).order_by(
+                "pk"
+            ):
+                if lineage_obj.name in existing:
+                    duplicates.append(lineage_obj.pk)
+                else:
+                    existing[lineage_obj.name] = lineage_obj
+
+            new_lineages = [
+                Lineage(name=name, reference=reference)
+                for name in parents
+                if name not in existing
+            ]
+            Lineage.objects.bulk_create(new_lineages)
+            lineages = {**existing, **{obj.name: obj for obj in new_lineages}}
+
+            changed = []
+            for name, parent_name in parents.items():
+                lineage_obj = lineages[name]
+                parent = lineages[parent_name] if parent_name else None
+                # compared by id, so children of removed duplicates move too
+                if lineage_obj.parent_id != (parent.pk if parent else None):
+                    lineage_obj.parent = parent
+                    changed.append(lineage_obj)
+
+            removed = duplicates + [
+                lineage_obj.pk
+                for name, lineage_obj in existing.items()
+                if name not in parents
+            ]
+            # Removed rows go first, so no new parent collides with a duplicate
+            # of the same name. A plain DELETE does not cascade to the kept
+            # children, the foreign keys are deferred until commit and by then
+            # every kept lineage points to its new parent.
+            LineageClosure.objects.filter(
+                Q(ancestor__in=removed) | Q(descendant__in=removed)
+            ).delete()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {Lineage._meta.db_table} WHERE id = ANY(%s)",
+                    [removed],
+                )
+            Lineage.objects.bulk_update(changed, ["parent"], batch_size=5000)
+
+            if new_lineages or changed or removed:
+                Lineage.rebuild_closure(reference)
+
+        return {
+            "created": len(new_lineages),
+            "updated": sum(1 for obj in changed if obj.name in existing),
+            "deleted": len(removed),
+        }
+
+    def update_lineage_data(
+        self, lineages: str, reference: Reference
+    ) -> dict[str, int]:
         """
         Update the lineage data.
 
         Returns:
-            pd.DataFrame: The dataframe with updated data.
+            dict[str, int]: number of created, updated and deleted lineages
         """
         if lineages:
             self.lineage_file = lineages
         else:
             self.set_file()
 
-        df = self.process_lineage_data(reference)
-        return df
+        return self.process_lineage_data(reference)
 
 
 class Command(BaseCommand):
@@ -158,10 +188,11 @@ class Command(BaseCommand):
                 f"Reference with accession '{kwargs['reference']}' not found. "
                 "Import the reference before importing its lineages."
             )
-        # Only replace the lineages of this reference, keep the others intact.
-        Lineage.objects.filter(reference=reference).delete()
+        # Only the lineages of this reference are updated.
         with LineageImport() as lineage_manager:
-            lineages = lineage_manager.update_lineage_data(
-                kwargs["lineages"], reference
-            )
+            counts = lineage_manager.update_lineage_data(kwargs["lineages"], reference)
+        print(
+            f"{counts['created']} lineages created, {counts['updated']} updated, "
+            f"{counts['deleted']} deleted"
+        )
         print("--Done--")
@@ -1,39 +1,40 @@
 # runapscheduler.py
 import logging
+import threading
 
-from apscheduler.schedulers.blocking import BlockingScheduler
-from apscheduler.triggers.base import BaseTrigger
+from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from django.conf import settings
 from django.core.management.base import BaseCommand
 from django_apscheduler import util
 from django_apscheduler.jobstores import DjangoJobStore
 from django_apscheduler.models import DjangoJobExecution
 
+from rest_api.data_entry.job_events import listen_for_queued_jobs
+from rest_api.data_entry.mutation_gc import clean_unused_mutations
 from rest_api.data_entry.sample_entry_job import check_for_new_data
 
 logger = logging.getLogger(__name__)
 
-
-class ManualOnlyTrigger(BaseTrigger):
-    """Trigger that only runs when manually triggered."""
-
-    def get_next_fire_time(self, previous_fire_time, now):
-        """Get next fire time."""
-        return None
-
-    def __str__(self):
-        """String representation."""
-        return "ManualOnlyTrigger"
+# queued jobs are looked for this often as well, in case a notification was
+# lost (e.g. published while the listener reconnected)
+FALLBACK_POLL_MINUTES = 10
 
 
+# The `close_old_connections` decorator ensures that database connections, that have become
+# unusable or are obsolete, are closed before and after your job has run. You should use it
+# to wrap any jobs that you schedule that access the Django database in any way.
+@util.close_old_connections
 def scheduled_data_entry():
     check_for_new_data()
 
 
-# The `close_old_connections` decorator ensures that database connections, that have become
-# unusable or are obsolete, are closed before and after your job has run. You should use it
-# to wrap any jobs that you schedule that access the Django database in any way.
+@util.close_old_connections
+def scheduled_mutation_cleanup():
+    clean_unused_mutations()
+
+
 @util.close_old_connections
 def delete_old_job_executions(max_age=604_800):
     """
@@ -51,16 +52,8 @@ class Command(BaseCommand):
     help = "Runs APScheduler."
 
     def handle(self, *args, **options):
-        scheduler = BlockingScheduler(timezone=settings.TIME_ZONE)
+        scheduler = BackgroundScheduler(timezone=settings.TIME_ZONE)
         scheduler.add_jobstore(DjangoJobStore(), "default")
-        scheduler.add_job(
-            scheduled_data_entry,
-            trigger=ManualOnlyTrigger(),
-            id="data_import",
-            max_instances=1,
-            replace_existing=True,
-        )
-        logger.info("Added job 'my_job'.")
         scheduler.add_job(
             delete_old_job_executions,
             trigger=CronTrigger(
@@ -71,10 +64,40 @@ class Command(BaseCommand):
             replace_existing=True,
         )
         logger.info("Added weekly job: 'delete_old_job_executions'.")
+        scheduler.add_job(
+            scheduled_mutation_cleanup,
+            trigger=CronTrigger(day_of_week="sun", hour="02", minute="00"),
+            id="scheduled_mutation_cleanup",
+            max_instances=1,
+            replace_existing=True,
+        )
+        logger.info("Added weekly job: 'scheduled_mutation_cleanup'.")
+
+        if settings.REDIS_URL:
+            # jobs are claimed with SKIP LOCKED, a poll that runs next to the
+            # listener never takes the same job
+            scheduler.add_job(
+                scheduled_data_entry,
+                trigger=IntervalTrigger(minutes=FALLBACK_POLL_MINUTES),
+                id="scheduled_data_entry",
+                max_instances=1,
+                replace_existing=True,
+            )
+            logger.info(
+                f"Added job: 'scheduled_data_entry' every {FALLBACK_POLL_MINUTES} min."
+            )
 
         try:
             logger.info("Starting scheduler...")
             scheduler.start()
+            if settings.REDIS_URL:
+                # uploads publish their job, imports run one after the other
+                # in this process (single instance)
+                logger.info("Waiting for queued import jobs...")
+                listen_for_queued_jobs(scheduled_data_entry)
+            else:
+                # without Redis, the upload view runs the import itself
+                threading.Event().wait()
         except KeyboardInterrupt:
             logger.info("Stopping scheduler...")
             scheduler.shutdown()
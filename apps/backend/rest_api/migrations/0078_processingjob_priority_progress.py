@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rest_api", "0077_remove_lineage_unique_lineage_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="processingjob",
+            name="priority",
+            field=models.SmallIntegerField(
+                choices=[(0, "Normal"), (10, "High")], default=0
+            ),
+        ),
+        migrations.AddField(
+            model_name="processingjob",
+            name="progress",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="processingjob",
+            index=models.Index(
+                fields=["status", "-priority", "entry_time"],
+                name="processing__status_8b733a_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rest_api", "0078_processingjob_priority_progress"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportMetric",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("batch", models.IntegerField(blank=True, null=True)),
+                ("step", models.CharField(max_length=100)),
+                ("seconds", models.FloatField()),
+                ("rows", models.BigIntegerField(blank=True, null=True)),
+                ("host", models.CharField(blank=True, max_length=255, null=True)),
+                ("version", models.CharField(max_length=50)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "file",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="metrics",
+                        to="rest_api.fileprocessing",
+                        to_field="file_name",
+                    ),
+                ),
+                (
+                    "processing_job",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="metrics",
+                        to="rest_api.processingjob",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "import_metric",
+                "indexes": [
+                    models.Index(
+                        fields=["step", "created"], name="import_metr_step_a324b5_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_lineage_closure(apps, schema_editor):
+    # a copy of rest_api.models.lineage_closure_rows as of this migration, so
+    # later changes to the model code do not change what the migration writes
+    Lineage = apps.get_model("rest_api", "Lineage")
+    LineageClosure = apps.get_model("rest_api", "LineageClosure")
+    for reference_id in Lineage.objects.values_list(
+        "reference_id", flat=True
+    ).distinct():
+        ids_by_name = {}
+        children = {}
+        for lineage_id, name, parent_name in Lineage.objects.filter(
+            reference_id=reference_id
+        ).values_list("id", "name", "parent__name"):
+            ids_by_name.setdefault(name, []).append(lineage_id)
+            if parent_name is not None:
+                children.setdefault(parent_name, set()).add(name)
+        rows = []
+        for name, ancestor_ids in ids_by_name.items():
+            depths = {name: 0}
+            frontier = [name]
+            while frontier:
+                next_frontier = []
+                for parent_name in frontier:
+                    for child_name in children.get(parent_name, ()):
+                        if child_name not in depths:
+                            depths[child_name] = depths[parent_name] + 1
+                            next_frontier.append(child_name)
+                frontier = next_frontier
+            for ancestor_id in ancestor_ids:
+                for descendant_name, depth in depths.items():
+                    for descendant_id in ids_by_name[descendant_name]:
+                        if depth == 0 and descendant_id != ancestor_id:
+                            continue
+                        rows.append(
+                            LineageClosure(
+                                ancestor_id=ancestor_id,
+                                descendant_id=descendant_id,
+                                depth=depth,
+                            )
+                        )
+        LineageClosure.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rest_api", "0079_importmetric"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LineageClosure",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("depth", models.IntegerField()),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="descendant_links",
+                        to="rest_api.lineage",
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ancestor_links",
+                        to="rest_api.lineage",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "lineage_closure",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("ancestor", "descendant"), name="unique_lineage_closure"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_lineage_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rest_api", "0080_lineageclosure"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="processingjob",
+            name="batch_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="processingjob",
+            name="batches_done",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="processingjob",
+            name="failed_batches",
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rest_api", "0081_processingjob_batches"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="sequence",
+            index=models.Index(fields=["seqhash"], name="sequence_seqhash_56164e_idx"),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rest_api", "0082_sequence_seqhash_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="processingjob",
+            name="retried_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="ImportBatch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("member", models.CharField(max_length=255)),
+                ("start", models.IntegerField(blank=True, null=True)),
+                ("stop", models.IntegerField(blank=True, null=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "file",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="batches",
+                        to="rest_api.fileprocessing",
+                        to_field="file_name",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "import_batch",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("file", "member", "start"),
+                        name="unique_import_batch",
+                        nulls_distinct=False,
+                    )
+                ],
+            },
+        ),
+    ]
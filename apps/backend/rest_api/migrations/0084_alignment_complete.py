@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rest_api", "0083_importbatch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="alignment",
+            name="complete",
+            field=models.BooleanField(db_default=False, default=False),
+        ),
+    ]
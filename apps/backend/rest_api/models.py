@@ -28,6 +28,7 @@ class Sequence(models.Model):
         db_table = "sequence"
         indexes = [
             models.Index(fields=["name"]),
+            models.Index(fields=["seqhash"]),
             models.Index(fields=["init_upload_date"]),
             models.Index(fields=["last_update_date"]),
         ]
@@ -40,6 +41,9 @@ class Alignment(models.Model):
     Attributes:
         replicon (ForeignKey): Reference to the associated Replicon
         sequence (ForeignKey): Reference to the Sequence aligned with Replicon
+        complete (BooleanField): Set in the transaction of the import batch
+            that wrote all mutation links of the alignment. Only complete
+            alignments are reused by later imports.
 
     Constraints:
         - Unique constraint on (replicon, sequence) to prevent duplicate alignments.
@@ -50,6 +54,8 @@ class Alignment(models.Model):
 
     replicon = models.ForeignKey("Replicon", models.CASCADE)
     sequence = models.ForeignKey("Sequence", models.CASCADE, related_name="alignments")
+    # a database default as well, the COPY loader inserts alignments in SQL
+    complete = models.BooleanField(default=False, db_default=False)
 
     class Meta:
         indexes = [
@@ -347,6 +353,7 @@ class Lineage(models.Model):
     Methods:
         get_sublineages: Returns all sublineages, including direct children and recursive descendants.
         get_sublineages_from_list (static): A helper method to retrieve sublineages from a list of lineages.
+        rebuild_closure (static): Recreates the LineageClosure rows of a reference.
 
     Constraints:
         - Ensures uniqueness of lineage name and parent combination.
@@ -358,35 +365,38 @@ class Lineage(models.Model):
     reference = models.ForeignKey("Reference", models.CASCADE)
 
     def get_sublineages(self) -> set:
-        lineages = set([self])
-        lineages.update(
-            Lineage.get_sublineages_from_list(
-                Lineage.objects.filter(name=self.name, reference=self.reference_id)
-            )
-        )
-        return lineages
+        # the lineage itself is linked with depth 0
+        return set(Lineage.objects.filter(ancestor_links__ancestor=self))
 
     @staticmethod
     def get_sublineages_from_list(lineages):
-        # Iterative breadth-first descent over the name-based parent links.
-        # Values are materialised each round (plain lists, not lazy querysets) to
-        # avoid pathologically nested subqueries, and a visited-guard guarantees
-        # termination. Stays within the same reference(s): lineage names collide
-        # across pathogens (e.g. RSV-A "A" vs Influenza H3N2 "A").
-        ref_ids = set(lineages.values_list("reference_id", flat=True))
-        frontier = set(lineages.values_list("name", flat=True))
-        seen_names = set(frontier)
-        lineages_set = set()
-        while frontier:
-            children = list(
-                Lineage.objects.filter(
-                    parent__name__in=frontier, reference_id__in=ref_ids
-                )
+        return set(
+            Lineage.objects.filter(
+                ancestor_links__ancestor__in=lineages, ancestor_links__depth__gt=0
+            ).distinct()
+        )
+
+    @staticmethod
+    def rebuild_closure(reference):
+        """
+        Recreate the LineageClosure rows of all lineages of a reference, after
+        its lineages were imported.
+        """
+        rows = lineage_closure_rows(
+            Lineage.objects.filter(reference=reference).values_list(
+                "id", "name", "parent__name"
             )
-            lineages_set.update(children)
-            frontier = {c.name for c in children if c.name not in seen_names}
-            seen_names.update(frontier)
-        return lineages_set
+        )
+        LineageClosure.objects.filter(ancestor__reference=reference).delete()
+        LineageClosure.objects.bulk_create(
+            (
+                LineageClosure(
+                    ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth
+                )
+                for ancestor_id, descendant_id, depth in rows
+            ),
+            batch_size=5000,
+        )
 
     def __str__(self) -> str:
         return self.name
@@ -406,6 +416,81 @@ class Lineage(models.Model):
         ]
 
 
+def lineage_closure_rows(lineages) -> list[tuple[int, int, int]]:
+    """
+    Ancestor/descendant pairs of a lineage tree, given as (id, name,
+    parent name) rows of one reference.
+
+    Lineages are linked by name: a recombinant can have several rows (one per
+    parent) and all of them share the descendants of that name. Each lineage
+    is its own descendant with depth 0.
+
+    Returns:
+        list[tuple[int, int, int]]: (ancestor id, descendant id, depth)
+    """
+    ids_by_name: dict[str, list[int]] = {}
+    children: dict[str, set[str]] = {}
+    for lineage_id, name, parent_name in lineages:
+        ids_by_name.setdefault(name, []).append(lineage_id)
+        if parent_name is not None:
+            children.setdefault(parent_name, set()).add(name)
+
+    rows = []
+    for name, ancestor_ids in ids_by_name.items():
+        # breadth-first, so every name gets its shortest depth
+        depths = {name: 0}
+        frontier = [name]
+        while frontier:
+            next_frontier = []
+            for parent_name in frontier:
+                for child_name in children.get(parent_name, ()):
+                    if child_name not in depths:
+                        depths[child_name] = depths[parent_name] + 1
+                        next_frontier.append(child_name)
+            frontier = next_frontier
+        for ancestor_id in ancestor_ids:
+            rows.append((ancestor_id, ancestor_id, 0))
+            for descendant_name, depth in depths.items():
+                if depth == 0:
+                    continue
+                for descendant_id in ids_by_name[descendant_name]:
+                    rows.append((ancestor_id, descendant_id, depth))
+    return rows
+
+
+class LineageClosure(models.Model):
+    """
+    Materialised ancestor/descendant pairs of the lineage tree, so that all
+    sublineages of a lineage are found with one indexed join. Rebuilt per
+    reference by the lineage import (Lineage.rebuild_closure).
+
+    Attributes:
+        ancestor (ForeignKey): The lineage.
+        descendant (ForeignKey): The lineage itself or one of its (recursive) sublineages.
+        depth (IntegerField): Number of generations between both, 0 for the lineage itself.
+
+    Constraints:
+        - Ensures each ancestor/descendant pair is stored once.
+    """
+
+    ancestor = models.ForeignKey(
+        Lineage, models.CASCADE, related_name="descendant_links"
+    )
+    descendant = models.ForeignKey(
+        Lineage, models.CASCADE, related_name="ancestor_links"
+    )
+    depth = models.IntegerField()
+
+    class Meta:
+        db_table = "lineage_closure"
+        constraints = [
+            UniqueConstraint(
+                name="unique_lineage_closure",
+                fields=["ancestor", "descendant"],
+            ),
+        ]
+
+
 class Reference(models.Model):
     """
     Represents a reference of a organism used for sequence alignment.
@@ -683,6 +768,10 @@ class ProcessingJob(models.Model):
         COMPLETED = "C", _("Completed")
         FAILED = "F", _("Failed")
 
+    class Priority(models.IntegerChoices):
+        NORMAL = 0, _("Normal")
+        HIGH = 10, _("High")
+
     job_name = models.CharField(max_length=255, unique=True)
     status = models.CharField(
         max_length=2,
@@ -690,9 +779,27 @@ class ProcessingJob(models.Model):
         default=ImportType.QUEUED,
     )
     entry_time = models.DateTimeField(auto_now=True, unique=True)
+    # queued jobs with a higher priority are started first
+    priority = models.SmallIntegerField(
+        choices=Priority.choices, default=Priority.NORMAL
+    )
+    # fraction of the job's files, with celery of its batches, that have
+    # been imported
+    progress = models.FloatField(default=0)
+    # batches dispatched to celery and the ones that finished successfully
+    batch_count = models.IntegerField(default=0)
+    batches_done = models.IntegerField(default=0)
+    # one entry per failed batch attempt: file, batch, attempt, error
+    failed_batches = models.JSONField(default=list)
+    # set when the failed files of the job were queued again, older
+    # failures of these files do not count anymore
+    retried_at = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         db_table = "processing_job"
+        indexes = [
+            models.Index(fields=["status", "-priority", "entry_time"]),
+        ]
 
 
 class FileProcessing(models.Model):
@@ -705,6 +812,35 @@ class FileProcessing(models.Model):
         db_table = "file_processing"
 
 
+class ImportBatch(models.Model):
+    """
+    Checkpoint of an imported part of an archive: a [start, stop) row range
+    of the sample manifest or a whole annotation file (no range). A retried
+    import skips the parts that have a checkpoint.
+    """
+
+    file = models.ForeignKey(
+        FileProcessing,
+        to_field="file_name",
+        on_delete=models.CASCADE,
+        related_name="batches",
+    )
+    member = models.CharField(max_length=255)
+    start = models.IntegerField(blank=True, null=True)
+    stop = models.IntegerField(blank=True, null=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "import_batch"
+        constraints = [
+            UniqueConstraint(
+                name="unique_import_batch",
+                fields=["file", "member", "start"],
+                nulls_distinct=False,
+            ),
+        ]
+
+
 class ImportLog(models.Model):
     class ImportType(models.TextChoices):
         UNKNOWN = "NUL", _("Unknown")
@@ -737,3 +873,38 @@ class ImportLog(models.Model):
                 fields=["file", "updated"],
             ),
         ]
+
+
+class ImportMetric(models.Model):
+    """
+    Duration and row count of one step of an import, e.g. reading the
+    parquet files of a batch or one bulk write.
+
+    Batch metrics have the first manifest row of their batch in `batch`, file
+    metrics (whole sample, annotation or property import) have no batch.
+    Host and backend version are kept to compare throughput across machines
+    and releases.
+    """
+
+    processing_job = models.ForeignKey(
+        ProcessingJob, on_delete=models.CASCADE, related_name="metrics"
+    )
+    file = models.ForeignKey(
+        FileProcessing,
+        to_field="file_name",
+        on_delete=models.CASCADE,
+        related_name="metrics",
+    )
+    batch = models.IntegerField(blank=True, null=True)
+    step = models.CharField(max_length=100)
+    seconds = models.FloatField()
+    rows = models.BigIntegerField(blank=True, null=True)
+    host = models.CharField(max_length=255, blank=True, null=True)
+    version = models.CharField(max_length=50)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "import_metric"
+        indexes = [
+            models.Index(fields=["step", "created"]),
+        ]
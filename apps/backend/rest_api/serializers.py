@@ -63,10 +63,10 @@ class Sample2PropertySerializer(serializers.ModelSerializer):
 
 
 class Sample2PropertyBulkCreateOrUpdateSerializer(serializers.ModelSerializer):
-    sample = serializers.PrimaryKeyRelatedField(queryset=models.Sample.objects.all())
-    property = serializers.PrimaryKeyRelatedField(
-        queryset=models.Property.objects.all()
-    )
+    # IDs are resolved in bulk by the property import, a related field would
+    # look up the sample and property again for every row
+    sample = serializers.IntegerField(source="sample_id")
+    property = serializers.IntegerField(source="property_id")
     value_integer = serializers.IntegerField(required=False, allow_null=True)
     value_float = serializers.FloatField(required=False, allow_null=True)
     value_text = serializers.CharField(required=False, allow_null=True)
@@ -506,7 +506,17 @@ class ProcessingJobSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = models.ProcessingJob
-        fields = ["job_name", "status", "entry_time"]
+        fields = [
+            "job_name",
+            "status",
+            "entry_time",
+            "priority",
+            "progress",
+            "batch_count",
+            "batches_done",
+            "failed_batches",
+            "retried_at",
+        ]
 
 
 class FileProcessingSerializer(serializers.ModelSerializer):
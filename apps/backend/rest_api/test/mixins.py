@@ -1,16 +1,26 @@
 import json
 import os
+import shutil
+import tempfile
 from urllib.parse import urlencode
+import zipfile
 
 from django.contrib.auth import models as django_models
 from django.test import TestCase
 from django.urls import reverse
+import pandas as pd
 from rest_framework import status
 from rest_framework.test import APIRequestFactory
 from rest_framework.test import APITestCase
 from rest_framework.test import APITransactionTestCase
 from rest_framework.test import force_authenticate
 
+from rest_api.data_entry.sample_import import MANIFEST_FILE
+from rest_api.data_entry.sample_import import VAR_SCHEMA
+from rest_api.data_entry.sample_import import VARIANTS_FILE
+from rest_api.models import AminoAcidMutation
+from rest_api.models import NucleotideMutation
+
 
 class FixtureModelTestCase(TestCase):
     fixtures = [
@@ -66,6 +76,118 @@ class FixtureAPITransactionTestCase(APITransactionTestCase, FixtureApiMixin):
     usermap = dict()
 
 
+class SampleArchiveMixin:
+    """Sample import archives as written by the CLI, built from alignments."""
+
+    def alignment_variants(self, alignment) -> list[dict]:
+        """Variant rows (var parquet columns) of the mutations of an alignment."""
+        rows = []
+        import_ids = {}
+        for mutation in (
+            NucleotideMutation.objects.filter(alignments=alignment)
+            .select_related("replicon")
+            .order_by("id")
+        ):
+            import_ids[mutation.id] = len(rows) + 1
+            rows.append(
+                {
+                    "id": len(rows) + 1,
+                    "ref": mutation.ref,
+                    "start": mutation.start,
+                    "end": mutation.end,
+                    "alt": mutation.alt,
+                    "reference_acc": mutation.replicon.accession,
+                    "type": "nt",
+                    "frameshift": int(mutation.is_frameshift),
+                    "parent_id": "",
+                }
+            )
+        for mutation in (
+            AminoAcidMutation.objects.filter(alignments=alignment)
+            .select_related("cds")
+            .prefetch_related("parent")
+            .order_by("id")
+        ):
+            rows.append(
+                {
+                    "id": len(rows) + 1,
+                    "ref": mutation.ref,
+                    "start": mutation.start,
+                    "end": mutation.end,
+                    "alt": mutation.alt,
+                    "reference_acc": mutation.cds.accession,
+                    "type": "cds",
+                    "frameshift": 0,
+                    "parent_id": ",".join(
+                        str(import_ids[parent.id])
+                        for parent in mutation.parent.all()
+                        if parent.id in import_ids
+                    ),
+                }
+            )
+        return rows
+
+    def write_sample_archive(
+        self,
+        samples: list[tuple[str, str, list[dict]]],
+        row_group_size: int | None = None,
+        var_index: bool = True,
+    ) -> str:
+        """
+        Write an archive with the given (name, seqhash, variant rows) samples,
+        aligned to MN908947.3. Samples with the same seqhash share a var file.
+        Without `var_index`, the archive looks like one of an older CLI.
+        """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        manifest_rows = []
+        variant_frames = {}
+        for name, seqhash, variants in samples:
+            var_file = f"{seqhash}.parquet"
+            manifest_rows.append(
+                {
+                    "anno_vcf_file": "",
+                    "cds_file": "",
+                    "header": name,
+                    "name": name,
+                    "properties": "{}",
+                    "ref_file": "",
+                    "refmol": "MN908947.3",
+                    "refmolid": 1,
+                    "seq_file": "",
+                    "seqhash": seqhash,
+                    "sequence_length": 29903,
+                    "sourceid": 1,
+                    "translationid": 1,
+                    "include_nx": False,
+                    "var_parquet_file": f"cache/var/{var_file}",
+                    "source_acc": "MN908947.3",
+                }
+            )
+            if var_file not in variant_frames:
+                variant_frames[var_file] = pd.DataFrame(
+                    variants, columns=VAR_SCHEMA.names
+                ).assign(var_file=var_file, var_index=len(variant_frames))
+            if var_index:
+                manifest_rows[-1]["var_index"] = list(variant_frames).index(var_file)
+        archive_path = os.path.join(directory, "samples.zip")
+        with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_STORED) as zipf:
+            zipf.writestr(
+                MANIFEST_FILE,
+                pd.DataFrame(manifest_rows).to_parquet(
+                    index=False, row_group_size=row_group_size
+                ),
+            )
+            variants = pd.concat(variant_frames.values(), ignore_index=True)
+            if not var_index:
+                variants = variants.drop(columns=["var_index"])
+            zipf.writestr(
+                VARIANTS_FILE,
+                variants.to_parquet(index=False, row_group_size=row_group_size),
+            )
+        return archive_path
+
+
 class CustomTestMixin:
     model = None
     viewset = None
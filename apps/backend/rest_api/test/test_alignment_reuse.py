@@ -0,0 +1,159 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+
+from rest_api.data_entry.alignment_reuse import complete_verified_alignments
+from rest_api.data_entry.sample_entry_job import process_batch_run
+from rest_api.data_entry.sample_import import load_batch
+from rest_api.models import Alignment
+from rest_api.models import NucleotideMutation
+from rest_api.models import Sequence
+from rest_api.test.mixins import FixtureModelTestCase
+from rest_api.test.mixins import SampleArchiveMixin
+
+
+def interrupt(sonar_import_objs):
+    raise RuntimeError("batch interrupted")
+
+
+def mutation_ids(alignment: Alignment) -> tuple[set[int], set[int]]:
+    return (
+        set(alignment.nucleotide_mutations.values_list("id", flat=True)),
+        set(alignment.amino_acid_mutations.values_list("id", flat=True)),
+    )
+
+
+class AlignmentReuseTests(FixtureModelTestCase, SampleArchiveMixin):
+    loader = "orm"
+
+    def setUp(self):
+        for setting, value in [
+            ("IMPORT_REUSE_ALIGNMENTS", True),
+            ("SAMPLE_IMPORT_LOADER", self.loader),
+        ]:
+            patcher = mock.patch(
+                f"rest_api.data_entry.sample_entry_job.{setting}", value
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.source = Alignment.objects.select_related("sequence").get(pk=1)
+        self.seqhash = self.source.sequence.seqhash
+        self.variants = self.alignment_variants(self.source)
+
+    def import_archive(self, archive: str, sample_count: int = 1):
+        success, error, *_ = process_batch_run((0, sample_count), archive)
+        self.assertTrue(success, error)
+
+    def alignment(self, name: str) -> Alignment:
+        return Alignment.objects.get(sequence__name=name)
+
+    def test_incomplete_alignments_are_not_reused(self):
+        # the fixture alignments were not written by a completed batch
+        archive = self.write_sample_archive([("new", self.seqhash, self.variants)])
+        [sample_import] = load_batch(archive, 0, 1, reuse_alignments=True)
+        self.assertIsNone(sample_import.source_alignment_id)
+
+    def test_reuses_complete_alignment(self):
+        self.import_archive(
+            self.write_sample_archive([("first", self.seqhash, self.variants)])
+        )
+        first = self.alignment("first")
+        self.assertTrue(first.complete)
+        self.assertEqual(mutation_ids(first), mutation_ids(self.source))
+
+        # the variants of a reused alignment are not read at all
+        archive = self.write_sample_archive([("second", self.seqhash, [])])
+        [sample_import] = load_batch(archive, 0, 1, reuse_alignments=True)
+        self.assertEqual(sample_import.source_alignment_id, first.id)
+        self.import_archive(archive)
+        second = self.alignment("second")
+        self.assertTrue(second.complete)
+        self.assertEqual(mutation_ids(second), mutation_ids(first))
+
+    def test_own_alignment_is_not_reused(self):
+        archive = self.write_sample_archive([("first", self.seqhash, self.variants)])
+        self.import_archive(archive)
+        [sample_import] = load_batch(archive, 0, 1, reuse_alignments=True)
+        self.assertIsNone(sample_import.source_alignment_id)
+
+    def test_failed_batch_leaves_no_alignment(self):
+        archive = self.write_sample_archive(
+            [("good", self.seqhash, self.variants), ("bad", "other", [])]
+        )
+        with mock.patch(
+            "rest_api.data_entry.sample_entry_job.mark_alignments_complete",
+            interrupt,
+        ):
+            success, error, *_ = process_batch_run((0, 2), archive)
+        self.assertFalse(success)
+        self.assertIn("batch interrupted", error)
+        self.assertFalse(Sequence.objects.filter(name__in=["good", "bad"]).exists())
+
+
+class CopyLoaderAlignmentReuseTests(AlignmentReuseTests):
+    loader = "copy"
+
+
+class CompleteAlignmentsTests(FixtureModelTestCase, SampleArchiveMixin):
+    def setUp(self):
+        source = Alignment.objects.select_related("sequence").get(pk=1)
+        archive = self.write_sample_archive(
+            [
+                ("first", "first", self.alignment_variants(source)),
+                ("second", "second", self.alignment_variants(source)),
+                ("no_variants", "no_variants", []),
+            ]
+        )
+        success, error, *_ = process_batch_run((0, 3), archive)
+        self.assertTrue(success, error)
+        # as written by an older import
+        Alignment.objects.update(complete=False)
+
+    def completed(self) -> set[str]:
+        return set(
+            Alignment.objects.filter(complete=True).values_list(
+                "sequence__name", flat=True
+            )
+        )
+
+    def test_completes_alignments_with_verified_links(self):
+        second = Alignment.objects.get(sequence__name="second")
+        self.assertTrue(second.amino_acid_mutations.exists())
+        # interrupted before the amino acid links were written
+        second.amino_acid_mutations.clear()
+        dry_run = complete_verified_alignments(batch_size=2, dry_run=True)
+        self.assertEqual(self.completed(), set())
+
+        counts = complete_verified_alignments(batch_size=2)
+        self.assertEqual(counts, dry_run)
+        self.assertEqual(counts["checked"], Alignment.objects.count())
+        self.assertIn("first", self.completed())
+        self.assertNotIn("second", self.completed())
+        # could have been interrupted before any link was written
+        self.assertNotIn("no_variants", self.completed())
+        self.assertEqual(counts["completed"], len(self.completed()))
+        self.assertEqual(
+            complete_verified_alignments(),
+            {
+                "checked": Alignment.objects.count() - counts["completed"],
+                "completed": 0,
+            },
+        )
+
+    def test_amino_acid_mutation_without_its_nucleotide_mutations(self):
+        first = Alignment.objects.get(sequence__name="first")
+        first.nucleotide_mutations.remove(
+            *NucleotideMutation.objects.filter(aminoacidmutation__alignments=first)
+        )
+        self.assertTrue(first.nucleotide_mutations.exists())
+        complete_verified_alignments()
+        self.assertNotIn("first", self.completed())
+
+    def test_command(self):
+        out = StringIO()
+        call_command("complete_alignments", "--dry-run", stdout=out)
+        self.assertIn("Would complete", out.getvalue())
+        self.assertEqual(self.completed(), set())
+        call_command("complete_alignments", stdout=out)
+        self.assertIn("first", self.completed())
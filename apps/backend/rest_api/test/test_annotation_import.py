@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+
+from rest_api.data_entry.annotation_import import AnnotationImport
+from rest_api.models import AnnotationType
+from rest_api.test.mixins import FixtureModelTestCase
+
+# positions of the fixture mutations 1 (C240T) and 2 (C592T), 1-based
+VCF_LINES = [
+    "##fileformat=VCFv4.2",
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT",
+    "MN908947.3\t241\t.\tC\tT,G\t.\t.\t"
+    "ANN=T|missense_variant&splice_region_variant|MODERATE|ORF1a,"
+    "G|synonymous_variant|LOW|ORF1a\tGT",
+    "MN908947.3\t593\t.\tC\tT\t.\t.\tANN=T|missense_variant|MODERATE|ORF1a\tGT",
+    "MN908947.3\t700\t.\tA\t.\t.\t.\tANN=.|intergenic_region|MODIFIER|\tGT",
+    "OTHER.1\t241\t.\tC\tT\t.\t.\tANN=T|stop_gained|HIGH|ORF1a\tGT",
+]
+
+
+class AnnotationImportTests(FixtureModelTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.vcf_path = os.path.join(directory, "sample.vcf")
+        with open(self.vcf_path, "w") as handle:
+            handle.write("\n".join(VCF_LINES) + "\n")
+
+    def test_find_mutations_joins_on_the_whole_key(self):
+        annotation_import = AnnotationImport(self.vcf_path)
+        [lookups] = annotation_import.batches()
+        # C241G and the allele of the other replicon are not in the database
+        self.assertEqual(len(lookups), 4)
+        mutations = annotation_import._find_mutations(lookups)
+        self.assertEqual(sorted(mutation.id for mutation in mutations), [1, 2])
+        self.assertEqual(annotation_import._find_mutations({}), [])
+
+    def test_batches(self):
+        annotation_import = AnnotationImport(self.vcf_path, batch_size=3)
+        self.assertEqual(
+            [len(lookups) for lookups in annotation_import.batches()], [3, 1]
+        )
+
+    def test_annotation_relations(self):
+        annotation_import = AnnotationImport(self.vcf_path)
+        relations = set()
+        for lookups in annotation_import.batches():
+            AnnotationType.objects.bulk_create(
+                annotation_import.get_annotation_objs(lookups), ignore_conflicts=True
+            )
+            relations |= {
+                (
+                    relation.annotationtype.seq_ontology,
+                    relation.annotationtype.impact,
+                    relation.nucleotidemutation_id,
+                )
+                for relation in annotation_import.get_annotation2mutation_objs()
+            }
+        self.assertEqual(
+            relations,
+            {
+                ("missense_variant", "MODERATE", 1),
+                ("splice_region_variant", "MODERATE", 1),
+                ("missense_variant", "MODERATE", 2),
+            },
+        )
@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.test import SimpleTestCase
+
+from rest_api.data_entry.batch_sizing import get_throughput
+from rest_api.data_entry.batch_sizing import plan_batches
+from rest_api.data_entry.batch_sizing import record_throughput
+from rest_api.data_entry.batch_sizing import SAMPLE_ROW_WEIGHT
+from rest_api.data_entry.batch_sizing import target_batch_work
+from rest_api.data_entry.batch_sizing import THROUGHPUT_SMOOTHING
+
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class PlanBatchesTests(SimpleTestCase):
+    def plan(self, variant_counts: list[int], throughput: float | None):
+        with mock.patch(
+            "rest_api.data_entry.batch_sizing.get_throughput", return_value=throughput
+        ), mock.patch(
+            "rest_api.data_entry.batch_sizing.IMPORT_BATCH_TARGET_SECONDS", 1.0
+        ):
+            return plan_batches(variant_counts)
+
+    def test_fixed_size_without_throughput(self):
+        with mock.patch("rest_api.data_entry.batch_sizing.SAMPLE_BATCH_SIZE", 4):
+            self.assertEqual(self.plan([0] * 10, None), [(0, 4), (4, 8), (8, 10)])
+            self.assertEqual(self.plan([], None), [])
+
+    def test_batches_get_the_target_work(self):
+        # 100 rows per second, each sample costs 30 or 80 rows
+        batches = self.plan([10, 60, 10, 10, 10, 10], 100)
+        self.assertEqual(batches, [(0, 2), (2, 6)])
+
+    def test_large_samples_get_their_own_batch(self):
+        self.assertEqual(self.plan([500, 0, 500], 100), [(0, 1), (1, 3)])
+
+    def test_max_batch_samples(self):
+        with mock.patch("rest_api.data_entry.batch_sizing.MAX_BATCH_SAMPLES", 3):
+            batches = self.plan([0] * 7, 1e6)
+        self.assertEqual(batches, [(0, 3), (3, 6), (6, 7)])
+
+    def test_target_batch_work(self):
+        with mock.patch(
+            "rest_api.data_entry.batch_sizing.get_throughput", return_value=0.5
+        ), mock.patch(
+            "rest_api.data_entry.batch_sizing.IMPORT_BATCH_TARGET_SECONDS", 1.0
+        ):
+            self.assertEqual(target_batch_work(), 1)
+        with mock.patch(
+            "rest_api.data_entry.batch_sizing.IMPORT_BATCH_TARGET_SECONDS", 0
+        ):
+            self.assertIsNone(target_batch_work())
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class ThroughputTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch(
+            "rest_api.data_entry.batch_sizing.REDIS_URL", "redis://localhost:6379/"
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_moving_average(self):
+        self.assertIsNone(get_throughput())
+        record_throughput(1000, 10)
+        self.assertEqual(get_throughput(), 100)
+        record_throughput(2000, 10)
+        self.assertAlmostEqual(
+            get_throughput(),
+            THROUGHPUT_SMOOTHING * 200 + (1 - THROUGHPUT_SMOOTHING) * 100,
+        )
+        # empty batches are not recorded
+        record_throughput(0, 10)
+        record_throughput(SAMPLE_ROW_WEIGHT, 0)
+        self.assertAlmostEqual(
+            get_throughput(),
+            THROUGHPUT_SMOOTHING * 200 + (1 - THROUGHPUT_SMOOTHING) * 100,
+        )
+
+    def test_without_redis(self):
+        with mock.patch("rest_api.data_entry.batch_sizing.REDIS_URL", ""):
+            record_throughput(1000, 10)
+            self.assertIsNone(get_throughput())
+        self.assertIsNone(get_throughput())
@@ -0,0 +1,202 @@
+from contextlib import contextmanager
+from unittest import mock
+
+from django.db import connection
+from django.db import OperationalError
+from django.db import transaction
+from django.test import SimpleTestCase
+from django.test import TestCase
+from django.test import TransactionTestCase
+
+from rest_api.data_entry.batch_write import BATCH_LOCK
+from rest_api.data_entry.batch_write import BatchWriteStats
+from rest_api.data_entry.batch_write import InsertMissing
+from rest_api.models import NucleotideMutation
+from rest_api.models import Property
+from rest_api.test.mixins import FixtureModelTestCase
+from sonar_backend.settings import IMPORT_DEADLOCK_RETRIES
+
+
+def deadlock() -> OperationalError:
+    cause = Exception("deadlock detected")
+    cause.pgcode = "40P01"
+    error = OperationalError("deadlock detected")
+    error.__cause__ = cause
+    return error
+
+
+class FailingWrite:
+    """A write that fails with the given errors before it succeeds."""
+
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.calls = 0
+        # the step name
+        self.__name__ = "write"
+
+    def __call__(self, rows):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return rows
+
+
+class BatchWriteStatsRunTests(SimpleTestCase):
+    def test_retries_deadlocks(self):
+        stats = BatchWriteStats()
+        write = FailingWrite(deadlock(), deadlock())
+        self.assertEqual(stats.run("mutation", write, [1, 2, 3]), [1, 2, 3])
+        self.assertEqual(write.calls, 3)
+        self.assertEqual(stats.deadlock_retries, 2)
+        # rows are counted once, failed attempts write nothing
+        self.assertEqual(stats.as_dict()["steps"]["write"]["rows"], 3)
+
+    def test_gives_up_after_the_configured_retries(self):
+        stats = BatchWriteStats()
+        write = FailingWrite(*(deadlock() for _ in range(IMPORT_DEADLOCK_RETRIES + 1)))
+        with self.assertRaises(OperationalError):
+            stats.run("mutation", write, [1])
+        self.assertEqual(write.calls, IMPORT_DEADLOCK_RETRIES + 1)
+
+    def test_other_errors_are_not_retried(self):
+        stats = BatchWriteStats()
+        write = FailingWrite(OperationalError("connection lost"))
+        with self.assertRaises(OperationalError):
+            stats.run("mutation", write, [1])
+        self.assertEqual(write.calls, 1)
+        self.assertEqual(stats.deadlock_retries, 0)
+
+
+class BatchWriteStatsAtomicTests(TestCase):
+    def test_statements_in_a_transaction_are_not_retried(self):
+        # the deadlock aborted the whole transaction, a retry would fail
+        stats = BatchWriteStats()
+        write = FailingWrite(deadlock())
+        with self.assertRaises(OperationalError):
+            stats.run("mutation", write, [1])
+        self.assertEqual(write.calls, 1)
+
+
+class FakeLocks:
+    """`cache.lock()` that records when the named locks are held."""
+
+    def __init__(self, events: list):
+        self.events = events
+
+    @contextmanager
+    def lock(self, name: str):
+        self.events.append(f"lock {name}")
+        try:
+            yield
+        finally:
+            self.events.append(f"unlock {name}")
+
+
+class BatchWriteStatsTransactionTests(TransactionTestCase):
+    def test_retries_the_whole_transaction(self):
+        stats = BatchWriteStats()
+        attempts = []
+
+        def write_batch():
+            attempts.append(
+                Property.objects.create(
+                    name=f"p{len(attempts)}", datatype="value_varchar"
+                )
+            )
+            if len(attempts) == 1:
+                raise deadlock()
+
+        stats.run_transaction(write_batch)
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(stats.deadlock_retries, 1)
+        # the first attempt was rolled back
+        self.assertEqual(list(Property.objects.values_list("name", flat=True)), ["p1"])
+
+    def test_global_lock_is_held_until_the_commit(self):
+        stats = BatchWriteStats()
+        events = []
+
+        def write_batch():
+            stats.run(
+                "property",
+                Property.objects.create,
+                name="locked",
+                datatype="value_varchar",
+            )
+            transaction.on_commit(lambda: events.append("commit"))
+
+        with mock.patch(
+            "rest_api.data_entry.batch_write.IMPORT_GLOBAL_LOCKS", True
+        ), mock.patch("rest_api.data_entry.batch_write.cache", FakeLocks(events)):
+            stats.run_transaction(write_batch)
+            # a standalone write holds its own lock
+            stats.run("property", lambda: events.append("write"))
+        self.assertEqual(
+            events,
+            [
+                f"lock {BATCH_LOCK}",
+                "commit",
+                f"unlock {BATCH_LOCK}",
+                "lock property",
+                "write",
+                "unlock property",
+            ],
+        )
+
+
+class InsertMissingTests(FixtureModelTestCase):
+    unique_fields = ["ref", "alt", "start", "end", "replicon"]
+
+    def row_version(self, pk: int) -> str:
+        # xmin changes whenever a row is written
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT xmin::text FROM nucleotide_mutation WHERE id = %s", [pk]
+            )
+            return cursor.fetchone()[0]
+
+    def test_inserts_missing_rows_and_keeps_existing_ones(self):
+        existing = NucleotideMutation.objects.get(pk=1)
+        version = self.row_version(existing.pk)
+        objs = [
+            NucleotideMutation(
+                ref=existing.ref,
+                alt=existing.alt,
+                start=existing.start,
+                end=existing.end,
+                replicon_id=existing.replicon_id,
+            ),
+            NucleotideMutation(ref="A", alt="G", start=5, end=6, replicon_id=1),
+        ]
+        count = NucleotideMutation.objects.count()
+        self.assertIs(
+            InsertMissing(NucleotideMutation).bulk_create(objs, self.unique_fields),
+            objs,
+        )
+        self.assertEqual(objs[0].pk, existing.pk)
+        self.assertEqual(
+            NucleotideMutation.objects.get(pk=objs[1].pk).start, objs[1].start
+        )
+        self.assertEqual(NucleotideMutation.objects.count(), count + 1)
+        self.assertEqual(self.row_version(existing.pk), version)
+
+    def test_missing_row_after_conflict(self):
+        # conflicts on the unique key, but is looked up with a different one
+        existing = NucleotideMutation.objects.get(pk=1)
+        obj = NucleotideMutation(
+            ref=existing.ref,
+            alt=existing.alt,
+            start=existing.start,
+            end=existing.end,
+            replicon_id=existing.replicon_id,
+            is_frameshift=not existing.is_frameshift,
+        )
+        with self.assertRaises(NucleotideMutation.DoesNotExist):
+            InsertMissing(NucleotideMutation).bulk_create(
+                [obj], self.unique_fields + ["is_frameshift"]
+            )
+
+    def test_empty(self):
+        self.assertEqual(
+            InsertMissing(NucleotideMutation).bulk_create([], self.unique_fields), []
+        )
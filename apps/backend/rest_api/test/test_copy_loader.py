@@ -0,0 +1,154 @@
+from unittest import mock
+
+from rest_api.data_entry.sample_entry_job import process_batch_run
+from rest_api.models import Alignment
+from rest_api.models import CDS
+from rest_api.models import Replicon
+from rest_api.models import Sequence
+from rest_api.test.mixins import FixtureModelTestCase
+from rest_api.test.mixins import SampleArchiveMixin
+
+
+def profile(alignment: Alignment) -> tuple[set, set, set]:
+    """
+    Mutations and mutation parents (within the alignment) of an alignment, by
+    value instead of ID.
+    """
+    nt = {
+        (m.ref, m.alt, m.start, m.end, m.replicon.accession, m.is_frameshift)
+        for m in alignment.nucleotide_mutations.select_related("replicon")
+    }
+    aa = set()
+    parents = set()
+    for m in alignment.amino_acid_mutations.select_related("cds").prefetch_related(
+        "parent__replicon"
+    ):
+        key = (m.cds.accession, m.ref, m.alt, m.start, m.end)
+        aa.add(key)
+        for parent in m.parent.all():
+            parent_key = (
+                parent.ref,
+                parent.alt,
+                parent.start,
+                parent.end,
+                parent.replicon.accession,
+                parent.is_frameshift,
+            )
+            if parent_key in nt:
+                parents.add((key, parent_key))
+    return nt, aa, parents
+
+
+class CopyLoaderTests(FixtureModelTestCase, SampleArchiveMixin):
+    def setUp(self):
+        # every fixture alignment, plus mutations that are not in the database
+        self.samples = []
+        for alignment in Alignment.objects.select_related("sequence").order_by("id"):
+            variants = self.alignment_variants(alignment)
+            novel_id = len(variants) + 1
+            variants.append(
+                {
+                    "id": novel_id,
+                    "ref": "G",
+                    "start": 29800 + alignment.id,
+                    "end": 29801 + alignment.id,
+                    "alt": "C",
+                    "reference_acc": "MN908947.3",
+                    "type": "nt",
+                    "frameshift": 0,
+                    "parent_id": "",
+                }
+            )
+            variants.append(
+                {
+                    "id": novel_id + 1,
+                    "ref": "M",
+                    "start": alignment.id,
+                    "end": alignment.id + 1,
+                    "alt": "K",
+                    "reference_acc": "ORF7b",
+                    "type": "cds",
+                    "frameshift": 0,
+                    "parent_id": str(novel_id),
+                }
+            )
+            self.samples.append(
+                (alignment.sequence.name, alignment.sequence.seqhash, variants)
+            )
+
+    def run_batch(self, loader: str, prefix: str) -> tuple:
+        archive = self.write_sample_archive(
+            [
+                (prefix + name, seqhash, variants)
+                for name, seqhash, variants in self.samples
+            ]
+        )
+        with mock.patch(
+            "rest_api.data_entry.sample_entry_job.SAMPLE_IMPORT_LOADER", loader
+        ), mock.patch(
+            "rest_api.data_entry.sample_entry_job.IMPORT_REUSE_ALIGNMENTS", False
+        ):
+            return process_batch_run((0, len(self.samples)), archive)
+
+    def import_samples(self, loader: str, prefix: str):
+        success, error, *_ = self.run_batch(loader, prefix)
+        self.assertTrue(success, error)
+
+    def assert_same_rows(self, first: str, second: str):
+        for name, _, variants in self.samples:
+            first_profile = profile(Alignment.objects.get(sequence__name=first + name))
+            second_profile = profile(
+                Alignment.objects.get(sequence__name=second + name)
+            )
+            self.assertEqual(first_profile, second_profile, name)
+            nt, aa, parents = first_profile
+            # at least the parent of the novel amino acid mutation
+            self.assertTrue(parents)
+            # N/X variants are skipped without include_nx
+            self.assertEqual(
+                len(nt) + len(aa),
+                len(
+                    [
+                        row
+                        for row in variants
+                        if ("N" if row["type"] == "nt" else "X") not in row["alt"]
+                    ]
+                ),
+            )
+
+    def test_copy_matches_orm_on_new_mutations(self):
+        # the ORM import inserts the novel mutations, COPY links them
+        self.import_samples("orm", "orm-")
+        self.import_samples("copy", "copy-")
+        self.assert_same_rows("orm-", "copy-")
+
+    def test_orm_matches_copy_on_new_mutations(self):
+        self.import_samples("copy", "copy-")
+        self.import_samples("orm", "orm-")
+        self.assert_same_rows("copy-", "orm-")
+
+    def test_matches_fixture_alignments(self):
+        self.import_samples("copy", "copy-")
+        for alignment in Alignment.objects.filter(id__lte=10):
+            nt, aa, parents = profile(alignment)
+            copy_nt, copy_aa, copy_parents = profile(
+                Alignment.objects.get(sequence__name="copy-" + alignment.sequence.name)
+            )
+            self.assertLessEqual(nt, copy_nt)
+            self.assertLessEqual(aa, copy_aa)
+            self.assertLessEqual(parents, copy_parents)
+
+    def test_unknown_accessions(self):
+        for model, accession in [(Replicon, "MN908947.3"), (CDS, "ORF7b")]:
+            with self.subTest(model=model.__name__):
+                model.objects.filter(accession=accession).update(accession="renamed")
+                success, error, *_ = self.run_batch("copy", "copy-")
+                model.objects.filter(accession="renamed").update(accession=accession)
+                self.assertFalse(success)
+                self.assertIn(
+                    f"{model.__name__} accessions not found: {accession}", error
+                )
+                # nothing of the batch was written
+                self.assertFalse(
+                    Sequence.objects.filter(name__startswith="copy-").exists()
+                )
@@ -0,0 +1,156 @@
+import copy
+import pathlib
+import shutil
+import tempfile
+from unittest import mock
+
+from Bio import SeqIO
+from Bio.SeqFeature import FeatureLocation
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from rest_api.data_entry.gbk_import import import_gbk_file
+from rest_api.data_entry.gbk_import import ReferenceFeatures
+from rest_api.models import CDS
+from rest_api.models import CDSSegment
+from rest_api.models import Gene
+from rest_api.models import GeneSegment
+from rest_api.models import Peptide
+from rest_api.models import PeptideSegment
+from rest_api.models import Replicon
+from rest_api.test.mixins import FixtureModelTestCase
+
+GBK_PATH = (
+    pathlib.Path(__file__).parents[4].joinpath("test-data", "HIV", "NC_001802.1.gb")
+)
+
+
+class GbkImportTests(FixtureModelTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        patcher = mock.patch(
+            "rest_api.data_entry.gbk_import.SONAR_DATA_ENTRY_FOLDER", directory
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.record = SeqIO.read(GBK_PATH, "genbank")
+
+    def import_file(self):
+        uploaded_file = SimpleUploadedFile(GBK_PATH.name, GBK_PATH.read_bytes())
+        import_gbk_file([uploaded_file], 1)
+        return Replicon.objects.get(accession="NC_001802.1")
+
+    def rows(self, replicon: Replicon) -> dict[str, list]:
+        cds = CDS.objects.filter(gene__replicon=replicon).order_by("pk")
+        peptides = Peptide.objects.filter(cds__in=cds).order_by("pk")
+        return {
+            "genes": list(
+                Gene.objects.filter(replicon=replicon)
+                .order_by("pk")
+                .values_list("pk", "accession", "symbol", "start", "end")
+            ),
+            "gene_segments": list(
+                GeneSegment.objects.filter(gene__replicon=replicon)
+                .order_by("pk")
+                .values_list("pk", "gene__accession", "order", "start", "end")
+            ),
+            "cds": list(cds.values_list("pk", "accession", "gene__accession")),
+            "cds_segments": list(
+                CDSSegment.objects.filter(cds__in=cds)
+                .order_by("pk")
+                .values_list("pk", "cds__accession", "order", "start", "end")
+            ),
+            "peptides": list(peptides.values_list("pk", "cds__accession", "type")),
+            "peptide_segments": list(
+                PeptideSegment.objects.filter(peptide__in=peptides)
+                .order_by("pk")
+                .values_list(
+                    "pk", "peptide__description", "order", "start_cds", "end_cds"
+                )
+            ),
+        }
+
+    def feature(self, feature_type: str, **qualifiers):
+        return next(
+            feature
+            for feature in self.record.features
+            if feature.type == feature_type
+            and all(feature.qualifiers.get(k) == [v] for k, v in qualifiers.items())
+        )
+
+    def test_import(self):
+        replicon = self.import_file()
+        self.assertEqual(replicon.reference.accession, "NC_001802.1")
+        gag_pol = Gene.objects.get(replicon=replicon, accession="HIV1gp1")
+        self.assertEqual(gag_pol.symbol, "gag-pol")
+        self.assertEqual((gag_pol.start, gag_pol.end), (335, 4642))
+        # the ribosomal slippage of gag-pol
+        self.assertEqual(
+            self.segments(CDSSegment, cds__gene=gag_pol),
+            [(1, 335, 1637), (2, 1636, 4642)],
+        )
+        self.assertEqual(
+            Peptide.objects.filter(cds__gene__replicon=replicon).count(), 15
+        )
+        transframe = Peptide.objects.get(
+            cds__gene=gag_pol, description="Gag-Pol Transframe peptide"
+        )
+        self.assertEqual(transframe.type, "mat_peptide")
+        self.assertEqual(
+            self.segments(PeptideSegment, peptide=transframe),
+            [(1, 1631, 1637), (2, 1636, 1798)],
+        )
+        matrix = PeptideSegment.objects.get(
+            peptide__cds__gene__accession="HIV1gp2", peptide__description="matrix"
+        )
+        self.assertEqual((matrix.start_cds, matrix.end_cds), (1, 133))
+
+    def test_import_twice(self):
+        replicon = self.import_file()
+        rows = self.rows(replicon)
+        self.assertEqual(self.import_file(), replicon)
+        self.assertEqual(self.rows(replicon), rows)
+
+    def segments(self, model, **filters) -> list[tuple[int, int, int]]:
+        return list(
+            model.objects.filter(**filters)
+            .order_by("order")
+            .values_list("order", "start", "end")
+        )
+
+    def test_stale_segments_are_deleted(self):
+        replicon = self.import_file()
+        # the artificial frameshift of vpr is dropped, the transframe peptide
+        # is joined and the tat gene gets the two parts of its CDS
+        self.feature("CDS", gene="vpr").location = FeatureLocation(5104, 5395, 1)
+        self.feature("mat_peptide", product="Gag-Pol Transframe peptide").location = (
+            FeatureLocation(1631, 1798, 1)
+        )
+        self.feature("gene", gene="tat").location = self.feature(
+            "CDS", gene="tat"
+        ).location
+        ReferenceFeatures(self.record).save(replicon)
+        vpr = {"cds__gene__replicon": replicon, "cds__gene__symbol": "vpr"}
+        transframe = {"peptide__description": "Gag-Pol Transframe peptide"}
+        tat = {"gene__replicon": replicon, "gene__symbol": "tat"}
+        self.assertEqual(self.segments(CDSSegment, **vpr), [(1, 5104, 5395)])
+        self.assertEqual(self.segments(PeptideSegment, **transframe), [(1, 1631, 1798)])
+        self.assertEqual(len(self.segments(GeneSegment, **tat)), 2)
+
+        self.import_file()
+        self.assertEqual(len(self.segments(CDSSegment, **vpr)), 2)
+        self.assertEqual(len(self.segments(PeptideSegment, **transframe)), 2)
+        self.assertEqual(self.segments(GeneSegment, **tat), [(1, 5376, 7970)])
+
+    def test_duplicate_peptides(self):
+        p1 = self.feature("mat_peptide", product="p1")
+        # listed twice
+        self.record.features.append(copy.deepcopy(p1))
+        features = ReferenceFeatures(self.record)
+        self.assertEqual(len(features.peptides), 15)
+        # a different peptide with the same product name
+        p1 = copy.deepcopy(p1)
+        p1.location = self.feature("mat_peptide", product="p6").location
+        self.record.features.append(p1)
+        with self.assertRaisesRegex(ValueError, "Duplicate mat_peptide 'p1'"):
+            ReferenceFeatures(self.record)
@@ -0,0 +1,205 @@
+import pathlib
+import shutil
+import tempfile
+from unittest import mock
+
+from rest_api.data_entry.import_checkpoints import clear_checkpoints
+from rest_api.data_entry.import_checkpoints import completed_members
+from rest_api.data_entry.import_checkpoints import missing_ranges
+from rest_api.data_entry.import_checkpoints import record_checkpoint
+from rest_api.data_entry.reference_cache import get_reference_cache
+from rest_api.data_entry.sample_entry_job import process_batch_run
+from rest_api.data_entry.sample_entry_job import process_batch_single_thread
+from rest_api.data_entry.sample_entry_job import retry_failed_job
+from rest_api.data_entry.sample_import import MANIFEST_FILE
+from rest_api.models import Alignment
+from rest_api.models import FileProcessing
+from rest_api.models import ImportBatch
+from rest_api.models import ImportLog
+from rest_api.models import ProcessingJob
+from rest_api.models import Sequence
+from rest_api.test.mixins import FixtureModelTestCase
+from rest_api.test.mixins import SampleArchiveMixin
+
+# a sample archive of the fixture
+FILE_NAME = "2025-11-14_12-27-10.481.73c488.zip"
+
+
+class ImportCheckpointTests(FixtureModelTestCase):
+    def test_missing_ranges(self):
+        self.assertEqual(missing_ranges(FILE_NAME, "samples", 100), [(0, 100)])
+        record_checkpoint(FILE_NAME, "samples", 10, 20)
+        record_checkpoint(FILE_NAME, "samples", 20, 30)
+        record_checkpoint(FILE_NAME, "samples", 50, 60)
+        # recorded twice by a retried batch
+        record_checkpoint(FILE_NAME, "samples", 50, 60)
+        self.assertEqual(
+            missing_ranges(FILE_NAME, "samples", 100),
+            [(0, 10), (30, 50), (60, 100)],
+        )
+        self.assertEqual(missing_ranges(FILE_NAME, "other", 5), [(0, 5)])
+        record_checkpoint(FILE_NAME, "samples", 60, 100)
+        self.assertEqual(missing_ranges(FILE_NAME, "samples", 100), [(0, 10), (30, 50)])
+
+    def test_completed_members(self):
+        record_checkpoint(FILE_NAME, "a.vcf")
+        record_checkpoint(FILE_NAME, "a.vcf")
+        record_checkpoint(FILE_NAME, "samples", 0, 10)
+        self.assertEqual(completed_members(FILE_NAME), {"a.vcf"})
+        # whole members are no row ranges
+        self.assertEqual(missing_ranges(FILE_NAME, "a.vcf", 3), [(0, 3)])
+
+    def test_clear_checkpoints(self):
+        record_checkpoint(FILE_NAME, "a.vcf")
+        record_checkpoint(FILE_NAME, "samples", 0, 10)
+        clear_checkpoints(FILE_NAME)
+        self.assertFalse(ImportBatch.objects.filter(file_id=FILE_NAME).exists())
+
+
+def checkpoint_then_fail(*args):
+    # the checkpoint is written, the batch fails afterwards
+    record_checkpoint(*args)
+    raise RuntimeError("batch interrupted")
+
+
+class BatchCheckpointTests(FixtureModelTestCase, SampleArchiveMixin):
+    loader = "orm"
+
+    def setUp(self):
+        patcher = mock.patch(
+            "rest_api.data_entry.sample_entry_job.SAMPLE_IMPORT_LOADER", self.loader
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        source = Alignment.objects.select_related("sequence").get(pk=1)
+        self.archive = self.write_sample_archive(
+            [
+                ("first", source.sequence.seqhash, self.alignment_variants(source)),
+                ("second", "other", []),
+            ]
+        )
+
+    def run_batches(self):
+        """Import the archive in a celery and a single threaded batch."""
+        success, error, *_ = process_batch_run((0, 1), self.archive, FILE_NAME)
+        self.assertTrue(success, error)
+        process_batch_single_thread(
+            (1, 2), get_reference_cache(), self.archive, FILE_NAME
+        )
+
+    def test_checkpoint_is_written_with_the_batch(self):
+        self.run_batches()
+        self.assertEqual(missing_ranges(FILE_NAME, MANIFEST_FILE, 2), [])
+        self.assertEqual(
+            Sequence.objects.filter(name__in=["first", "second"]).count(), 2
+        )
+
+    def test_checkpoint_is_rolled_back_with_the_batch(self):
+        with mock.patch(
+            "rest_api.data_entry.sample_entry_job.record_checkpoint",
+            checkpoint_then_fail,
+        ):
+            success, error, *_ = process_batch_run((0, 1), self.archive, FILE_NAME)
+            self.assertFalse(success)
+            self.assertIn("batch interrupted", error)
+            with self.assertRaisesRegex(RuntimeError, "batch interrupted"):
+                process_batch_single_thread(
+                    (1, 2), get_reference_cache(), self.archive, FILE_NAME
+                )
+        self.assertFalse(ImportBatch.objects.filter(file_id=FILE_NAME).exists())
+        self.assertFalse(Sequence.objects.filter(name__in=["first", "second"]).exists())
+
+
+class CopyLoaderBatchCheckpointTests(BatchCheckpointTests):
+    loader = "copy"
+
+
+class RetryFailedJobTests(FixtureModelTestCase):
+    def setUp(self):
+        directory = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory)
+        self.entry_dir = directory.joinpath("entry")
+        self.error_dir = directory.joinpath("archive", "error")
+        self.processing_dir = directory.joinpath("processing")
+        for path in [self.entry_dir, self.error_dir, self.processing_dir]:
+            path.mkdir(parents=True)
+        for target, value in [
+            ("SONAR_DATA_ENTRY_FOLDER", str(self.entry_dir)),
+            ("SONAR_DATA_ARCHIVE", str(directory.joinpath("archive"))),
+            ("SONAR_DATA_PROCESSING_FOLDER", str(self.processing_dir)),
+        ]:
+            patcher = mock.patch(
+                f"rest_api.data_entry.sample_entry_job.{target}", value
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.job = ProcessingJob.objects.create(
+            job_name="cli_failed",
+            status=ProcessingJob.ImportType.FAILED,
+            batch_count=5,
+            batches_done=3,
+        )
+        for file_name, success in [
+            ("imported.zip", True),
+            ("failed.zip", False),
+            ("started.zip", None),
+        ]:
+            FileProcessing.objects.create(file_name=file_name, processing_job=self.job)
+            if success is not None:
+                ImportLog.objects.create(
+                    file_id=file_name,
+                    type=ImportLog.ImportType.SAMPLE,
+                    success=success,
+                )
+        self.error_dir.joinpath("failed.zip").touch()
+        self.error_dir.joinpath("failed.pkl").touch()
+        self.processing_dir.joinpath("started.zip").touch()
+
+    def test_queues_the_files_that_were_not_imported(self):
+        files = retry_failed_job("cli_failed")
+        self.assertEqual(sorted(files), ["failed.zip", "started.zip"])
+        self.assertEqual(
+            sorted(path.name for path in self.entry_dir.iterdir()),
+            ["failed.pkl", "failed.zip", "started.zip"],
+        )
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ProcessingJob.ImportType.QUEUED)
+        self.assertIsNotNone(self.job.retried_at)
+        # the unfinished batches are counted again
+        self.assertEqual(self.job.batch_count, 3)
+
+    def test_retry_again(self):
+        retry_failed_job("cli_failed")
+        ProcessingJob.objects.filter(pk=self.job.pk).update(
+            status=ProcessingJob.ImportType.FAILED
+        )
+        # the archives are found in the entry folder
+        self.assertEqual(
+            sorted(retry_failed_job("cli_failed")), ["failed.zip", "started.zip"]
+        )
+
+    def test_only_failed_jobs(self):
+        ProcessingJob.objects.filter(pk=self.job.pk).update(
+            status=ProcessingJob.ImportType.IN_PROGRESS
+        )
+        with self.assertRaises(ValueError):
+            retry_failed_job("cli_failed")
+        # a job stuck in progress
+        self.assertEqual(
+            sorted(retry_failed_job("cli_failed", force=True)),
+            ["failed.zip", "started.zip"],
+        )
+        with self.assertRaises(ValueError):
+            retry_failed_job("cli_failed", force=True)
+        with self.assertRaises(ProcessingJob.DoesNotExist):
+            retry_failed_job("unknown")
+
+    def test_missing_archive(self):
+        self.processing_dir.joinpath("started.zip").unlink()
+        with self.assertRaises(ValueError):
+            retry_failed_job("cli_failed")
+        # nothing was moved
+        self.assertTrue(self.error_dir.joinpath("failed.zip").exists())
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ProcessingJob.ImportType.FAILED)
@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from rest_api.data_entry.job_events import JOB_QUEUED_CHANNEL
+from rest_api.data_entry.job_events import listen_for_queued_jobs
+from rest_api.data_entry.job_events import LISTEN_RETRY_MAX_SECONDS
+
+
+class StopListening(Exception):
+    pass
+
+
+class FakePubSub:
+    """Returns the given messages, raises the exceptions among them."""
+
+    def __init__(self, messages: list):
+        self.messages = list(messages)
+        self.subscribed = []
+        self.closed = False
+
+    def subscribe(self, channel: str):
+        self.subscribed.append(channel)
+
+    def get_message(self, timeout=None):
+        if timeout == 0 or not self.messages:
+            return None
+        message = self.messages.pop(0)
+        if isinstance(message, Exception):
+            raise message
+        return message
+
+    def close(self):
+        self.closed = True
+
+
+class DownPubSub(FakePubSub):
+    """A connection to an unreachable Redis."""
+
+    def __init__(self):
+        super().__init__([])
+
+    def subscribe(self, channel: str):
+        raise RedisConnectionError("Connection refused")
+
+
+class ListenForQueuedJobsTests(SimpleTestCase):
+    def listen(self, *connections: FakePubSub) -> tuple[mock.Mock, mock.Mock]:
+        redis = mock.Mock()
+        redis.pubsub.side_effect = connections
+        callback = mock.Mock()
+        with mock.patch(
+            "rest_api.data_entry.job_events.get_redis_connection", return_value=redis
+        ), mock.patch("rest_api.data_entry.job_events.time.sleep") as sleep:
+            with self.assertRaises(StopListening):
+                listen_for_queued_jobs(callback)
+        return callback, sleep
+
+    def test_reconnects_after_a_dropped_connection(self):
+        queued = {"data": b"cli_job"}
+        first = FakePubSub([queued, RedisConnectionError("reset")])
+        second = FakePubSub([queued, StopListening()])
+        callback, sleep = self.listen(first, second)
+        # at start, for the first message, after the reconnect and the second
+        self.assertEqual(callback.call_count, 4)
+        self.assertEqual(second.subscribed, [JOB_QUEUED_CHANNEL])
+        self.assertTrue(first.closed)
+        self.assertTrue(second.closed)
+        sleep.assert_called_once_with(1)
+
+    def test_backs_off_while_redis_is_down(self):
+        connections = [DownPubSub() for _ in range(8)]
+        connections.append(FakePubSub([StopListening()]))
+        _, sleep = self.listen(*connections)
+        delays = [call.args[0] for call in sleep.call_args_list]
+        self.assertEqual(delays, [1, 2, 4, 8, 16, 32, 60, 60])
+        self.assertEqual(max(delays), LISTEN_RETRY_MAX_SECONDS)
+
+    def test_backoff_is_reset_after_a_connection(self):
+        connections = [
+            DownPubSub(),
+            DownPubSub(),
+            FakePubSub([{"data": b"cli_job"}, RedisConnectionError("reset")]),
+            FakePubSub([StopListening()]),
+        ]
+        _, sleep = self.listen(*connections)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [1, 2, 1])
@@ -0,0 +1,107 @@
+from django.db import connection
+
+from rest_api.models import Lineage
+from rest_api.models import lineage_closure_rows
+from rest_api.models import LineageClosure
+from rest_api.test.mixins import FixtureModelTestCase
+
+# the sublineage lookup before the closure table: a recursive descent over
+# the name-based parent links, within the reference of the lineage
+RECURSIVE_SUBLINEAGES = """
+WITH RECURSIVE descendants(name) AS (
+    SELECT %(name)s::varchar
+    UNION
+    SELECT c.name
+    FROM lineage c
+    JOIN lineage p ON p.id = c.parent_id
+    JOIN descendants d ON d.name = p.name
+    WHERE c.reference_id = %(reference)s
+)
+SELECT name FROM descendants
+"""
+
+
+def recursive_sublineages(lineage: Lineage) -> set[str]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            RECURSIVE_SUBLINEAGES,
+            {"name": lineage.name, "reference": lineage.reference_id},
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+class LineageClosureTests(FixtureModelTestCase):
+    def assert_matches_recursive_query(self):
+        # compared by name, the sample filter matches the lineage names and
+        # the closure links all rows of a name (e.g. the fixture's two BA.1)
+        for lineage in Lineage.objects.all():
+            expected = recursive_sublineages(lineage)
+            self.assertEqual(
+                {sub.name for sub in lineage.get_sublineages()},
+                expected,
+                lineage.name,
+            )
+            self.assertEqual(
+                {sub.name for sub in Lineage.get_sublineages_from_list([lineage])},
+                expected - {lineage.name},
+                lineage.name,
+            )
+
+    def test_matches_the_recursive_query(self):
+        self.assertTrue(Lineage.objects.filter(parent__isnull=False).exists())
+        self.assert_matches_recursive_query()
+
+    def test_rebuild_reproduces_the_fixture_rows(self):
+        fixture_rows = set(
+            LineageClosure.objects.values_list("ancestor_id", "descendant_id", "depth")
+        )
+        for reference_id in set(Lineage.objects.values_list("reference", flat=True)):
+            Lineage.rebuild_closure(reference_id)
+        self.assertEqual(
+            set(
+                LineageClosure.objects.values_list(
+                    "ancestor_id", "descendant_id", "depth"
+                )
+            ),
+            fixture_rows,
+        )
+
+    def test_recombinant_shares_its_descendants(self):
+        # a recombinant has one row per parent
+        parent = Lineage.objects.filter(parent__isnull=False).first()
+        other = Lineage.objects.exclude(name=parent.name).filter(
+            reference=parent.reference_id
+        )[0]
+        first = Lineage.objects.create(
+            name="XZZ", parent=parent, reference_id=parent.reference_id
+        )
+        second = Lineage.objects.create(
+            name="XZZ", parent=other, reference_id=parent.reference_id
+        )
+        child = Lineage.objects.create(
+            name="XZZ.1", parent=first, reference_id=parent.reference_id
+        )
+        Lineage.rebuild_closure(parent.reference_id)
+
+        self.assertIn(first, parent.get_sublineages())
+        self.assertIn(child, parent.get_sublineages())
+        self.assertIn(child, other.get_sublineages())
+        self.assertEqual(second.get_sublineages(), {second, child})
+        self.assert_matches_recursive_query()
+
+    def test_closure_rows(self):
+        rows = lineage_closure_rows(
+            [(1, "A", None), (2, "A.1", "A"), (3, "A.1.1", "A.1"), (4, "B", None)]
+        )
+        self.assertEqual(
+            sorted(rows),
+            [
+                (1, 1, 0),
+                (1, 2, 1),
+                (1, 3, 2),
+                (2, 2, 0),
+                (2, 3, 1),
+                (3, 3, 0),
+                (4, 4, 0),
+            ],
+        )
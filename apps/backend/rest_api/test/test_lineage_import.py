@@ -0,0 +1,112 @@
+from contextlib import redirect_stdout
+from io import StringIO
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.db import connection
+
+from rest_api.management.commands.import_lineage import LineageImport
+from rest_api.models import Lineage
+from rest_api.models import Reference
+from rest_api.test.mixins import FixtureModelTestCase
+
+LINEAGES = {
+    "B": "B.1,BA.1",
+    "B.1": "B.1.1",
+    "B.1.1": "none",
+    "BA.1": "none",
+}
+
+
+class LineageImportTests(FixtureModelTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.reference = Reference.objects.get(accession="MN908947.3")
+
+    def import_lineages(self, lineages: dict[str, str]) -> dict[str, int]:
+        path = os.path.join(self.directory, "lineages.tsv")
+        with open(path, "w") as handle:
+            handle.write("lineage\tsublineages\n")
+            for lineage, sublineages in lineages.items():
+                handle.write(f"{lineage}\t{sublineages}\n")
+        with LineageImport() as lineage_import:
+            return lineage_import.update_lineage_data(path, self.reference)
+
+    def tree(self) -> dict[str, str | None]:
+        return {
+            lineage.name: lineage.parent.name if lineage.parent else None
+            for lineage in Lineage.objects.filter(reference=self.reference)
+        }
+
+    def pks(self) -> dict[str, int]:
+        return dict(
+            Lineage.objects.filter(reference=self.reference).values_list("name", "pk")
+        )
+
+    def test_import_replaces_the_fixture_tree(self):
+        kept = Lineage.objects.get(name="B", parent=None).pk
+        names = set(Lineage.objects.values_list("name", flat=True))
+        total = Lineage.objects.count()
+        counts = self.import_lineages(LINEAGES)
+        # the deferred foreign keys hold, no kept lineage lost its parent
+        connection.check_constraints()
+        self.assertEqual(
+            self.tree(),
+            {"B": None, "B.1": "B", "B.1.1": "B.1", "BA.1": "B"},
+        )
+        # the duplicate BA.1 rows are merged into one
+        self.assertEqual(counts["created"], len(set(LINEAGES) - names))
+        self.assertEqual(counts["deleted"], total - len(set(LINEAGES) & names))
+        self.assertEqual(self.pks()["B"], kept)
+        self.assertEqual(
+            {
+                lineage.name
+                for lineage in Lineage.objects.get(name="B").get_sublineages()
+            },
+            {"B", "B.1", "B.1.1", "BA.1"},
+        )
+
+    def test_unchanged_import_keeps_the_rows(self):
+        self.import_lineages(LINEAGES)
+        pks = self.pks()
+        counts = self.import_lineages(LINEAGES)
+        self.assertEqual(counts, {"created": 0, "updated": 0, "deleted": 0})
+        self.assertEqual(self.pks(), pks)
+
+    def test_diff(self):
+        self.import_lineages(LINEAGES)
+        pks = self.pks()
+        # B.1.1 moves to BA.1, B.1 is removed and BA.2 added
+        counts = self.import_lineages(
+            {"B": "BA.1,BA.2", "BA.1": "B.1.1", "B.1.1": "none", "BA.2": "none"}
+        )
+        self.assertEqual(counts, {"created": 1, "updated": 1, "deleted": 1})
+        self.assertEqual(
+            self.tree(),
+            {"B": None, "BA.1": "B", "B.1.1": "BA.1", "BA.2": "B"},
+        )
+        # the moved lineage was not deleted with its old parent
+        self.assertEqual(self.pks()["B.1.1"], pks["B.1.1"])
+        self.assertEqual(
+            {
+                lineage.name
+                for lineage in Lineage.objects.get(name="BA.1").get_sublineages()
+            },
+            {"BA.1", "B.1.1"},
+        )
+
+    def test_command(self):
+        path = os.path.join(self.directory, "lineages.tsv")
+        with open(path, "w") as handle:
+            handle.write("lineage\tsublineages\nB\tnone\n")
+        out = StringIO()
+        with redirect_stdout(out):
+            call_command(
+                "import_lineage", "--lineages", path, "--reference", "MN908947.3"
+            )
+        connection.check_constraints()
+        self.assertIn("0 lineages created, 0 updated,", out.getvalue())
+        self.assertEqual(self.tree(), {"B": None})
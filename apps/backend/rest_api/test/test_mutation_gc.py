@@ -0,0 +1,75 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from rest_api.data_entry.mutation_gc import clean_unused_mutations
+from rest_api.data_entry.mutation_gc import delete_unused_mutation_batch
+from rest_api.data_entry.mutation_gc import unused_mutations_report
+from rest_api.models import AminoAcidMutation
+from rest_api.models import AnnotationType
+from rest_api.models import NucleotideMutation
+from rest_api.test.mixins import FixtureModelTestCase
+
+
+class MutationGCTests(FixtureModelTestCase):
+    def setUp(self):
+        self.referenced = {
+            "nt": set(
+                NucleotideMutation.objects.exclude(alignments=None).values_list(
+                    "id", flat=True
+                )
+            ),
+            "aa": set(
+                AminoAcidMutation.objects.exclude(alignments=None).values_list(
+                    "id", flat=True
+                )
+            ),
+        }
+        self.annotation_links = AnnotationType.mutations.through.objects.count()
+        # an unreferenced amino acid mutation and its unreferenced parent,
+        # annotated like an imported mutation
+        self.nt = NucleotideMutation.objects.create(
+            ref="A", alt="G", start=5, end=6, replicon_id=1
+        )
+        self.aa = AminoAcidMutation.objects.create(
+            ref="M", alt="K", start=0, end=1, cds_id=1
+        )
+        self.aa.parent.add(self.nt)
+        AnnotationType.objects.get(pk=1).mutations.add(self.nt)
+
+    def test_report(self):
+        report = unused_mutations_report()
+        self.assertEqual(report["nt"]["mutations"], 1)
+        self.assertEqual(report["nt"]["annotation_links"], 1)
+        self.assertEqual(report["nt"]["parent_links"], 1)
+        self.assertEqual(report["aa"], {"mutations": 1, "parent_links": 1})
+        # nothing was deleted
+        self.assertTrue(NucleotideMutation.objects.filter(pk=self.nt.pk).exists())
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command("clean_mutations", "--dry-run", stdout=out)
+        self.assertIn("aa mutations: 1, parent_links: 1", out.getvalue())
+        self.assertTrue(AminoAcidMutation.objects.filter(pk=self.aa.pk).exists())
+
+    def test_deletes_only_unreferenced_mutations(self):
+        self.assertEqual(clean_unused_mutations(batch_size=1), {"aa": 1, "nt": 1})
+        self.assertEqual(
+            set(NucleotideMutation.objects.values_list("id", flat=True)),
+            self.referenced["nt"],
+        )
+        self.assertEqual(
+            set(AminoAcidMutation.objects.values_list("id", flat=True)),
+            self.referenced["aa"],
+        )
+        # the annotations of referenced mutations are kept
+        self.assertEqual(
+            AnnotationType.mutations.through.objects.count(), self.annotation_links
+        )
+        self.assertEqual(unused_mutations_report()["nt"]["mutations"], 0)
+
+    def test_batch_starts_after_id(self):
+        self.assertEqual(delete_unused_mutation_batch("nt", self.nt.id, 10), [])
+        self.assertEqual(
+            delete_unused_mutation_batch("nt", self.nt.id - 1, 10), [self.nt.id]
+        )
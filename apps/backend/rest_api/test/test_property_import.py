@@ -0,0 +1,50 @@
+from rest_api.data_entry.sample_entry_job import _resolve_property_ids
+from rest_api.data_entry.sample_entry_job import _sync_sample_sequences
+from rest_api.models import Property
+from rest_api.models import Sample
+from rest_api.test.mixins import FixtureModelTestCase
+from rest_api.utils import PropertyColumnMapping
+
+
+class SyncSampleSequencesTests(FixtureModelTestCase):
+    def sequence_ids(self, sample_id: int) -> set[int]:
+        return set(
+            Sample.objects.get(pk=sample_id).sequences.values_list("id", flat=True)
+        )
+
+    def test_replaces_the_sequences_of_the_given_samples(self):
+        # sample 1 has sequence 10, sample 2 has sequence 6
+        _sync_sample_sequences([1, 2], {(1, 3), (1, 4), (2, 6)})
+        self.assertEqual(self.sequence_ids(1), {3, 4})
+        self.assertEqual(self.sequence_ids(2), {6})
+        # other samples are left alone
+        self.assertEqual(self.sequence_ids(3), {4})
+
+    def test_samples_without_links_lose_their_sequences(self):
+        _sync_sample_sequences([1], set())
+        self.assertEqual(self.sequence_ids(1), set())
+
+
+class ResolvePropertyIdsTests(FixtureModelTestCase):
+    column_mapping = {
+        "lineage": PropertyColumnMapping("lineage", "value_varchar", None),
+        "reason": PropertyColumnMapping("sequencing_reason", "value_varchar", None),
+        "ct": PropertyColumnMapping("ct_value", "value_float", None),
+    }
+
+    def test_custom_properties_only(self):
+        property_ids = _resolve_property_ids(
+            ["lineage", "reason", "ct", "other"], self.column_mapping
+        )
+        # lineage is a Sample field, "other" is not mapped
+        self.assertEqual(set(property_ids), {"sequencing_reason", "ct_value"})
+        self.assertEqual(property_ids["sequencing_reason"], 1)
+        self.assertEqual(
+            Property.objects.get(name="ct_value").id, property_ids["ct_value"]
+        )
+
+    def test_existing_properties_are_reused(self):
+        first = _resolve_property_ids(["ct"], self.column_mapping)
+        count = Property.objects.count()
+        self.assertEqual(_resolve_property_ids(["ct"], self.column_mapping), first)
+        self.assertEqual(Property.objects.count(), count)
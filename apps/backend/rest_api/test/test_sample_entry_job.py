@@ -0,0 +1,172 @@
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+import pathlib
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.db import connection
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from rest_api.data_entry.sample_entry_job import _claim_next_job
+from rest_api.data_entry.sample_entry_job import _finish_import
+from rest_api.data_entry.sample_entry_job import check_for_new_data
+from rest_api.models import FileProcessing
+from rest_api.models import ImportLog
+from rest_api.models import ProcessingJob
+from rest_api.test.mixins import FixtureModelTestCase
+
+
+class FinishImportTests(FixtureModelTestCase):
+    files = ["first.zip", "second.zip"]
+
+    def setUp(self):
+        self.directory = pathlib.Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+        patcher = mock.patch(
+            "rest_api.data_entry.sample_entry_job.SONAR_DATA_ARCHIVE",
+            str(self.directory.joinpath("archive")),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.job = ProcessingJob.objects.create(
+            job_name="cli_two_files", status=ProcessingJob.ImportType.IN_PROGRESS
+        )
+        for file_name in self.files:
+            FileProcessing.objects.create(file_name=file_name, processing_job=self.job)
+
+    def finish(self, file_name: str, error: Exception = None):
+        archive_path = self.directory.joinpath(file_name)
+        archive_path.touch()
+        _finish_import(
+            {
+                "file_name": file_name,
+                "job_name": self.job.job_name,
+                "archive_path": str(archive_path),
+                "pkl_path": None,
+                "import_type": ImportLog.ImportType.SAMPLE,
+            },
+            error,
+        )
+
+    def status(self) -> str:
+        return ProcessingJob.objects.get(pk=self.job.pk).status
+
+    def test_files_finish_in_either_order(self):
+        for order in [self.files, self.files[::-1]]:
+            with self.subTest(order=order):
+                ImportLog.objects.filter(file__processing_job=self.job).delete()
+                ProcessingJob.objects.filter(pk=self.job.pk).update(
+                    status=ProcessingJob.ImportType.IN_PROGRESS
+                )
+                self.finish(order[0])
+                self.assertEqual(self.status(), ProcessingJob.ImportType.IN_PROGRESS)
+                self.finish(order[1])
+                self.assertEqual(self.status(), ProcessingJob.ImportType.COMPLETED)
+
+    def test_failed_file_fails_the_job(self):
+        self.finish("first.zip", ValueError("broken"))
+        self.assertEqual(self.status(), ProcessingJob.ImportType.IN_PROGRESS)
+        self.finish("second.zip")
+        self.assertEqual(self.status(), ProcessingJob.ImportType.FAILED)
+
+    def test_stale_file_states_do_not_reset_a_finished_job(self):
+        # the other file completed the job after this one read the file states
+        ProcessingJob.objects.filter(pk=self.job.pk).update(
+            status=ProcessingJob.ImportType.COMPLETED
+        )
+        stale = {"first.zip": True, "second.zip": None}
+        with mock.patch(
+            "rest_api.data_entry.sample_entry_job._file_states", return_value=stale
+        ):
+            self.finish("first.zip")
+        self.assertEqual(self.status(), ProcessingJob.ImportType.COMPLETED)
+
+
+def queue_jobs(*jobs: tuple[str, int]) -> list[ProcessingJob]:
+    """Queue jobs with the given name and priority, in upload order."""
+    uploaded = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    queued = []
+    for number, (job_name, priority) in enumerate(jobs):
+        job = ProcessingJob.objects.create(job_name=job_name, priority=priority)
+        # entry_time is set on save
+        ProcessingJob.objects.filter(pk=job.pk).update(
+            entry_time=uploaded + timedelta(minutes=number)
+        )
+        queued.append(job)
+    return queued
+
+
+class ClaimNextJobTests(FixtureModelTestCase):
+    def test_priority_jobs_are_claimed_first(self):
+        queue_jobs(
+            ("cli_first", ProcessingJob.Priority.NORMAL),
+            ("cli_prop_second", ProcessingJob.Priority.HIGH),
+            ("cli_third", ProcessingJob.Priority.NORMAL),
+            ("cli_prop_fourth", ProcessingJob.Priority.HIGH),
+        )
+        claimed = []
+        with mock.patch(
+            "rest_api.data_entry.sample_entry_job._run_job",
+            side_effect=lambda job: claimed.append(job.job_name),
+        ):
+            check_for_new_data()
+        self.assertEqual(
+            claimed, ["cli_prop_second", "cli_prop_fourth", "cli_first", "cli_third"]
+        )
+        self.assertFalse(
+            ProcessingJob.objects.filter(
+                status=ProcessingJob.ImportType.QUEUED
+            ).exists()
+        )
+        self.assertIsNone(_claim_next_job())
+
+    def test_crashed_job_does_not_stop_the_queue(self):
+        queue_jobs(
+            ("cli_first", ProcessingJob.Priority.NORMAL),
+            ("cli_second", ProcessingJob.Priority.NORMAL),
+        )
+        with mock.patch(
+            "rest_api.data_entry.sample_entry_job._run_job",
+            side_effect=[RuntimeError("bug"), None],
+        ) as run_job:
+            check_for_new_data()
+        self.assertEqual(run_job.call_count, 2)
+
+
+class ClaimLockedJobTests(TransactionTestCase):
+    def test_locked_job_is_skipped(self):
+        locked, free = queue_jobs(
+            ("cli_locked", ProcessingJob.Priority.HIGH),
+            ("cli_free", ProcessingJob.Priority.NORMAL),
+        )
+        is_locked = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            # another caller in the middle of claiming the job
+            try:
+                with transaction.atomic():
+                    ProcessingJob.objects.select_for_update().get(pk=locked.pk)
+                    is_locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            self.assertTrue(is_locked.wait(10))
+            self.assertEqual(_claim_next_job(), free)
+            self.assertIsNone(_claim_next_job())
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(_claim_next_job(), locked)
+        self.assertEqual(
+            ProcessingJob.objects.get(pk=locked.pk).status,
+            ProcessingJob.ImportType.IN_PROGRESS,
+        )
@@ -0,0 +1,76 @@
+from django.test import SimpleTestCase
+
+from rest_api.data_entry.sample_import import count_manifest_variants
+from rest_api.data_entry.sample_import import read_manifest
+from rest_api.data_entry.sample_import import read_variants
+from rest_api.test.mixins import SampleArchiveMixin
+
+
+def variants(count: int) -> list[dict]:
+    return [
+        {
+            "id": i + 1,
+            "ref": "C",
+            "start": 100 + i,
+            "end": 101 + i,
+            "alt": "T",
+            "reference_acc": "MN908947.3",
+            "type": "nt",
+            "frameshift": 0,
+            "parent_id": "",
+        }
+        for i in range(count)
+    ]
+
+
+class SampleArchiveReadTests(SimpleTestCase, SampleArchiveMixin):
+    def setUp(self):
+        # the last two samples share a sequence, so they share a var file
+        self.samples = [(f"sample{i}", f"hash{i}", variants(i % 5)) for i in range(23)]
+        self.samples.append(("sample23", "hash22", variants(22 % 5)))
+
+    def read_batch(self, archive: str, start: int, stop: int) -> dict:
+        sample_raws = read_manifest(archive, start, stop)
+        var_tables = read_variants(
+            archive,
+            {f"{sample_raw.seqhash}.parquet" for sample_raw in sample_raws},
+            {sample_raw.var_index for sample_raw in sample_raws},
+        )
+        return {
+            sample_raw.name: var_tables[f"{sample_raw.seqhash}.parquet"][
+                "start"
+            ].to_pylist()
+            for sample_raw in sample_raws
+        }
+
+    def expected(self, start: int, stop: int) -> dict:
+        return {
+            name: [row["start"] for row in rows]
+            for name, _, rows in self.samples[start:stop]
+        }
+
+    def test_reads_batches_across_row_groups(self):
+        archive = self.write_sample_archive(self.samples, row_group_size=4)
+        for start, stop in [(0, 1), (0, 4), (3, 9), (21, 24), (0, 24)]:
+            self.assertEqual(
+                self.read_batch(archive, start, stop), self.expected(start, stop)
+            )
+
+    def test_reads_archives_without_var_index(self):
+        archive = self.write_sample_archive(
+            self.samples, row_group_size=4, var_index=False
+        )
+        sample_raws = read_manifest(archive, 5, 11)
+        self.assertEqual(
+            [sample_raw.name for sample_raw in sample_raws],
+            [f"sample{i}" for i in range(5, 11)],
+        )
+        self.assertTrue(all(sample_raw.var_index is None for sample_raw in sample_raws))
+        self.assertEqual(self.read_batch(archive, 5, 11), self.expected(5, 11))
+
+    def test_count_manifest_variants(self):
+        archive = self.write_sample_archive(self.samples, row_group_size=4)
+        self.assertEqual(
+            count_manifest_variants(archive),
+            [len(rows) for _, _, rows in self.samples],
+        )
@@ -0,0 +1,104 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+
+from rest_api.data_entry import sequence_job
+from rest_api.data_entry.sequence_job import _chunk_key
+from rest_api.data_entry.sequence_job import clean_unused_sequences
+from rest_api.data_entry.sequence_job import delete_sequence_chunk
+from rest_api.data_entry.sequence_job import delete_sequence_ids
+from rest_api.data_entry.sequence_job import delete_sequences_task
+from rest_api.models import Alignment
+from rest_api.models import NucleotideMutation
+from rest_api.models import ProcessingJob
+from rest_api.models import Sample
+from rest_api.models import Sequence
+from rest_api.test.mixins import FixtureModelTestCase
+
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class SequenceDeleteTests(FixtureModelTestCase):
+    def sequence_ids(self) -> set[int]:
+        return set(Sequence.objects.values_list("id", flat=True))
+
+    def unlink(self, sequence_ids: list[int]):
+        Sample.sequences.through.objects.filter(sequence_id__in=sequence_ids).delete()
+
+    def test_chunk_deletes_alignments_and_mutation_links(self):
+        alignment_ids = list(
+            Alignment.objects.filter(sequence_id__in=[1, 2]).values_list(
+                "id", flat=True
+            )
+        )
+        self.assertEqual(delete_sequence_chunk([1, 2], orphans_only=False), 2)
+        self.assertEqual(self.sequence_ids(), set(range(3, 11)))
+        self.assertFalse(Alignment.objects.filter(id__in=alignment_ids).exists())
+        self.assertFalse(
+            NucleotideMutation.alignments.through.objects.filter(
+                alignment_id__in=alignment_ids
+            ).exists()
+        )
+        # the samples are kept
+        self.assertEqual(Sample.objects.count(), 10)
+
+    def test_orphans_only_keeps_sequences_of_samples(self):
+        self.unlink([1])
+        self.assertEqual(delete_sequence_chunk([1, 2], orphans_only=True), 1)
+        self.assertEqual(self.sequence_ids(), set(range(2, 11)))
+        self.assertEqual(delete_sequence_chunk([2], orphans_only=True), 0)
+
+    def test_clean_unused_sequences(self):
+        self.unlink([3, 4])
+        with mock.patch("rest_api.data_entry.sequence_job.DELETE_CHUNK_SIZE", 1):
+            # without Redis, all chunks are deleted right away
+            result = clean_unused_sequences()
+        self.assertEqual(result, {"deleted_sequences_count": 2, "job_id": None})
+        self.assertEqual(self.sequence_ids(), set(range(1, 11)) - {3, 4})
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class SequenceDeleteJobTests(FixtureModelTestCase):
+    def setUp(self):
+        cache.clear()
+        task = sequence_job.delete_sequences_task
+        for target, value in [
+            ("REDIS_URL", "redis://localhost:6379/"),
+            ("DELETE_CHUNK_SIZE", 2),
+        ]:
+            patcher = mock.patch(f"rest_api.data_entry.sequence_job.{target}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # run the chained tasks right away
+        patcher = mock.patch.object(sequence_job, "delete_sequences_task", wraps=task)
+        self.task = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.task.delay.side_effect = task
+
+    def test_deletes_in_chained_tasks(self):
+        Sample.sequences.through.objects.filter(sequence_id__lte=5).delete()
+        result = delete_sequence_ids(list(range(1, 7)), orphans_only=True)
+        self.assertIsNone(result["deleted_sequences_count"])
+
+        job = ProcessingJob.objects.get(job_name=result["job_id"])
+        self.assertEqual(job.status, ProcessingJob.ImportType.COMPLETED)
+        self.assertEqual(job.progress, 1)
+        self.assertEqual(self.task.delay.call_count, 3)
+        # sequence 6 is linked to sample 2
+        self.assertEqual(
+            set(Sequence.objects.values_list("id", flat=True)), set(range(6, 11))
+        )
+        self.assertIsNone(cache.get(_chunk_key(job.job_name, 0)))
+
+    def test_missing_chunk_fails_the_job(self):
+        ProcessingJob.objects.create(
+            job_name="delete_missing", status=ProcessingJob.ImportType.IN_PROGRESS
+        )
+        with self.assertRaises(ValueError):
+            delete_sequences_task("delete_missing", 2, False, 1)
+        self.assertEqual(
+            ProcessingJob.objects.get(job_name="delete_missing").status,
+            ProcessingJob.ImportType.FAILED,
+        )
+        self.assertEqual(Sequence.objects.count(), 10)
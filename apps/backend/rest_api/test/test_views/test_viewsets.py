@@ -1,4 +1,5 @@
 import json
+from unittest import mock
 
 from parameterized import parameterized
 from rest_framework import status
@@ -6,6 +7,7 @@ from rest_framework.test import force_authenticate
 
 from rest_api import models
 from rest_api import viewsets
+from rest_api.data_entry.import_metrics import ImportMetrics
 from rest_api.test import mixins
 from rest_api.viewsets_sample import SampleViewSet
 
@@ -142,3 +144,120 @@ class SampleViewSetTest(
         response = view(request)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["count"], expected_count)
+
+
+class TasksViewTest(mixins.FixtureAPITestCase):
+    viewset = viewsets.TasksView
+
+    def get_response(self, action: str, data: dict, method: str = "get"):
+        view = self.viewset.as_view({method: action})
+        request = getattr(self.factory, method)(f"/api/tasks/{action}/", data=data)
+        force_authenticate(request, user=self.get_request_user())
+        return view(request)
+
+    def test_wait_for_job(self):
+        completed = models.ProcessingJob.objects.get(pk=1).job_name
+        response = self.get_response("wait_for_job", {"job_id": completed})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            {"jobID": completed, "status": models.ProcessingJob.ImportType.COMPLETED},
+        )
+        # without Redis, a running job is polled until the timeout
+        models.ProcessingJob.objects.create(
+            job_name="cli_running",
+            status=models.ProcessingJob.ImportType.IN_PROGRESS,
+        )
+        response = self.get_response(
+            "wait_for_job", {"job_id": "cli_running", "timeout": 0}
+        )
+        self.assertEqual(
+            response.data["status"], models.ProcessingJob.ImportType.IN_PROGRESS
+        )
+
+    def test_wait_for_job_timeout_is_capped(self):
+        with mock.patch(
+            "rest_api.viewsets.wait_for_job_status", return_value="C"
+        ) as wait:
+            self.get_response("wait_for_job", {"job_id": "cli_job", "timeout": 600})
+        wait.assert_called_once_with("cli_job", 60)
+
+    def test_wait_for_job_errors(self):
+        for data in [{}, {"job_id": "unknown"}, {"job_id": "cli_job", "timeout": "x"}]:
+            response = self.get_response("wait_for_job", data)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+
+    def test_get_job_metrics(self):
+        job = models.ProcessingJob.objects.get(pk=1)
+        metrics = ImportMetrics(job.files.get().file_name)
+        metrics.add_step("read_manifest", 1.0, 20)
+        for batch, host in [(0, "worker-1"), (10, "worker-2")]:
+            metrics.add_batch(
+                batch,
+                {
+                    "lock_wait": 0.5,
+                    "deadlock_retries": 1,
+                    "host": host,
+                    "steps": {"alignment": {"seconds": 2.0, "rows": 10}},
+                },
+            )
+        metrics.save()
+
+        response = self.get_response("get_job_metrics", {"job_id": job.job_name})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        steps = {step["step"]: step for step in response.data["steps"]}
+        self.assertEqual(
+            steps["alignment"],
+            {
+                "step": "alignment",
+                "seconds": 4.0,
+                "rows": 20,
+                "batches": 2,
+                "rows_per_sec": 5.0,
+            },
+        )
+        self.assertEqual(steps["deadlock_retries"]["rows"], 2)
+        self.assertEqual(steps["read_manifest"]["batches"], 0)
+        self.assertEqual(len(response.data["files"]), 1)
+        self.assertLessEqual({"worker-1", "worker-2"}, set(response.data["hosts"]))
+        self.assertNotIn("batches", response.data)
+
+        response = self.get_response(
+            "get_job_metrics", {"job_id": job.job_name, "batches": "true"}
+        )
+        # lock_wait, deadlock_retries and alignment of both batches
+        self.assertEqual(len(response.data["batches"]), 6)
+
+    def test_get_job_metrics_errors(self):
+        for data in [{}, {"job_id": "unknown"}]:
+            response = self.get_response("get_job_metrics", data)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+
+    def test_retry_job(self):
+        job = models.ProcessingJob.objects.create(
+            job_name="cli_failed", status=models.ProcessingJob.ImportType.FAILED
+        )
+        models.FileProcessing.objects.create(
+            file_name="imported.zip", processing_job=job
+        )
+        models.ImportLog.objects.create(file_id="imported.zip", success=True)
+        with mock.patch("rest_api.viewsets.check_for_new_data") as check:
+            response = self.get_response(
+                "retry_job", {"job_id": "cli_failed"}, method="post"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        # the imported file is not queued again
+        self.assertEqual(response.data, {"jobID": "cli_failed", "files": []})
+        check.assert_called_once()
+        job.refresh_from_db()
+        self.assertEqual(job.status, models.ProcessingJob.ImportType.QUEUED)
+
+    def test_retry_job_errors(self):
+        completed = models.ProcessingJob.objects.get(pk=1).job_name
+        with mock.patch("rest_api.viewsets.check_for_new_data") as check:
+            for data in [{}, {"job_id": "unknown"}, {"job_id": completed}]:
+                response = self.get_response("retry_job", data, method="post")
+                self.assertEqual(
+                    response.status_code, status.HTTP_400_BAD_REQUEST, data
+                )
+        check.assert_not_called()
@@ -12,6 +12,7 @@ import zipfile
 
 from django.core.cache import cache
 from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.db import transaction
 from django.db.models import CharField
 from django.db.models import F
 from django.db.models import Q
@@ -27,10 +28,14 @@ from rest_framework.request import Request
 from rest_framework.response import Response
 
 from rest_api.data_entry.gbk_import import import_gbk_file
+from rest_api.data_entry.import_metrics import summarize_metrics
+from rest_api.data_entry.job_events import notify_job_queued
+from rest_api.data_entry.job_events import wait_for_job_status
 from rest_api.data_entry.property_job import delete_property
 from rest_api.data_entry.property_job import find_or_create_property
 from rest_api.data_entry.reference_job import delete_reference
 from rest_api.data_entry.sample_entry_job import check_for_new_data
+from rest_api.data_entry.sample_entry_job import retry_failed_job
 from rest_api.management.commands.import_lineage import LineageImport
 from rest_api.utils import generate_job_ID
 from rest_api.utils import get_distinct_gene_symbols
@@ -39,6 +44,7 @@ from rest_api.utils import PropertyColumnMapping
 from rest_api.utils import strtobool
 from sonar_backend.settings import CACHE_OBJECT_TTL
 from sonar_backend.settings import LOGGER
+from sonar_backend.settings import REDIS_URL
 from sonar_backend.settings import SONAR_DATA_ENTRY_FOLDER
 from . import models
 from .serializers import AlignmentSerializer
@@ -917,7 +923,16 @@ class FileUploadViewSet(viewsets.ViewSet):
         # Step 4: Register job in database
         try:
             proJobID_obj, _ = models.ProcessingJob.objects.get_or_create(
-                status="Q", job_name=jobID
+                status="Q",
+                job_name=jobID,
+                # small property imports should not wait for large sample imports
+                defaults={
+                    "priority": (
+                        models.ProcessingJob.Priority.HIGH
+                        if "_prop" in jobID
+                        else models.ProcessingJob.Priority.NORMAL
+                    )
+                },
             )
         except IntegrityError as e:
             proJobID_obj = models.ProcessingJob.objects.get(job_name=jobID)
@@ -925,7 +940,7 @@ class FileUploadViewSet(viewsets.ViewSet):
         models.FileProcessing.objects.create(
             file_name=filename, processing_job_id=proJobID_obj.id
         )
-        check_for_new_data()
+        self._start_import(jobID)
         return Response(
             {"detail": "File uploaded successfully", "jobID": jobID},
             status=status.HTTP_201_CREATED,
@@ -933,11 +948,18 @@ class FileUploadViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=["get"])
     def start_file_import(self, request, *args, **kwargs):
-        check_for_new_data()
+        self._start_import()
         return Response(
             {"detail": "File uploaded successfully"}, status=status.HTTP_201_CREATED
         )
 
+    def _start_import(self, job_name: str = ""):
+        if REDIS_URL:
+            # the scheduler process picks the job up once it is committed
+            transaction.on_commit(lambda: notify_job_queued(job_name))
+        else:
+            check_for_new_data()
+
 
 class LineageViewSet(
     viewsets.GenericViewSet,
@@ -1005,11 +1027,11 @@ class LineageViewSet(
         tsv_file = self._temp_save_file(tsv_file)
         lineage_import = LineageImport()
         lineage_import.set_file(tsv_file)
-        # Only replace this reference's lineages, keep the others intact.
-        models.Lineage.objects.filter(reference=reference).delete()
-        lineage_import.process_lineage_data(reference)
+        # Only this reference's lineages are updated, unchanged ones are kept.
+        counts = lineage_import.process_lineage_data(reference)
         return Response(
-            {"detail": "Lineages updated successfully"}, status=status.HTTP_200_OK
+            {"detail": "Lineages updated successfully", **counts},
+            status=status.HTTP_200_OK,
         )
 
     def _temp_save_file(self, uploaded_file: InMemoryUploadedFile):
@@ -1042,6 +1064,115 @@ class TasksView(
         # Return serialized data in the response
         return Response(data={"detail": serializer.data}, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["get"])
+    def wait_for_job(self, request, *args, **kwargs):
+        """
+        Long poll for the status of a job: returns as soon as the job is
+        completed or failed, or after `timeout` seconds (at most 60) with the
+        current status.
+        """
+        job_id = request.query_params.get("job_id")
+        if not job_id:
+            return Response(
+                {"detail": "job_id field is missing"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            timeout = min(float(request.query_params.get("timeout", 30)), 60)
+        except ValueError:
+            return Response(
+                {"detail": "timeout must be a number"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            job_status = wait_for_job_status(job_id, timeout)
+        except models.ProcessingJob.DoesNotExist:
+            return Response(
+                data={"detail": f"Job not found ({job_id})"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            data={"jobID": job_id, "status": job_status},
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["get"])
+    def get_job_metrics(self, request, *args, **kwargs):
+        """
+        Import metrics of a job, summed up per step and per file. Pass
+        `batches=true` to also get the metrics of every batch.
+        """
+        job_id = request.query_params.get("job_id")
+        if not job_id:
+            return Response(
+                {"detail": "job_id field is missing"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not models.ProcessingJob.objects.filter(job_name=job_id).exists():
+            return Response(
+                data={"detail": f"Job not found ({job_id})"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        metrics = models.ImportMetric.objects.filter(processing_job__job_name=job_id)
+        files_data = [
+            {
+                "file_name": file_name,
+                "steps": summarize_metrics(metrics.filter(file_id=file_name)),
+            }
+            for file_name in metrics.values_list("file_id", flat=True)
+            .distinct()
+            .order_by("file_id")
+        ]
+        data = {
+            "jobID": job_id,
+            "steps": summarize_metrics(metrics),
+            "files": files_data,
+            "hosts": sorted(
+                metrics.exclude(host=None).values_list("host", flat=True).distinct()
+            ),
+            "versions": sorted(metrics.values_list("version", flat=True).distinct()),
+        }
+        if strtobool(request.query_params.get("batches", "False")):
+            data["batches"] = list(
+                metrics.exclude(batch=None)
+                .order_by("file_id", "batch", "step")
+                .values("file_id", "batch", "step", "seconds", "rows", "host")
+            )
+        return Response(data=data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["post"])
+    def retry_job(self, request, *args, **kwargs):
+        """
+        Queue the failed files of a job again, without a re-upload. Sample
+        batches and annotation files that were imported already are skipped.
+        Pass `force=true` to retry a job that is stuck in progress, e.g. after
+        its worker was killed.
+        """
+        job_id = request.data.get("job_id")
+        if not job_id:
+            return Response(
+                {"detail": "job_id field is missing"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        force = strtobool(str(request.data.get("force", "False")))
+        try:
+            files = retry_failed_job(job_id, force)
+        except models.ProcessingJob.DoesNotExist:
+            return Response(
+                data={"detail": f"Job not found ({job_id})"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if REDIS_URL:
+            notify_job_queued(job_id)
+        else:
+            check_for_new_data()
+        return Response(
+            data={"jobID": job_id, "files": files},
+            status=status.HTTP_200_OK,
+        )
+
     # get by job id
     @action(detail=False, methods=["get"])
     def get_files_by_job_id(self, request, *args, **kwargs):
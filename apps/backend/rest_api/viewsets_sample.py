@@ -666,17 +666,18 @@ class SampleFilterMixin:
         if not lineages.exists():
             raise Exception(f"Lineage {list(lineageList)} not found.")
         if includeSublineages:
-            sublineages = []
-            for l in lineages:
-                sublineages.extend(l.get_sublineages())
+            # subquery on the closure table, includes the lineages themselves
+            names = models.LineageClosure.objects.filter(ancestor__in=lineages).values(
+                "descendant__name"
+            )
         else:
-            sublineages = list(lineages)
+            names = lineages.values("name")
 
         # match for all sublineages of all given lineages
         return self.filter_property(
             "lineage",
             "in",
-            sublineages,
+            names,
             exclude,
         )
 
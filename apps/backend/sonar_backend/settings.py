@@ -36,7 +36,16 @@ env = environ.Env(
     ALLOWED_HOSTS=(str, None),
     CORS_ALLOWED_ORIGINS=(str, "http://localhost:5173"),
     SAMPLE_BATCH_SIZE=(int, 10),
+    IMPORT_BATCH_TARGET_SECONDS=(float, 30.0),
     PROPERTY_BATCH_SIZE=(int, 1000),
+    ANNOTATION_BATCH_SIZE=(int, 5000),
+    SAMPLE_IMPORT_LOADER=(str, "orm"),
+    IMPORT_GLOBAL_LOCKS=(bool, False),
+    IMPORT_DEADLOCK_RETRIES=(int, 3),
+    IMPORT_BATCH_RETRIES=(int, 1),
+    IMPORT_REUSE_ALIGNMENTS=(bool, True),
+    DELETE_CHUNK_SIZE=(int, 1000),
+    MUTATION_GC_BATCH_SIZE=(int, 10000),
     PROFILE_IMPORT=(bool, False),
     KEEP_IMPORTED_DATA_FILES=(bool, False),
 )
@@ -199,7 +208,29 @@ PROFILE_IMPORT = env("PROFILE_IMPORT")
 REDIS_URL = env("REDIS_URL")
 
 SAMPLE_BATCH_SIZE = env("SAMPLE_BATCH_SIZE")
+# sample batches are sized by their variants to take about this long, with
+# the throughput observed by earlier batches (0: SAMPLE_BATCH_SIZE samples)
+IMPORT_BATCH_TARGET_SECONDS = env("IMPORT_BATCH_TARGET_SECONDS")
 PROPERTY_BATCH_SIZE = env("PROPERTY_BATCH_SIZE")
+# number of distinct VCF alleles written per annotation batch
+ANNOTATION_BATCH_SIZE = env("ANNOTATION_BATCH_SIZE")
+# "orm" (bulk_create) or "copy" (COPY into staging tables, PostgreSQL only)
+SAMPLE_IMPORT_LOADER = env("SAMPLE_IMPORT_LOADER")
+# Run the write transactions of concurrent import batches one at a time,
+# under one redis lock.
+# Not needed for correctness: upserts are written in a fixed key order and
+# deadlocked statements are retried.
+IMPORT_GLOBAL_LOCKS = env("IMPORT_GLOBAL_LOCKS")
+IMPORT_DEADLOCK_RETRIES = env("IMPORT_DEADLOCK_RETRIES")
+# failed celery batches of an import are dispatched again this many times
+IMPORT_BATCH_RETRIES = env("IMPORT_BATCH_RETRIES")
+# samples whose seqhash is aligned to the replicon already get the mutation
+# links of that alignment, their variants are not imported again
+IMPORT_REUSE_ALIGNMENTS = env("IMPORT_REUSE_ALIGNMENTS")
+# sequences deleted per transaction, larger deletions run as a celery job
+DELETE_CHUNK_SIZE = env("DELETE_CHUNK_SIZE")
+# unreferenced mutations deleted per transaction by the mutation cleanup
+MUTATION_GC_BATCH_SIZE = env("MUTATION_GC_BATCH_SIZE")
 
 SONAR_DATA_ENTRY_FOLDER = (
     env("SONAR_DATA_ENTRY_FOLDER")
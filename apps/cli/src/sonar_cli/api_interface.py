@@ -30,6 +30,7 @@ class APIClient:
     get_all_jobs_endpont = "tasks/get_all_jobs"
     get_jobID_endpont = "tasks/generate_job_id"
     get_job_byID_endpont = "tasks/get_files_by_job_id"
+    get_wait_for_job_endpoint = "tasks/wait_for_job"
 
     get_database_info_endpont = "database/get_database_info"
     get_backend_status_endpoint = "status/"
@@ -437,6 +438,19 @@ class APIClient:
         )
         return json_response
 
+    def wait_for_job(self, job_id: str, timeout: int = 30):
+        """
+        Returns the job status as soon as the job is completed or failed, or
+        after `timeout` seconds with the current status.
+        """
+        params = {}
+        params["job_id"] = job_id
+        params["timeout"] = timeout
+        json_response = self._make_request(
+            "GET", endpoint=self.get_wait_for_job_endpoint, params=params
+        )
+        return json_response
+
     def put_lineage_import(self, lineage_obj, reference):
         """
         send lineage file together with the target reference accession.
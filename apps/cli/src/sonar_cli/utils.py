@@ -4,9 +4,7 @@ from io import BytesIO
 import json
 import os
 from pathlib import Path
-import pickle
 import sys
-import time
 import traceback
 from typing import Any
 from typing import Dict
@@ -55,6 +53,12 @@ from tqdm import tqdm
 
 # Initialize logger
 LOGGER = LoggingConfigurator.get_logger()
+
+# Row groups of the sample archive members. The backend reads the row groups
+# of one import batch only: manifest rows by position, variants by var_index.
+MANIFEST_ROW_GROUP_SIZE = 100
+VARIANTS_ROW_GROUP_SIZE = 10000
+
 bar_format = "{desc} {percentage:3.0f}% [{n_fmt}/{total_fmt}, {elapsed}<{remaining}, {rate_fmt}{postfix}]"
 
 
@@ -387,31 +391,12 @@ class sonarUtils:
                     cache_dict, sample_chunk, chunk_number
                 )
             # Wait for all chunk to be processed
-            incomplete_chunks = set(range(1, len(passed_samples_chunk_list)))
-            while len(incomplete_chunks) > 0:
-                chunks_tmp = incomplete_chunks.copy()
-                for chunk_number in chunks_tmp:
-                    job_with_chunk = f"{job_id}_chunk{chunk_number}"
-                    resp = APIClient(base_url=config.get_base_url()).get_job_byID(
-                        job_with_chunk
-                    )
-                    job_status = resp["status"]
-                    LOGGER.debug(f"Chunk {chunk_number} status: {job_status}")
-                    if job_status in ["Q", "IP"]:
-                        continue
-                    if job_status == "F":
-                        LOGGER.error(
-                            f"Job {job_with_chunk} failed (status={job_status}). Aborting."
-                        )
-                        sys.exit(1)
-                    if job_status == "C":
-                        incomplete_chunks.remove(chunk_number)
-                if len(incomplete_chunks) > 0:
-                    LOGGER.debug(
-                        f"Waiting for {len(incomplete_chunks)} chunks to finish being processed."
-                    )
-                    sleep_time = 3
-                    time.sleep(sleep_time)
+            sonarUtils._wait_for_jobs(
+                [
+                    f"{job_id}_chunk{chunk_number}"
+                    for chunk_number in range(1, len(passed_samples_chunk_list) + 1)
+                ]
+            )
 
             if cache.auto_anno:
                 for chunk_number, each_file in enumerate(
@@ -430,30 +415,13 @@ class sonarUtils:
                     )
 
                 # Wait for all annotation chunks to be processed
-                incomplete_anno_chunks = set(range(len(anno_result_list)))
-                while len(incomplete_anno_chunks) > 0:
-                    chunks_tmp = incomplete_anno_chunks.copy()
-                    for chunk_number in chunks_tmp:
-                        job_with_chunk = f"{job_id}_chunk{chunk_number}"
-                        resp = APIClient(base_url=config.get_base_url()).get_job_byID(
-                            job_with_chunk
-                        )
-                        job_status = resp["status"]
-                        if job_status in ["Q", "IP"]:
-                            continue
-                        if job_status == "F":
-                            LOGGER.error(
-                                f"Annotation job {job_with_chunk} failed (status={job_status}). Aborting."
-                            )
-                            sys.exit(1)
-                        if job_status == "C":
-                            incomplete_anno_chunks.remove(chunk_number)
-                    if len(incomplete_anno_chunks) > 0:
-                        LOGGER.debug(
-                            f"Waiting for {len(incomplete_anno_chunks)} annotation chunks to finish being processed."
-                        )
-                        sleep_time = 3
-                        time.sleep(sleep_time)
+                sonarUtils._wait_for_jobs(
+                    [
+                        f"{job_id}_chunk{chunk_number}"
+                        for chunk_number in range(len(anno_result_list))
+                    ],
+                    label="Annotation job",
+                )
 
             LOGGER.info(
                 f"Job ID: {job_id}",
@@ -648,31 +616,12 @@ class sonarUtils:
                     cache_dict, sample_chunk, chunk_number
                 )
             # Wait for all chunk to be processed
-            incomplete_chunks = set(range(1, len(passed_sequences_chunk_list)))
-            while len(incomplete_chunks) > 0:
-                chunks_tmp = incomplete_chunks.copy()
-                for chunk_number in chunks_tmp:
-                    job_with_chunk = f"{job_id}_chunk{chunk_number}"
-                    resp = APIClient(base_url=config.get_base_url()).get_job_byID(
-                        job_with_chunk
-                    )
-                    job_status = resp["status"]
-                    LOGGER.debug(f"Chunk {chunk_number} status: {job_status}")
-                    if job_status in ["Q", "IP"]:
-                        continue
-                    if job_status == "F":
-                        LOGGER.error(
-                            f"Job {job_with_chunk} failed (status={job_status}). Aborting."
-                        )
-                        sys.exit(1)
-                    if job_status == "C":
-                        incomplete_chunks.remove(chunk_number)
-                if len(incomplete_chunks) > 0:
-                    LOGGER.debug(
-                        f"Waiting for {len(incomplete_chunks)} chunks to finish being processed."
-                    )
-                    sleep_time = 3
-                    time.sleep(sleep_time)
+            sonarUtils._wait_for_jobs(
+                [
+                    f"{job_id}_chunk{chunk_number}"
+                    for chunk_number in range(1, len(passed_sequences_chunk_list) + 1)
+                ]
+            )
 
             if cache.auto_anno:
                 for chunk_number, each_file in enumerate(
@@ -690,30 +639,13 @@ class sonarUtils:
                     )
 
                 # Wait for all annotation chunks to be processed
-                incomplete_anno_chunks = set(range(len(anno_result_list)))
-                while len(incomplete_anno_chunks) > 0:
-                    chunks_tmp = incomplete_anno_chunks.copy()
-                    for chunk_number in chunks_tmp:
-                        job_with_chunk = f"{job_id}_chunk{chunk_number}"
-                        resp = APIClient(base_url=config.get_base_url()).get_job_byID(
-                            job_with_chunk
-                        )
-                        job_status = resp["status"]
-                        if job_status in ["Q", "IP"]:
-                            continue
-                        if job_status == "F":
-                            LOGGER.error(
-                                f"Annotation job {job_with_chunk} failed (status={job_status}). Aborting."
-                            )
-                            sys.exit(1)
-                        if job_status == "C":
-                            incomplete_anno_chunks.remove(chunk_number)
-                    if len(incomplete_anno_chunks) > 0:
-                        LOGGER.debug(
-                            f"Waiting for {len(incomplete_anno_chunks)} annotation chunks to finish being processed."
-                        )
-                        sleep_time = 3
-                        time.sleep(sleep_time)
+                sonarUtils._wait_for_jobs(
+                    [
+                        f"{job_id}_chunk{chunk_number}"
+                        for chunk_number in range(len(anno_result_list))
+                    ],
+                    label="Annotation job",
+                )
 
             LOGGER.info(
                 f"[runtime] Upload and import: {calculate_time_difference(start_upload_time, get_current_time())}"
@@ -734,6 +666,31 @@ class sonarUtils:
             f"[runtime] Clear cache: {calculate_time_difference(start_clean_time, get_current_time())}"
         )
 
+    @staticmethod
+    def _wait_for_jobs(job_ids: List[str], label: str = "Job") -> Optional[str]:
+        """
+        Wait until the backend has processed all given jobs, exits if one of
+        them failed. The backend holds each request until the job is done
+        (long polling), so no polling interval is needed.
+
+        Returns:
+            str: status of the last job, None for an empty list
+        """
+        api_client = APIClient(base_url=config.get_base_url())
+        job_status = None
+        for job in job_ids:
+            while True:
+                job_status = api_client.wait_for_job(job)["status"]
+                LOGGER.debug(f"{label} {job} status: {job_status}")
+                if job_status == "F":
+                    LOGGER.error(
+                        f"{label} {job} failed (status={job_status}). Aborting."
+                    )
+                    sys.exit(1)
+                if job_status == "C":
+                    break
+        return job_status
+
     @staticmethod
     def zip_import_upload_annotation_singlethread(
         shared_objects: dict, file_path, chunk_number: int
@@ -769,46 +726,54 @@ class sonarUtils:
     def zip_import_upload_sample_singlethread(
         shared_objects: dict, sample_list, chunk_number: int
     ):
-        """Bundle up the data to be sent to the backend and send it"""
-
-        files_to_compress = []
-        added_parquet_files = set()
+        """Bundle up the data to be sent to the backend and send it
+
+        The archive holds one manifest row per sample (samples/manifest.parquet)
+        and the variants of all samples in one file (var/variants.parquet).
+        Variants are keyed by the name of the sample's var parquet file, so
+        samples with identical sequences (same seqhash) share their rows.
+        Var files are numbered in order of appearance (var_index) and their
+        variants are written in that order, so the samples of a backend
+        import batch find their variants in a few row groups.
+        """
+        manifest_rows = []
+        variant_frames = []
+        var_indexes = {}
         for kwargs in sample_list:
             var_parquet_file = kwargs["var_parquet_file"]
-            sample_dict = kwargs
-
-            # Serialize the sample dictionary to bytes
-            sample_bytes = pickle.dumps(sample_dict)
-
-            # Append the serialized sample dictionary to the files to compress
-            files_to_compress.append(
-                (
-                    f"samples/{get_fname(kwargs['name'], extension='.sample', enable_parent_dir=True)}",
-                    sample_bytes,
-                )
+            if var_parquet_file not in var_indexes:
+                var_indexes[var_parquet_file] = len(var_indexes)
+                var_df = pd.read_parquet(var_parquet_file)
+                var_df = var_df.drop(columns=["label"], errors="ignore")
+                var_df["var_file"] = os.path.basename(var_parquet_file)
+                var_df["var_index"] = var_indexes[var_parquet_file]
+                variant_frames.append(var_df)
+            sample_row = dict(kwargs)
+            sample_row["properties"] = json.dumps(
+                sample_row.get("properties") or {}, default=str
             )
-            # Deduplicate parquet files: samples with identical sequences share the same
-            # seqhash and therefore the same parquet file path. Adding it twice would
-            # produce a "Duplicate name" warning from zipfile.
-            if var_parquet_file not in added_parquet_files:
-                files_to_compress.append(var_parquet_file)
-                added_parquet_files.add(var_parquet_file)
+            sample_row["var_index"] = var_indexes[var_parquet_file]
+            manifest_rows.append(sample_row)
+
+        manifest_buffer = BytesIO()
+        pd.DataFrame(manifest_rows).to_parquet(
+            manifest_buffer, index=False, row_group_size=MANIFEST_ROW_GROUP_SIZE
+        )
+        variants_buffer = BytesIO()
+        pd.concat(variant_frames, ignore_index=True).to_parquet(
+            variants_buffer,
+            compression="zstd",
+            index=False,
+            row_group_size=VARIANTS_ROW_GROUP_SIZE,
+        )
 
         # Create a zip file without writing to disk
         compressed_data = BytesIO()
-        with zipfile.ZipFile(compressed_data, "w", zipfile.ZIP_LZMA) as zipf:
-            for file_path in files_to_compress:
-                if isinstance(file_path, tuple):
-                    # Add the dictionary data to the archive with pickle extension
-                    zipf.writestr(file_path[0], file_path[1])
-                else:
-                    # Find the index of 'var'
-                    path_parts = file_path.split("/")
-                    var_index = path_parts.index("var")
-                    # Join the parts starting from 'var'
-                    rel_path = "/".join(path_parts[var_index:])
-
-                    zipf.write(file_path, arcname=rel_path)
+        # parquet is compressed already; stored members can be read by the
+        # backend in place, without extracting the archive
+        with zipfile.ZipFile(compressed_data, "w", zipfile.ZIP_STORED) as zipf:
+            zipf.writestr("samples/manifest.parquet", manifest_buffer.getvalue())
+            zipf.writestr("var/variants.parquet", variants_buffer.getvalue())
 
         compressed_data.seek(0)
 
@@ -933,30 +898,9 @@ class sonarUtils:
                     job_ids.extend([job_id])
         # Final status checking
         LOGGER.info(f"All chunks for job {job_id} uploaded. Monitoring job status...")
-        job_status = None
-        sleep_time = 2
 
         # Wait for all chunk to be processed
-        incomplete_jobs = set(job_ids)
-        while len(incomplete_jobs) > 0:
-            # We make a copy because we can't modify a set that is being
-            # iterated through
-            jobs_tmp = incomplete_jobs.copy()
-            for job in jobs_tmp:
-                resp = APIClient(base_url=config.get_base_url()).get_job_byID(job)
-                job_status = resp["status"]
-                if job_status in ["Q", "IP"]:
-                    continue
-                if job_status == "F":
-                    LOGGER.error(f"Job {job} failed (status={job_status}). Aborting.")
-                    sys.exit(1)
-                if job_status == "C":
-                    incomplete_jobs.remove(job)
-            if len(incomplete_jobs) > 0:
-                LOGGER.debug(
-                    f"Waiting for {len(incomplete_jobs)} chunks to finish being processed."
-                )
-                time.sleep(sleep_time)
+        job_status = sonarUtils._wait_for_jobs(job_ids)
 
         time_diff = calculate_time_difference(start_time, get_current_time())
         if job_status == "F":
@@ -1690,6 +1634,9 @@ class sonarUtils:
 
         deleted = json_response["deleted_samples_count"]
         LOGGER.info(f"{deleted} of {len(samples)} samples found and deleted.")
+        if json_response.get("job_id"):
+            LOGGER.info("Waiting for the unused sequences to be deleted...")
+            sonarUtils._wait_for_jobs([json_response["job_id"]], label="Deletion job")
 
     @staticmethod
     def delete_sequence(reference: str = None, sequences: List[str] = []) -> None:
@@ -1711,6 +1658,9 @@ class sonarUtils:
         )
 
         deleted = json_response["deleted_sequences_count"]
+        if json_response.get("job_id"):
+            LOGGER.info(f"{deleted} of {len(sequences)} sequences found, deleting...")
+            sonarUtils._wait_for_jobs([json_response["job_id"]], label="Deletion job")
         LOGGER.info(f"{deleted} of {len(sequences)} sequences found and deleted.")
 
     @staticmethod